@@ -123,8 +123,11 @@ This is how the artifact_path is returned. This hook can be removed, by running
 """
 from artifactor.utils import parse_setup_dir, start_session
 from riggerlib import Rigger, RiggerClient
+from Queue import Empty, Full, Queue
+from time import time
 import os
 import sys
+import threading
 import traceback
 from utils import create_logger
 
@@ -165,6 +168,19 @@ class Artifactor(Rigger):
     def log_message(self, message):
         self.logger.debug(message)
 
+    def process_hook(self, hook_name, **kwargs):
+        # A batch of hooks queued by an asynchronous ArtifactorClient, processed in order
+        if hook_name == 'fire_hooks':
+            result = {}, self.global_data
+            for hook in kwargs['hooks']:
+                try:
+                    result = super(Artifactor, self).process_hook(
+                        hook['hook_name'], **hook['data'])
+                except Exception:
+                    self.handle_failure(sys.exc_info())
+            return result
+        return super(Artifactor, self).process_hook(hook_name, **kwargs)
+
 
 def initialize(artifactor):
     artifactor.parse_config()
@@ -178,4 +194,130 @@ def initialize(artifactor):
 
 
 class ArtifactorClient(RiggerClient):
-    pass
+    """Client of the artifactor server
+
+    In asynchronous mode, hooks are put into a bounded queue and a sender thread fires them in
+    batches, in the order they were queued, so the caller doesn't wait for the artifactor. When
+    the queue is full, callers block until there's room again (at most ``put_timeout`` seconds,
+    after that the hook is fired directly).
+
+    Hooks fired with ``grab_result=True`` and the hooks in :py:attr:`sync_hooks` are fired
+    synchronously, after the queued hooks have been sent.
+
+    Args:
+        address: Address of the artifactor server
+        port: Port of the artifactor server
+        async_hooks: Whether to queue the hooks
+        max_queued: Maximum number of hooks in the queue
+        batch_size: Maximum number of hooks sent in one request
+        put_timeout: Maximum number of seconds to wait for room in the queue
+    """
+    #: Hooks that end the session, the queue has to be empty before they are fired
+    sync_hooks = {'finish_session', 'terminate'}
+
+    def __init__(self, address, port, async_hooks=False, max_queued=1000, batch_size=50,
+            put_timeout=60):
+        super(ArtifactorClient, self).__init__(address, port)
+        self.async_hooks = async_hooks
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self._queue = Queue(max_queued)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'hooks': 0, 'batches': 0, 'errors': 0, 'max_depth': 0, 'full': 0,
+            'latency_total': 0.0, 'latency_max': 0.0}
+
+    def fire_hook(self, hook_name, grab_result=False, **kwargs):
+        if not self.async_hooks or grab_result or hook_name in self.sync_hooks:
+            self.flush(timeout=self.put_timeout)
+            return super(ArtifactorClient, self).fire_hook(
+                hook_name, grab_result=grab_result, **kwargs)
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put((time(), hook_name, kwargs), timeout=self.put_timeout)
+        except Full:
+            with self._stats_lock:
+                self._stats['full'] += 1
+            return super(ArtifactorClient, self).fire_hook(hook_name, **kwargs)
+        with self._stats_lock:
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+
+    def flush(self, timeout=None):
+        """Waits until all the queued hooks are sent
+
+        Returns: ``True`` if the queue was flushed, ``False`` if the timeout expired
+        """
+        queue = self._queue
+        deadline = None if timeout is None else time() + timeout
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks:
+                if deadline is None:
+                    queue.all_tasks_done.wait()
+                else:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        return False
+                    queue.all_tasks_done.wait(remaining)
+        return True
+
+    @property
+    def queue_depth(self):
+        """Number of hooks waiting to be sent"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """Queue statistics: hooks and batches sent, errors, current and maximum queue depth,
+        how many times the queue was full, and the average and maximum flush latency (seconds
+        from queueing a hook to the end of sending it)
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        latency_total = stats.pop('latency_total')
+        stats['latency_avg'] = latency_total / stats['hooks'] if stats['hooks'] else 0.0
+        stats['depth'] = self.queue_depth
+        return stats
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._send, name='artifactor-client')
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _send(self):
+        fire_hook = super(ArtifactorClient, self).fire_hook
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                if len(batch) == 1:
+                    queued, hook_name, kwargs = batch[0]
+                    fire_hook(hook_name, **kwargs)
+                else:
+                    fire_hook('fire_hooks', hooks=[
+                        {'hook_name': hook_name, 'data': kwargs}
+                        for queued, hook_name, kwargs in batch])
+                error = False
+            except Exception:
+                error = True
+                traceback.print_exc()
+            finally:
+                sent = time()
+                with self._stats_lock:
+                    stats = self._stats
+                    stats['hooks'] += len(batch)
+                    stats['batches'] += 1
+                    stats['errors'] += error
+                    stats['latency_total'] += sum(sent - item[0] for item in batch)
+                    # The first hook of the batch waited the longest
+                    stats['latency_max'] = max(stats['latency_max'], sent - batch[0][0])
+                for item in batch:
+                    self._queue.task_done()
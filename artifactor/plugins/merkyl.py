@@ -14,14 +14,25 @@ artifactor:
                 - /var/www/miq/vmdb/log/evm.log
                 - /var/www/miq/vmdb/log/production.log
                 - /var/www/miq/vmdb/log/automation.log
+            max_log_size: 52428800
+            workers: 8
+
+The logs of a test are fetched in parallel, at most ``workers`` at a time, and streamed to disk.
+``max_log_size`` caps every log of a test at that many bytes, the front of a bigger log is dropped.
+By default the logs are not capped.
 """
 
 from artifactor.utils import ArtifactorBasePlugin
+from multiprocessing.pool import ThreadPool
 import os.path
+import re
 import requests
+import shutil
+import tempfile
 
 
 class Merkyl(ArtifactorBasePlugin):
+    chunk_size = 64 * 1024
 
     class Test(object):
         def __init__(self, ident, ip, port):
@@ -42,9 +53,55 @@ class Merkyl(ArtifactorBasePlugin):
     def configure(self):
         self.files = self.data.get('log_files', [])
         self.port = self.data.get('port', '8192')
+        self.max_size = self.data.get('max_log_size', None)
+        self.workers = self.data.get('workers', 8)
         self.tests = {}
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=self.workers))
         self.configured = True
 
+    def _get(self, ip, endpoint):
+        url = "http://{}:{}/{}".format(ip, self.port, endpoint)
+        return self.session.get(url, timeout=15)
+
+    def _fetch(self, ip, filename, os_filename):
+        """Streams a log to ``os_filename``, keeping the last ``max_size`` bytes of it
+
+        Merkyl answers the ``Range`` with just the end of the log, an older merkyl sends all of it
+        and the front gets dropped here.
+        """
+        base, tail = os.path.split(filename)
+        url = "http://{}:{}/get/{}".format(ip, self.port, tail)
+        headers = {'Accept-Encoding': 'gzip'}
+        if self.max_size:
+            headers['Range'] = 'bytes=-{}'.format(self.max_size)
+        response = self.session.get(url, headers=headers, stream=True, timeout=15)
+        try:
+            with open(os_filename, "wb") as f:
+                dropped = content_range_start(response.headers.get('Content-Range'))
+                if dropped:
+                    f.write(truncated_marker(tail, dropped))
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+        finally:
+            response.close()
+        if self.max_size and response.status_code != 206:
+            self.truncate_front(os_filename, tail)
+        return os_filename
+
+    def truncate_front(self, os_filename, tail):
+        """Drops the front of a log bigger than ``max_size``, without reading it all in"""
+        size = os.path.getsize(os_filename)
+        if size <= self.max_size:
+            return
+        dirname = os.path.dirname(os_filename)
+        with open(os_filename, "rb") as f, tempfile.NamedTemporaryFile(
+                dir=dirname, delete=False) as truncated:
+            f.seek(size - self.max_size)
+            truncated.write(truncated_marker(tail, size - self.max_size))
+            shutil.copyfileobj(f, truncated, self.chunk_size)
+        os.rename(truncated.name, os_filename)
+
     @ArtifactorBasePlugin.check_configured
     def start_test(self, test_name, test_location, ip):
         """Start a test"""
@@ -55,8 +112,7 @@ class Merkyl(ArtifactorBasePlugin):
                 return None
         else:
             self.tests[test_ident] = self.Test(test_ident, ip, self.port)
-        url = "http://{}:{}/resetall".format(ip, self.port)
-        requests.get(url, timeout=15)
+        self._get(ip, "resetall")
 
         self.tests[test_ident].in_progress = True
 
@@ -66,9 +122,7 @@ class Merkyl(ArtifactorBasePlugin):
         ip = self.tests[test_ident].ip
 
         base, tail = os.path.split(filename)
-        url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-        doc = requests.get(url, timeout=15)
-        content = doc.content
+        content = self._get(ip, "get/{}".format(tail)).content
         return {'merkyl_content': content}, None
 
     @ArtifactorBasePlugin.check_configured
@@ -78,38 +132,31 @@ class Merkyl(ArtifactorBasePlugin):
 
         if filename not in self.files:
             self.tests[test_ident].extra_files.update([filename])
-            url = "http://{}:{}/setup{}".format(ip, self.port, filename)
-            requests.get(url, timeout=15)
+            self._get(ip, "setup{}".format(filename))
 
     @ArtifactorBasePlugin.check_configured
     def finish_test(self, artifact_path, test_name, test_location, ip):
-        test_ident = "{}/{}".format(test_location, test_name)
         """Finish test"""
-        artifacts = []
-        for filename in self.files:
+        test_ident = "{}/{}".format(test_location, test_name)
+        extra_files = self.tests[test_ident].extra_files
+        filenames = list(self.files) + [
+            filename for filename in extra_files if filename not in self.files]
+
+        def fetch(filename):
             base, tail = os.path.split(filename)
-            os_filename = self.ident + "-" + tail + ".log"
-            os_filename = os.path.join(artifact_path, os_filename)
-            with open(os_filename, "w") as f:
-                url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-                doc = requests.get(url, timeout=15)
-                content = doc.content
-                f.write(content)
-                artifacts.append(os_filename)
-
-        for filename in self.tests[test_ident].extra_files:
+            os_filename = os.path.join(artifact_path, self.ident + "-" + tail + ".log")
+            return self._fetch(ip, filename, os_filename)
+
+        pool = ThreadPool(max(1, min(self.workers, len(filenames))))
+        try:
+            artifacts = pool.map(fetch, filenames)
+        finally:
+            pool.close()
+            pool.join()
+
+        for filename in extra_files:
             base, tail = os.path.split(filename)
-            os_filename = self.ident + "-" + tail + ".log"
-            os_filename = os.path.join(artifact_path, os_filename)
-            with open(os_filename, "w") as f:
-                url = "http://{}:{}/get/{}".format(ip, self.port, tail)
-                doc = requests.get(url, timeout=15)
-                content = doc.content
-                f.write(content)
-                artifacts.append(os_filename)
-
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+            self._get(ip, "delete/{}".format(tail))
 
         del self.tests[test_ident]
         return None, {'artifacts': {test_ident: {'files': {self.ident: artifacts}}}}
@@ -118,13 +165,21 @@ class Merkyl(ArtifactorBasePlugin):
     def start_session(self, ip):
         """Session started"""
         for file_name in self.files:
-            url = "http://{}:{}/setup{}".format(ip, self.port, file_name)
-            requests.get(url, timeout=15)
+            self._get(ip, "setup{}".format(file_name))
 
     @ArtifactorBasePlugin.check_configured
     def finish_session(self, ip):
         """Session finished"""
         for filename in self.files:
             base, tail = os.path.split(filename)
-            url = "http://{}:{}/delete/{}".format(ip, self.port, tail)
-            requests.get(url, timeout=15)
+            self._get(ip, "delete/{}".format(tail))
+
+
+def content_range_start(content_range):
+    """How many bytes from the front of the log a ``Content-Range`` header left out"""
+    match = re.match(r'bytes (\d+)-', content_range or '')
+    return int(match.group(1)) if match else 0
+
+
+def truncated_marker(tail, dropped):
+    return "[merkyl: first {} bytes of {} dropped, log capped]\n".format(dropped, tail)
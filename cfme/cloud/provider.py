@@ -26,6 +26,7 @@ from cfme.web_ui import Region, Quadicon, Form, Select, Tree, fill, paginator
 from cfme.web_ui import Timelines
 from utils import conf
 from utils.db import cfmedb
+from utils.db_queries import get_provider_stats, provider_stats
 from utils.log import logger
 from utils.providers import provider_factory
 from utils.update import Updateable
@@ -306,10 +307,20 @@ class Provider(Updateable, Pretty):
             KeyError: If the host stats does not contain the specified key.
             ProviderHasNoProperty: If the provider does not have the property defined.
         """
-        host_stats = client.stats(*stats_to_match)
+        # The provider doesn't change while CFME catches up with it, polls reuse its stats
+        host_stats = client.stats(*stats_to_match, max_age=client.stats_ttl)
+        if db:
+            # All the stats counted by one query, instead of a query per stat
+            cfme_stats = self._db_stats(
+                *[stat for stat in stats_to_match if stat in provider_stats])
+        else:
+            cfme_stats = {}
         for stat in stats_to_match:
             try:
-                cfme_stat = getattr(self, stat)(db=db)
+                if stat in cfme_stats:
+                    cfme_stat = cfme_stats[stat]
+                else:
+                    cfme_stat = getattr(self, stat)(db=db)
                 logger.info(' Matching stat [%s], Host(%s), CFME(%s)' %
                     (stat, host_stats[stat], cfme_stat))
                 if host_stats[stat] != cfme_stat:
@@ -321,6 +332,10 @@ class Provider(Updateable, Pretty):
         else:
             return True
 
+    def _db_stats(self, *stats):
+        """ Returns a dict of the providers stats counted in the database, in a single query."""
+        return get_provider_stats([self.name], stats)[self.name]
+
     def _on_detail_page(self):
         """ Returns ``True`` if on the providers detail page, ``False`` if not."""
         return sel.is_displayed('//div[@class="dhtmlxInfoBarLabel-2"][contains(., "%s")]'
@@ -329,38 +344,19 @@ class Provider(Updateable, Pretty):
     def num_template(self, db=True):
         """ Returns the providers number of templates, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            vms = cfmedb()["vms"]
-            truthy = True  # This is to prevent a lint error with ==True
-            temlist = list(cfmedb().session.query(vms.name)
-                           .join(ext_management_systems, vms.ems_id == ext_management_systems.id)
-                           .filter(ext_management_systems.name == self.name)
-                           .filter(vms.template == truthy))
-            return len(temlist)
+            return self._db_stats('num_template')['num_template']
         else:
             return int(self.get_detail("Relationships", "Templates"))
 
     def num_vm(self, db=True):
         """ Returns the providers number of instances, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            vms = cfmedb()["vms"]
-            falsey = False  # This is to prevent a lint error with ==False
-            vmlist = list(cfmedb().session.query(vms.name)
-                          .join(ext_management_systems, vms.ems_id == ext_management_systems.id)
-                          .filter(ext_management_systems.name == self.name)
-                          .filter(vms.template == falsey))
-            return len(vmlist)
+            return self._db_stats('num_vm')['num_vm']
         return int(self.get_detail("Relationships", "VMs"))
 
     @property
     def exists(self):
-        ems = cfmedb()['ext_management_systems']
-        provs = (prov[0] for prov in cfmedb().session.query(ems.name))
-        if self.name in provs:
-            return True
-        else:
-            return False
+        return cfmedb().exists('ext_management_systems', name=self.name)
 
     @property
     def _all_available_policy_profiles(self):
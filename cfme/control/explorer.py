@@ -504,11 +504,7 @@ class BaseCondition(Updateable, Pretty):
 
     @property
     def exists(self):
-        conditions = cfmedb()["conditions"]
-        return cfmedb().session\
-            .query(conditions.description)\
-            .filter(conditions.description == self.description)\
-            .count() > 0
+        return cfmedb().exists("conditions", description=self.description)
 
     def create(self, cancel=False):
         """Creates new Condition according to the informations filed in constructor.
@@ -627,11 +623,7 @@ class BasePolicy(Updateable, Pretty):
 
     @property
     def exists(self):
-        policies = cfmedb()["miq_policies"]
-        return cfmedb().session\
-            .query(policies.description)\
-            .filter(policies.description == self.description)\
-            .count() > 0
+        return cfmedb().exists("miq_policies", description=self.description)
 
     @property
     def _on_detail_page(self):
@@ -981,11 +973,7 @@ class Alert(Updateable, Pretty):
 
     @property
     def exists(self):
-        alerts = cfmedb()["miq_alerts"]
-        return cfmedb().session\
-            .query(alerts.description)\
-            .filter(alerts.description == self.description)\
-            .count() > 0
+        return cfmedb().exists("miq_alerts", description=self.description)
 
     def create(self, cancel=False):
         sel.force_navigate("control_explorer_alert_new")
@@ -1238,11 +1226,7 @@ class Action(Updateable, Pretty):
 
     @property
     def exists(self):
-        actions = cfmedb()["miq_actions"]
-        return cfmedb().session\
-            .query(actions.description)\
-            .filter(actions.description == self.description)\
-            .count() > 0
+        return cfmedb().exists("miq_actions", description=self.description)
 
     @property
     def _default_values(self):
@@ -1357,12 +1341,8 @@ class PolicyProfile(Updateable, Pretty):
 
         Returns: :py:class:`bool` signalizing the presence of the Policy Profile in database.
         """
-        miq_sets = cfmedb()["miq_sets"]
-        return cfmedb().session\
-            .query(miq_sets.description)\
-            .filter(
-                miq_sets.description == self.description and miq_sets.set_type == "MiqPolicySet")\
-            .count() > 0
+        return cfmedb().exists(
+            "miq_sets", description=self.description, set_type="MiqPolicySet")
 
     def create(self, cancel=False):
         """Create this Policy Profile.
@@ -1514,12 +1494,8 @@ class BaseAlertProfile(Updateable, Pretty):
 
         Returns: :py:class:`bool` signalizing the presence of the Alert Profile in database.
         """
-        miq_sets = cfmedb()["miq_sets"]
-        return cfmedb().session\
-            .query(miq_sets.description)\
-            .filter(
-                miq_sets.description == self.description and miq_sets.set_type == "MiqAlertSet")\
-            .count() > 0
+        return cfmedb().exists(
+            "miq_sets", description=self.description, set_type="MiqAlertSet")
 
     def create(self, cancel=False):
         """Create this Alert Profile.
@@ -8,16 +8,19 @@ Members of this module are available in the the pytest.sel namespace, e.g.::
 
     pytest.sel.click(locator)
 
-:var ajax_wait_js: A Javascript function for ajax wait checking
+:var ajax_wait_mode: How :py:func:`wait_for_ajax` waits, ``'async'`` or ``'poll'``
+:var ajax_wait_stats: Time spent waiting for ajax by UI action
 :var class_selector: Regular expression to detect simple CSS locators
 """
 
 from time import sleep, time
 from xml.sax.saxutils import quoteattr
-from collections import Iterable
+from collections import Iterable, defaultdict
 from textwrap import dedent
 import json
 import re
+import sys
+import weakref
 from selenium.common.exceptions import \
     (ErrorInResponseException, InvalidSwitchToTargetException, NoSuchAttributeException,
      NoSuchElementException, NoAlertPresentException, UnexpectedAlertPresentException,
@@ -45,6 +48,11 @@ _thread_local = local()
 
 class_selector = re.compile(r"^(?:[a-zA-Z][a-zA-Z0-9]*)?(?:[#.][a-zA-Z0-9_-]+)+$")
 
+#: How :py:func:`wait_for_ajax` waits, ``'async'`` or ``'poll'``
+ajax_wait_mode = 'async'
+#: Seconds :py:func:`wait_for_ajax` waits at most
+ajax_wait_timeout = 30
+
 
 class ByValue(Pretty):
     pretty_attrs = ['value']
@@ -216,15 +224,71 @@ def in_flight():
         return execute_script(js.in_flight)
 
 
-def wait_for_ajax():
-    """
-    Waits until all ajax timers are complete, in other words, waits until there are no
-    more pending ajax requests, page load should be finished completely.
+class AjaxWaitStats(object):
+    """Accumulated :py:func:`wait_for_ajax` statistics of a single UI action"""
+    __slots__ = ('calls', 'duration', 'longest', 'timeouts', 'requests')
 
-    Raises:
-        TimedOutError: when ajax did not load in time
+    def __init__(self):
+        self.calls = 0
+        self.duration = 0.0
+        self.longest = 0.0
+        self.timeouts = 0
+        self.requests = 0
+
+    def __repr__(self):
+        return "<AjaxWaitStats calls={} duration={:.1f} longest={:.1f} timeouts={}>".format(
+            self.calls, self.duration, self.longest, self.timeouts)
+
+
+#: :py:class:`AjaxWaitStats` of every UI action waiting for ajax, keyed by
+#: ``(action, filename, lineno)``. The action is the function of this module that waited
+#: (``click``, ``fill``...), the location is where it was called from outside of this module.
+ajax_wait_stats = defaultdict(AjaxWaitStats)
+
+
+def _ajax_wait_site():
+    frame = sys._getframe(1)
+    own_file = frame.f_code.co_filename
+    action = 'wait_for_ajax'
+    while frame.f_back is not None and frame.f_code.co_filename == own_file:
+        frame = frame.f_back
+        if frame.f_code.co_filename == own_file:
+            action = frame.f_code.co_name
+    return action, frame.f_code.co_filename, frame.f_lineno
+
+
+def log_ajax_stats(limit=20):
+    """Logs the UI actions that spent the most time waiting for ajax
+
+    Args:
+        limit: How many actions to log, ``None`` for all of them.
     """
+    if not ajax_wait_stats:
+        return
+    logger.info('UI actions by time spent waiting for ajax:')
+    sites = sorted(ajax_wait_stats.iteritems(), key=lambda item: item[1].duration, reverse=True)
+    for (action, filename, lineno), stats in sites[:limit]:
+        logger.info('  {:.1f}s in {} calls (longest {:.1f}s, {} requests, {} timeouts)'
+            ' to {} at {}:{}'.format(stats.duration, stats.calls, stats.longest, stats.requests,
+                stats.timeouts, action, filename, lineno))
 
+
+def _wait_for_ajax_async():
+    """Waits for ajax in a single script call, see :py:data:`cfme.js.ajax_idle_async`"""
+    driver = browser()
+    timeout_set = getattr(_thread_local, 'ajax_script_timeout_browser', None)
+    if timeout_set is None or timeout_set() is not driver:
+        # The script has to be given time to finish on its own
+        driver.set_script_timeout(ajax_wait_timeout + 5)
+        _thread_local.ajax_script_timeout_browser = weakref.ref(driver)
+    return driver.execute_async_script(js.ajax_idle_async, ajax_wait_timeout, 50)
+
+
+def _wait_for_ajax_poll():
+    """Waits for ajax by checking :py:func:`in_flight` every 0.1 seconds
+
+    Returns: ``True`` if nothing was in flight in time, ``None`` otherwise
+    """
     _thread_local.ajax_log_msg = ''
 
     def _nothing_in_flight():
@@ -248,9 +312,56 @@ def wait_for_ajax():
 
         return not anything_in_flight
 
-    wait_for(
+    # A silently failed wait_for returns None instead of a result
+    result = wait_for(
         _nothing_in_flight,
-        num_sec=30, delay=0.1, message="wait for ajax", quiet=True, silent_failure=True)
+        num_sec=ajax_wait_timeout, delay=0.1, message="wait for ajax", quiet=True,
+        silent_failure=True)
+    return result.out if result is not None else None
+
+
+def wait_for_ajax():
+    """
+    Waits until all ajax timers are complete, in other words, waits until there are no
+    more pending ajax requests, page load should be finished completely.
+
+    How it waits depends on :py:data:`ajax_wait_mode`. In the ``async`` mode the page itself
+    checks for ajax until it's idle and the wait takes a single script call, the ``poll`` mode
+    checks :py:func:`in_flight` every 0.1 seconds. If the async wait fails, e.g. because the page
+    was reloaded while waiting, it falls back to polling. The time spent waiting is recorded in
+    :py:data:`ajax_wait_stats`.
+
+    A wait that doesn't finish in :py:data:`ajax_wait_timeout` seconds is logged and ignored.
+    """
+    start = time()
+    idle, requests = None, 0
+    if ajax_wait_mode == 'async':
+        try:
+            result = _wait_for_ajax_async()
+        except WebDriverException as e:
+            logger.trace('Async ajax wait failed, polling instead: {}'.format(e.msg))
+        else:
+            idle, requests = result['idle'], result['requests']
+            if idle:
+                if requests:
+                    logger.trace('Ajax done, {} requests in {}ms'.format(
+                        requests, result['waited']))
+            else:
+                running = ', '.join(
+                    ["{}: {}".format(k, str(v)) for k, v in result['state'].iteritems()])
+                logger.warning(
+                    "Could not do wait for ajax in time but ignoring ({})".format(running))
+    if idle is None:
+        idle = bool(_wait_for_ajax_poll())
+
+    duration = time() - start
+    stats = ajax_wait_stats[_ajax_wait_site()]
+    stats.calls += 1
+    stats.duration += duration
+    stats.longest = max(stats.longest, duration)
+    stats.requests += requests
+    if not idle:
+        stats.timeouts += 1
 
 
 def is_displayed(loc, _deep=0):
@@ -8,7 +8,8 @@
 import ui_navigate as nav
 from cfme.fixtures import pytest_selenium as sel
 from cfme.infrastructure import provider
-from cfme.web_ui import Quadicon, Region, listaccordion as list_acc, paginator, toolbar as tb
+from cfme.web_ui import (
+    Quadicon, Region, listaccordion as list_acc, quadicon_search, toolbar as tb)
 from functools import partial
 from utils.pretty import Pretty
 from utils.wait import wait_for
@@ -116,9 +117,4 @@ def get_all_clusters(do_not_navigate=False):
     """Returns list of all clusters"""
     if not do_not_navigate:
         sel.force_navigate('infrastructure_clusters')
-    clusters = set([])
-    for page in paginator.pages():
-        for title in sel.elements(
-                "//div[@id='quadicon']/../../../tr/td/a[contains(@href,'cluster/show')]"):
-            clusters.add(sel.get_attribute(title, "title"))
-    return clusters
+    return set(quadicon_search.names(href_contains='cluster/show'))
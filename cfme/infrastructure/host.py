@@ -20,7 +20,7 @@ import utils.conf as conf
 from cfme.exceptions import HostNotFound
 from cfme.web_ui import (
     Region, Quadicon, Form, Select, CheckboxTree, CheckboxTable, DriftGrid, fill, form_buttons,
-    paginator
+    paginator, quadicon_search
 )
 from cfme.web_ui.form_buttons import FormButton
 from cfme.web_ui import listaccordion as list_acc
@@ -256,11 +256,7 @@ class Host(Updateable, Pretty):
     @property
     def exists(self):
         sel.force_navigate('infrastructure_hosts')
-        for page in paginator.pages():
-            if sel.is_displayed(Quadicon(self.name, 'host')):
-                return True
-        else:
-            return False
+        return quadicon_search.find(self.name, 'host') is not None
 
     @property
     def has_valid_credentials(self):
@@ -313,12 +309,7 @@ class Host(Updateable, Pretty):
         list_acc.select('Relationships', version.pick({version.LOWEST: 'Show Datastores',
                                                        '5.3': 'Show all Datastores'}))
 
-        datastores = set([])
-        for page in paginator.pages():
-            for title in sel.elements(
-                    "//div[@id='quadicon']/../../../tr/td/a[contains(@href,'storage/show')]"):
-                datastores.add(sel.get_attribute(title, "title"))
-        return datastores
+        return set(quadicon_search.names(href_contains='storage/show'))
 
     @property
     def get_db_id(self):
@@ -455,12 +446,7 @@ def get_all_hosts(do_not_navigate=False):
     """Returns list of all hosts"""
     if not do_not_navigate:
         sel.force_navigate('infrastructure_hosts')
-    hosts = set([])
-    for page in paginator.pages():
-        for title in sel.elements(
-                "//div[@id='quadicon']/../../../tr/td/a[contains(@href,'host/show')]"):
-            hosts.add(sel.get_attribute(title, "title"))
-    return hosts
+    return set(quadicon_search.names(href_contains='host/show'))
 
 
 def find_quadicon(host, do_not_navigate=False):
@@ -472,9 +458,7 @@ def find_quadicon(host, do_not_navigate=False):
     """
     if not do_not_navigate:
         sel.force_navigate('infrastructure_hosts')
-    for page in paginator.pages():
-        quadicon = Quadicon(host, "host")
-        if sel.is_displayed(quadicon):
-            return quadicon
-    else:
+    quadicon = quadicon_search.find(host, "host")
+    if quadicon is None:
         raise HostNotFound("Host '{}' not found in UI!".format(host))
+    return quadicon
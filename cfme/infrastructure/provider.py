@@ -15,6 +15,7 @@ import ui_navigate as nav
 
 import cfme
 from utils.db import cfmedb
+from utils.db_queries import get_provider_stats, provider_stats
 import cfme.fixtures.pytest_selenium as sel
 import cfme.web_ui.flash as flash
 import cfme.web_ui.menu  # so that menu is already loaded before grafting onto it
@@ -24,6 +25,7 @@ from cfme.exceptions import (
     HostStatsNotContains, ProviderHasNoProperty, ProviderHasNoKey, UnknownProviderType
 )
 from cfme.web_ui import Region, Quadicon, Form, Select, CheckboxTree, fill, form_buttons, paginator
+from cfme.web_ui import quadicon_search
 from cfme.web_ui import Timelines
 from cfme.web_ui.form_buttons import FormButton
 from utils.log import logger
@@ -298,7 +300,8 @@ class Provider(Updateable, Pretty):
             KeyError: If the host stats does not contain the specified key.
             ProviderHasNoProperty: If the provider does not have the property defined.
         """
-        host_stats = client.stats(*stats_to_match)
+        # The provider doesn't change while CFME catches up with it, polls reuse its stats
+        host_stats = client.stats(*stats_to_match, max_age=client.stats_ttl)
 
         if refresh_timer:
             if refresh_timer.is_it_time():
@@ -308,9 +311,18 @@ class Provider(Updateable, Pretty):
                 sel.handle_alert(cancel=False)
                 refresh_timer.reset()
 
+        if db:
+            # All the stats counted by one query, instead of a query per stat
+            cfme_stats = self._db_stats(
+                *[stat for stat in stats_to_match if stat in provider_stats])
+        else:
+            cfme_stats = {}
         for stat in stats_to_match:
             try:
-                cfme_stat = getattr(self, stat)(db=db)
+                if stat in cfme_stats:
+                    cfme_stat = cfme_stats[stat]
+                else:
+                    cfme_stat = getattr(self, stat)(db=db)
                 logger.info(' Matching stat [%s], Host(%s), CFME(%s)' %
                             (stat, host_stats[stat], cfme_stat))
                 if host_stats[stat] != cfme_stat:
@@ -322,6 +334,10 @@ class Provider(Updateable, Pretty):
         else:
             return True
 
+    def _db_stats(self, *stats):
+        """ Returns a dict of the providers stats counted in the database, in a single query."""
+        return get_provider_stats([self.name], stats)[self.name]
+
     def _on_detail_page(self):
         """ Returns ``True`` if on the providers detail page, ``False`` if not."""
         return sel.is_displayed(
@@ -330,77 +346,40 @@ class Provider(Updateable, Pretty):
     def num_template(self, db=True):
         """ Returns the providers number of templates, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            vms = cfmedb()["vms"]
-            truthy = True  # This is to prevent a lint error with ==True
-            temlist = list(cfmedb().session.query(vms.name)
-                           .join(ext_management_systems, vms.ems_id == ext_management_systems.id)
-                           .filter(ext_management_systems.name == self.name)
-                           .filter(vms.template == truthy))
-            return len(temlist)
+            return self._db_stats('num_template')['num_template']
         else:
             return int(self.get_detail("Relationships", "Templates"))
 
     def num_vm(self, db=True):
         """ Returns the providers number of instances, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            vms = cfmedb()["vms"]
-            falsey = False  # This is to prevent a lint error with ==False
-            vmlist = list(cfmedb().session.query(vms.name)
-                          .join(ext_management_systems, vms.ems_id == ext_management_systems.id)
-                          .filter(ext_management_systems.name == self.name)
-                          .filter(vms.template == falsey))
-            return len(vmlist)
+            return self._db_stats('num_vm')['num_vm']
         return int(self.get_detail("Relationships", "VMs"))
 
     def num_datastore(self, db=True):
         """ Returns the providers number of templates, as shown on the Details page."""
         if db:
-            results = list(cfmedb().engine.execute(
-                'SELECT DISTINCT storages.name, hosts.ems_id '
-                'FROM ext_management_systems, hosts, storages, hosts_storages '
-                'WHERE hosts.id=hosts_storages.host_id AND '
-                'storages.id=hosts_storages.storage_id AND '
-                'hosts.ems_id=ext_management_systems.id AND '
-                'ext_management_systems.name=\'{}\''.format(self.name)))
-            return len(results)
+            return self._db_stats('num_datastore')['num_datastore']
         else:
             return int(self.get_detail("Relationships", "Datastores"))
 
     def num_host(self, db=True):
         """ Returns the providers number of instances, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            hosts = cfmedb()["hosts"]
-            hostlist = list(cfmedb().session.query(hosts.name)
-                            .join(ext_management_systems, hosts.ems_id == ext_management_systems.id)
-                            .filter(ext_management_systems.name == self.name))
-            return len(hostlist)
+            return self._db_stats('num_host')['num_host']
         else:
             return int(self.get_detail("Relationships", "Hosts"))
 
     def num_cluster(self, db=True):
         """ Returns the providers number of templates, as shown on the Details page."""
         if db:
-            ext_management_systems = cfmedb()["ext_management_systems"]
-            clusters = cfmedb()["ems_clusters"]
-            clulist = list(cfmedb().session.query(clusters.name)
-                           .join(ext_management_systems,
-                                 clusters.ems_id == ext_management_systems.id)
-                           .filter(ext_management_systems.name == self.name))
-            return len(clulist)
+            return self._db_stats('num_cluster')['num_cluster']
         else:
             return int(self.get_detail("Relationships", "Clusters"))
 
     @property
     def exists(self):
-        ems = cfmedb()['ext_management_systems']
-        provs = (prov[0] for prov in cfmedb().session.query(ems.name))
-        if self.name in provs:
-            return True
-        else:
-            return False
+        return cfmedb().exists('ext_management_systems', name=self.name)
 
     def load_all_provider_vms(self):
         """ Loads the list of VMs that are running under the provider. """
@@ -568,16 +547,11 @@ def get_all_providers(do_not_navigate=False):
     """Returns list of all providers"""
     if not do_not_navigate:
         sel.force_navigate('infrastructure_providers')
-    providers = set([])
     link_marker = version.pick({
         version.LOWEST: "ext_management_system",
         "5.2.5": "ems_infra"
     })
-    for page in paginator.pages():
-        for title in sel.elements("//div[@id='quadicon']/../../../tr/td/a[contains(@href,"
-                "'{}/show')]".format(link_marker)):
-            providers.add(sel.get_attribute(title, "title"))
-    return providers
+    return set(quadicon_search.names(href_contains='{}/show'.format(link_marker)))
 
 
 def get_credentials_from_config(credential_config_name):
@@ -195,9 +195,7 @@ class PXEServer(Updateable, Pretty):
         Checks if the PXE server already exists
         """
         if db:
-            dbs = cfmedb()
-            candidates = list(dbs.session.query(dbs["pxe_servers"]))
-            return self.name in [s.name for s in candidates]
+            return cfmedb().exists("pxe_servers", name=self.name)
         else:
             sel.force_navigate('infrastructure_pxe_servers')
             try:
@@ -359,9 +357,7 @@ class CustomizationTemplate(Updateable, Pretty):
         Checks if the Customization template already exists
         """
         if db:
-            dbs = cfmedb()
-            candidates = list(dbs.session.query(dbs["customization_templates"]))
-            return self.name in [s.name for s in candidates]
+            return cfmedb().exists("customization_templates", name=self.name)
         else:
             sel.force_navigate('infrastructure_pxe_templates')
             try:
@@ -522,16 +518,8 @@ class ISODatastore(Updateable, Pretty):
         Checks if the ISO Datastore already exists
         """
         if db:
-            iso = cfmedb()['iso_datastores']
-            ems = cfmedb()['ext_management_systems']
-            name = self.provider
-            iso_ds = list(cfmedb().session.query(iso.id)
-                          .join(ems, iso.ems_id == ems.id)
-                          .filter(ems.name == name))
-            if iso_ds:
-                return True
-            else:
-                return False
+            ems = cfmedb().get_one('ext_management_systems', name=self.provider)
+            return ems is not None and cfmedb().exists('iso_datastores', ems_id=ems.id)
         else:
             sel.force_navigate('infrastructure_iso_datastores')
             try:
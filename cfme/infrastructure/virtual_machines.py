@@ -7,7 +7,7 @@ from cfme.fixtures import pytest_selenium as sel
 from cfme.services import requests
 from cfme.web_ui import (
     CheckboxTree, Form, Region, Quadicon, Tree, accordion, fill, flash, form_buttons, paginator,
-    toolbar, Calendar, Select
+    quadicon_search, toolbar, Calendar, Select
 )
 from cfme.web_ui.menu import nav
 from functools import partial
@@ -206,7 +206,6 @@ class Common(object):
         Returns: :py:class:`cfme.web_ui.Quadicon` instance
         Raises: VmNotFound
         """
-        quadicon = Quadicon(self.name, "vm")
         if not do_not_navigate:
             if is_vm:
                 self.provider_crud.load_all_provider_vms()
@@ -221,14 +220,12 @@ class Common(object):
             else:
                 raise TemplateNotFound("Template '{}' not found in UI!".format(self.name))
 
-        paginator.results_per_page(1000)
-        for page in paginator.pages():
-            if sel.is_displayed(quadicon):
-                if mark:
-                    sel.check(quadicon.checkbox())
-                return quadicon
-        else:
+        quadicon = quadicon_search.find(self.name, "vm")
+        if quadicon is None:
             raise VmNotFound("VM '{}' not found in UI!".format(self.name))
+        if mark:
+            sel.check(quadicon.checkbox())
+        return quadicon
 
     def does_vm_exist_on_provider(self):
         """Check if VM exists on provider itself"""
@@ -838,13 +835,10 @@ def find_quadicon(vm_name, do_not_navigate=False):
     if not paginator.page_controls_exist():
         raise VmNotFound("VM '{}' not found in UI!".format(vm_name))
 
-    paginator.results_per_page(1000)
-    for page in paginator.pages():
-        quadicon = Quadicon(vm_name, "vm")
-        if sel.is_displayed(quadicon):
-            return quadicon
-    else:
+    quadicon = quadicon_search.find(vm_name, "vm")
+    if quadicon is None:
         raise VmNotFound("VM '{}' not found in UI!".format(vm_name))
+    return quadicon
 
 
 def remove(vm_names, cancel=True, provider_crud=None):
@@ -972,14 +966,8 @@ def get_all_vms(do_not_navigate=False):
     if not paginator.page_controls_exist():
         return vms
 
-    paginator.results_per_page(1000)
-    for page in paginator.pages():
-        try:
-            for page in paginator.pages():
-                for title in sel.elements(QUADICON_TITLE_LOCATOR):
-                    vms.add(sel.get_attribute(title, "title"))
-        except sel.NoSuchElementException:
-            pass
+    # for provider specific vm/template pages too, like QUADICON_TITLE_LOCATOR
+    vms.update(quadicon_search.names(href_contains=('vm_infra/x_show', '/show/')))
     return vms
 
 
@@ -108,11 +108,7 @@ class Schedule(Updateable, Pretty):
 
     @property
     def exists(self):
-        schedules = cfmedb()["miq_schedules"]
-        return cfmedb().session\
-            .query(schedules.name)\
-            .filter(schedules.name == self.name)\
-            .count() > 0
+        return cfmedb().exists("miq_schedules", name=self.name)
 
     def _fill(self, action):
         fill(
@@ -14,3 +14,188 @@ return {
     document: document.readyState
 };
 """
+
+# Waits in the page until no ajax is in flight, for execute_async_script
+# Hooks jQuery and Prototype once per page to count the requests started, so that requests fired
+# and finished between two checks are still seen.
+# arguments: timeout in seconds, poll interval in milliseconds
+# calls back with {idle: whether the page went idle in time, waited: milliseconds waited,
+#                  requests: requests started while waiting, state: like in_flight}
+ajax_idle_async = """
+var callback = arguments[arguments.length - 1];
+var timeout = arguments[0] * 1000, interval = arguments[1], started = new Date().getTime();
+function isHidden(el) {if(el === null) return true; return el.offsetParent === null;}
+
+if (window.cfmeAjaxHook === undefined) {
+    var hook = window.cfmeAjaxHook = {started: 0, completed: 0};
+    if (window.jQuery !== undefined) {
+        jQuery(document).ajaxSend(function() { hook.started++; });
+        jQuery(document).ajaxComplete(function() { hook.completed++; });
+    }
+    if (window.Ajax !== undefined && Ajax.Responders !== undefined) {
+        Ajax.Responders.register({
+            onCreate: function() { hook.started++; },
+            onComplete: function() { hook.completed++; }
+        });
+    }
+}
+var startedRequests = window.cfmeAjaxHook.started;
+
+function state() {
+    return {
+        jquery: window.jQuery !== undefined ? jQuery.active : 0,
+        prototype: window.Ajax !== undefined ? Ajax.activeRequestCount : 0,
+        miq: window.miqAjaxTimers,
+        spinner: (!isHidden(document.getElementById("spinner_div")))
+            && isHidden(document.getElementById("lightbox_div")),
+        document: document.readyState
+    };
+}
+function check() {
+    var s = state(), waited = new Date().getTime() - started;
+    var idle = !(s.jquery > 0 || s.prototype > 0 || s.spinner || s.document != "complete");
+    if (idle || waited >= timeout) {
+        callback({idle: idle, waited: waited, state: s,
+                  requests: window.cfmeAjaxHook.started - startedRequests});
+    } else {
+        setTimeout(check, interval);
+    }
+}
+check();
+"""
+
+# Reads the text of a table's header cells and body rows in one go
+# arguments: header container, child tag of the header container holding the header rows (or null),
+# header row offset, body container, child tag of the body container (or null), body row offset
+table_snapshot = """
+function childrenByTag(el, tags) {
+    var result = [];
+    for (var i = 0; i < el.children.length; i++) {
+        if (tags.indexOf(el.children[i].tagName) >= 0) { result.push(el.children[i]); }
+    }
+    return result;
+}
+function container(el, tag) { return tag ? childrenByTag(el, [tag])[0] : el; }
+function cellTexts(row, tags) {
+    var cells = childrenByTag(row, tags), texts = [];
+    for (var i = 0; i < cells.length; i++) {
+        var text = cells[i].innerText !== undefined ? cells[i].innerText : cells[i].textContent;
+        texts.push(text.replace(/\\s+/g, " ").replace(/^ | $/g, ""));
+    }
+    return texts;
+}
+
+var headerRow = childrenByTag(container(arguments[0], arguments[1]), ["TR"])[arguments[2]];
+var bodyRows = childrenByTag(container(arguments[3], arguments[4]), ["TR"]);
+var rows = [];
+for (var i = arguments[5]; i < bodyRows.length; i++) { rows.push(cellTexts(bodyRows[i], ["TD"])); }
+return {headers: headerRow ? cellTexts(headerRow, ["TD", "TH"]) : [], rows: rows};
+"""
+
+# Expands a whole tree and reads its contents, see cfme.web_ui.Tree.read_contents
+# arguments: tree root element, XPath of the top level nodes (relative to the root), XPath of the
+# child nodes of a node, XPath of a node's label, XPath of the element holding a node's expanded
+# state, the attribute of that element and the value it contains when the node is expanded,
+# XPath of the element to click to expand a node, cache token, read even if nodes were expanded
+#
+# Nodes are expanded breadth first in one go. If any were clicked, {clicked: n} is returned,
+# so the caller can wait for lazy loaded nodes and call again. Otherwise, the contents are returned
+# as nested [label, children or null] lists, and the root is marked with the token.
+# The mark is removed when nodes are added to or removed from the tree.
+tree_read = """
+var root = arguments[0], topNodes = arguments[1], childNodes = arguments[2], label = arguments[3],
+    expandable = arguments[4], expandedAttr = arguments[5], expandedValue = arguments[6],
+    expander = arguments[7], token = arguments[8], forceRead = arguments[9];
+
+function all(path, context) {
+    var result = document.evaluate(
+        path, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) { nodes.push(result.snapshotItem(i)); }
+    return nodes;
+}
+function first(path, context) { return all(path, context)[0]; }
+function isExpanded(node) {
+    var el = first(expandable, node);
+    if (!el) { return true; }
+    return (el.getAttribute(expandedAttr) || "").indexOf(expandedValue) >= 0;
+}
+function read(node) {
+    var labelEl = first(label, node), children = all(childNodes, node), contents = [];
+    for (var i = 0; i < children.length; i++) { contents.push(read(children[i])); }
+    var text = labelEl ? labelEl.textContent.replace(/\\s+/g, " ").replace(/^ | $/g, "") : "";
+    return [text, contents.length ? contents : null];
+}
+
+var clicked = 0, queue = all(topNodes, root);
+while (queue.length) {
+    var node = queue.shift();
+    if (!node.getAttribute("data-cfme-expand-clicked") && !isExpanded(node)) {
+        // Never click a node twice, leaves may never look expanded
+        node.setAttribute("data-cfme-expand-clicked", "true");
+        var el = first(expander, node);
+        if (el) {
+            if (window.jQuery) { jQuery(el).click(); } else { el.click(); }
+            clicked++;
+        }
+    }
+    queue.push.apply(queue, all(childNodes, node));
+}
+if (clicked && !forceRead) { return {clicked: clicked}; }
+
+if (window.MutationObserver && !root.cfmeTreeObserver) {
+    root.cfmeTreeObserver = new MutationObserver(function(mutations) {
+        var structural = /^(LI|UL|TBODY|TABLE)$/;
+        for (var i = 0; i < mutations.length; i++) {
+            var changed = [].slice.call(mutations[i].addedNodes).concat(
+                [].slice.call(mutations[i].removedNodes));
+            for (var j = 0; j < changed.length; j++) {
+                if (structural.test(changed[j].tagName)) {
+                    root.removeAttribute("data-cfme-tree-read");
+                    return;
+                }
+            }
+        }
+    });
+    root.cfmeTreeObserver.observe(root, {childList: true, subtree: true});
+}
+var contents = [], nodes = all(topNodes, root);
+for (var i = 0; i < nodes.length; i++) { contents.push(read(nodes[i])); }
+root.setAttribute("data-cfme-tree-read", token);
+return {clicked: clicked, contents: contents};
+"""
+
+# Checks if a tree read by tree_read is unchanged, arguments: tree root element, cache token
+tree_read_valid = """
+return arguments[0].getAttribute("data-cfme-tree-read") === arguments[1];
+"""
+
+# Scrapes the titles, links and quadrant contents of all the quadicons on the current page
+# Quadrants are keyed by corner letter, with the text and the image file name (without extension)
+quadicon_scrape = """
+function all(path, context) {
+    var result = document.evaluate(
+        path, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) { nodes.push(result.snapshotItem(i)); }
+    return nodes;
+}
+var anchors = all("//div[@id='quadicon']/../../../tr/td/a", document), quads = [];
+for (var i = 0; i < anchors.length; i++) {
+    var container = anchors[i].parentNode.parentNode.parentNode, quadrants = {};
+    var corners = container.getElementsByTagName("div");
+    for (var j = 0; j < corners.length; j++) {
+        var corner = /(?:^|\\s)\\w*?([a-g])72(?:\\s|$)/.exec(corners[j].className);
+        if (!corner) { continue; }
+        var img = corners[j].getElementsByTagName("img")[0], src = null;
+        if (img) { src = img.getAttribute("src").split("/").pop().replace(/\\.[^.]*$/, ""); }
+        quadrants[corner[1]] = {txt: corners[j].textContent.replace(/^\\s+|\\s+$/g, ""), img: src};
+    }
+    quads.push({
+        name: anchors[i].getAttribute("title"),
+        href: anchors[i].getAttribute("href"),
+        quadrants: quadrants
+    });
+}
+return quads;
+"""
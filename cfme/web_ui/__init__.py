@@ -34,6 +34,7 @@
   * :py:mod:`cfme.web_ui.listaccordion`
   * :py:mod:`cfme.web_ui.menu`
   * :py:mod:`cfme.web_ui.paginator`
+  * :py:mod:`cfme.web_ui.quadicon_search`
   * :py:mod:`cfme.web_ui.snmp_form`
   * :py:mod:`cfme.web_ui.tabstrip`
   * :py:mod:`cfme.web_ui.toolbar`
@@ -43,6 +44,8 @@
 import os
 import re
 import types
+import uuid
+from copy import deepcopy
 from datetime import date
 from collections import Sequence, Mapping, Callable
 
@@ -51,7 +54,7 @@ from selenium.common.exceptions import NoSuchElementException, MoveTargetOutOfBo
 from multimethods import multimethod, multidispatch, Anything
 
 import cfme.fixtures.pytest_selenium as sel
-from cfme import exceptions
+from cfme import exceptions, js
 from cfme.fixtures.pytest_selenium import browser
 from utils import version
 # For backward compatibility with code that pulls in Select from web_ui instead of sel
@@ -237,6 +240,11 @@ class Table(Pretty):
         * :py:meth:`click_rows_by_cells`
         * :py:meth:`click_row_by_cells`
 
+    These methods read the whole table with a single script call (see :py:meth:`snapshot`), match
+    the cell texts in python and only look up the WebElements of the matched rows when they're
+    used. Set :py:attr:`snapshot_mode` to ``False`` on a table to have them match WebElements
+    cell by cell instead.
+
     Note:
 
         A table is defined by the containers of the header and data areas, and offsets to them.
@@ -247,6 +255,9 @@ class Table(Pretty):
 
     pretty_attrs = ['_lock']
 
+    #: Match rows against a :py:meth:`snapshot` of the table instead of its WebElements
+    snapshot_mode = True
+
     def __init__(self, table_locator, header_offset=0, body_offset=0):
         self._headers = None
         self._header_indexes = None
@@ -320,6 +331,34 @@ class Table(Pretty):
         self._header_indexes = {
             self._convert_header(cell.text): self.headers.index(cell) for cell in self.headers}
 
+    def _snapshot_args(self):
+        # Header and body containers, their child holding the rows, and the row offsets
+        # in the form expected by the table_snapshot script
+        table = sel.element(self)
+        return table, 'THEAD', self.header_offset, table, 'TBODY', self.body_offset
+
+    def snapshot(self):
+        """Read the header names and the text of all body rows with a single script call
+
+        Returns: A :py:class:`Table.Snapshot` of the table as it is now
+        """
+        data = sel.execute_script(js.table_snapshot, *self._snapshot_args())
+        return Table.Snapshot(self, data['headers'], data['rows'])
+
+    def _try_snapshot(self):
+        """Take a :py:meth:`snapshot` if :py:attr:`snapshot_mode` is on
+
+        Returns: A :py:class:`Table.Snapshot`, or ``None`` if snapshots are disabled or failed,
+            in which case the caller should fall back to the WebElements.
+        """
+        if not self.snapshot_mode:
+            return None
+        try:
+            return self.snapshot()
+        except sel_exceptions.WebDriverException as e:
+            logger.debug('Table snapshot failed, falling back to WebElements: {}'.format(e))
+            return None
+
     def rows(self):
         """A generator method holding the Row objects
 
@@ -382,6 +421,10 @@ class Table(Pretty):
             match all of the header: value pairs in ``cells``
 
         """
+        snapshot = self._try_snapshot()
+        if snapshot is not None:
+            return snapshot.find_rows(cells, partial_check=partial_check)
+
         # accept dicts or supertuples
         cells = dict(cells)
         cell_text_loc = './/td/descendant-or-self::*[contains(text(), "%s")]/ancestor::tr[1]'
@@ -584,6 +627,105 @@ class Table(Pretty):
             # table.create_row_from_element(row_instance) might actually work...
             return sel.move_to_element(self.row_element)
 
+    class SnapshotRow(Row):
+        """A :py:class:`Table.Row` read from a :py:class:`Table.Snapshot`
+
+        The row and cell WebElements are only looked up when they are used,
+        the text of the cells is available without talking to the browser.
+
+        Args:
+            parent_table: :py:class:`Table` containing the row
+            index: Index of the row's ``<tr>`` element in the table body, including the offset
+            texts: Text of the row's cells
+            header_indexes: :py:attr:`Table.header_indexes` as read in the snapshot
+
+        """
+        pretty_attrs = ['index', 'texts', 'table']
+
+        def __init__(self, parent_table, index, texts, header_indexes):
+            self.table = parent_table
+            self.index = index
+            self.texts = texts
+            self._header_indexes = header_indexes
+            self._row_element = None
+
+        @property
+        def row_element(self):
+            """The row's ``<tr>`` WebElement, looked up on first use"""
+            if self._row_element is None:
+                self._row_element = sel.element(
+                    'tr[%d]' % (self.index + 1), root=self.table.body)
+            return self._row_element
+
+        def __getattr__(self, name):
+            if name.startswith('_'):
+                raise AttributeError(name)
+            return self[self._header_indexes[name]]
+
+        def __getitem__(self, index):
+            if not isinstance(index, int):
+                index = self._header_indexes[self.table._convert_header(index)]
+            if index < 0:
+                return self.columns[index]
+            return sel.element('td[%d]' % (index + 1), root=self.row_element)
+
+        def __str__(self):
+            return ", ".join(["'%s'" % text for text in self.texts])
+
+        def __eq__(self, other):
+            if isinstance(other, type(self)):
+                return (self.table, self.index) == (other.table, other.index)
+            else:
+                return super(Table.SnapshotRow, self).__eq__(other)
+
+    class Snapshot(Pretty):
+        """The text content of a :py:class:`Table`, see :py:meth:`Table.snapshot`
+
+        Args:
+            table: The :py:class:`Table` this snapshot was taken from
+            headers: Text of the header cells
+            rows: Text of the cells of each body row, after the body offset
+
+        Attributes:
+            header_indexes: A dict of converted header names related to their column index
+            rows: :py:class:`Table.SnapshotRow` objects for the body rows
+
+        """
+        pretty_attrs = ['table']
+
+        def __init__(self, table, headers, rows):
+            self.table = table
+            self.headers = headers
+            self.header_indexes = {
+                table._convert_header(header): i for i, header in enumerate(headers)}
+            self.rows = [
+                Table.SnapshotRow(table, table.body_offset + i, texts, self.header_indexes)
+                for i, texts in enumerate(rows)]
+
+        def column_index(self, header):
+            """Column index of a header name or index"""
+            if isinstance(header, int):
+                return header
+            return self.header_indexes[self.table._convert_header(header)]
+
+        def find_rows(self, cells, partial_check=False):
+            """Rows matching cells, as in :py:meth:`Table.find_rows_by_cells`"""
+            cells = [(self.column_index(header), value) for header, value in dict(cells).items()]
+            if partial_check:
+                matches = lambda text, value: value in text
+            else:
+                matches = lambda text, value: text == value
+
+            def row_matches(row):
+                for index, value in cells:
+                    try:
+                        if not matches(row.texts[index], value):
+                            return False
+                    except IndexError:
+                        return False
+                return True
+            return filter(row_matches, self.rows)
+
 
 class SplitTable(Table):
     """:py:class:`Table` that supports the header and body rows being in separate tables
@@ -653,6 +795,10 @@ class SplitTable(Table):
     def _root_loc(self):
         return self._body_loc
 
+    def _snapshot_args(self):
+        return (sel.element(self._header_loc), None, self.header_offset,
+            sel.element(self._body_loc), None, self.body_offset)
+
     @property
     def header_row(self):
         """Property representing the ``<tr>`` element that contains header cells"""
@@ -801,15 +947,20 @@ class CheckboxTable(Table):
         row_checkbox = sel.element(self._checkbox_loc, root=row.locate())
         sel.checkbox(row_checkbox, set_to)
 
-    def _set_row(self, header, value, set_to=False):
+    def _set_row(self, header, value, set_to=False, snapshot=None):
         """ Internal method used to select/deselect a row by column header and cell value
 
         Args:
             header: See :py:meth:`Table.find_row`
             value: See :py:meth:`Table.find_row`
             set_to: Select if `True`, deselect if `False`
+            snapshot: A :py:class:`Table.Snapshot` to find the row in, instead of the table
         """
-        row = self.find_row(header, value)
+        if snapshot is not None:
+            rows = snapshot.find_rows({header: value})
+            row = rows[0] if rows else None
+        else:
+            row = self.find_row(header, value)
         if row:
             self._set_row_checkbox(row, set_to)
             return True
@@ -860,11 +1011,13 @@ class CheckboxTable(Table):
             set_to: Select if `True`, deselect if `False`
         """
         failed_selects = []
+        # Checking boxes doesn't change the table, so all the rows can be found in one snapshot
+        snapshot = self._try_snapshot()
         for header, values in cell_map.items():
             if isinstance(values, basestring):
                 values = [values]
             for value in values:
-                res = self._set_row(header, value, set_to)
+                res = self._set_row(header, value, set_to, snapshot)
                 if not res:
                     failed_selects.append("%s:%s" % (header, value))
         if failed_selects:
@@ -1311,9 +1464,19 @@ class Tree(Pretty):
 
     Note: Dynatrees, rely on a ``<ul><li>`` setup. We class a ``<li>`` as a node.
 
+    Note:
+      :py:meth:`read_contents` expands and reads the whole tree with a few script calls, and
+      keeps the contents until the tree is replaced or nodes are added to or removed from it,
+      e.g. by navigating away. Repeated reads, :py:meth:`find_path_to` included, are nearly free.
+
     """
     pretty_attrs = ['locator']
 
+    #: Contents read by :py:meth:`read_contents`: (cache token, contents) by tree root element id
+    _contents_cache = {}
+    #: Most script calls made to expand the tree while reading it
+    read_passes = 20
+
     def __init__(self, locator):
         self.locator = locator
 
@@ -1355,6 +1518,11 @@ class Tree(Pretty):
             self.nodes_root_continue = "./ul"
             # Label locator
             self.node_label_loc = "./span/a[@class='dynatree-title']"
+            # Locators for reading the tree with a script, see js.tree_read
+            self.read_top_nodes = self.nodes_root
+            self.read_child_nodes = "./ul/li[span/a[@class='dynatree-title']]"
+            self.read_node_label = self.node_label_loc
+            self.read_expander = "span/span[contains(@class, 'dynatree-expander')]"
         elif self._get_tag() == 'table':
             # Legacy Tree
             self.expandable = 'tr/td[1]/img'
@@ -1367,6 +1535,11 @@ class Tree(Pretty):
             self.nodes_root = None
             self.nodes_root_continue = None
             self.node_label_loc = None
+            # but a script can read it
+            self.read_top_nodes = "(.//tbody[not(tr/td[contains(@class, 'hiddenRow')])])[1]"
+            self.read_child_nodes = "./tr[not(@title)]/td/table/tbody"
+            self.read_node_label = "./tr/td[@class='standartTreeRow']/span"
+            self.read_expander = self.click_expand
         else:
             raise exceptions.TreeTypeUnknown(
                 'The locator described does not point to a known tree type')
@@ -1451,18 +1624,27 @@ class Tree(Pretty):
 
         return node
 
-    def read_contents(self, parent=None):
+    def read_contents(self, parent=None, use_cache=True):
         """Reads complete contents of the tree recursively.
 
         Tree is represented as a list. If the item in the list is string, it is leaf element and it
         is its name. If the item is a tuple, first element of the tuple is the name and second
         element is the subtree (list).
 
+        The whole tree is read with :py:meth:`script_read_contents` if possible, falling back
+        to reading it node by node.
+
         Args:
             parent: Starting element, used during recursion
+            use_cache: Use the contents from an earlier read if the tree hasn't changed since
         Returns: Tree in format mentioned in description
         """
         self._detect()
+        if parent is None:
+            try:
+                return self.script_read_contents(use_cache=use_cache)
+            except sel_exceptions.WebDriverException as e:
+                logger.debug('Script tree read failed, reading node by node: {}'.format(e))
         if parent is None and self._get_tag() == "table":
             return self._legacy_read_contents()  # Legacy
         parent = self.locator if parent is None else parent
@@ -1483,6 +1665,53 @@ class Tree(Pretty):
 
         return result if len(result) > 0 else None
 
+    def script_read_contents(self, use_cache=True):
+        """Reads complete contents of the tree with script calls, see :py:meth:`read_contents`
+
+        All collapsed nodes are expanded in one script call, which is repeated after waiting
+        for ajax until no more nodes need expanding, so lazy loaded nodes get read too.
+        Then the whole tree is read in the last call.
+
+        Args:
+            use_cache: Use the contents from an earlier read if the tree hasn't changed since
+        """
+        self._detect()
+        root_id = self.root_el.id
+        if use_cache and root_id in self._contents_cache:
+            token, contents = self._contents_cache[root_id]
+            if sel.execute_script(js.tree_read_valid, self.root_el, token):
+                return deepcopy(contents)
+
+        token = uuid.uuid4().hex
+        for i in range(self.read_passes):
+            result = sel.execute_script(js.tree_read, self.root_el, self.read_top_nodes,
+                self.read_child_nodes, self.read_node_label, self.expandable,
+                self.is_expanded_condition[0], self.is_expanded_condition[1],
+                self.read_expander, token, i == self.read_passes - 1)
+            if 'contents' in result:
+                break
+            logger.trace('Expanded {} tree nodes'.format(result['clicked']))
+            sel.wait_for_ajax()
+
+        contents = self._from_script(result['contents']) or None
+        if len(self._contents_cache) > 32:
+            # Contents of trees from pages long gone
+            self._contents_cache.clear()
+        self._contents_cache[root_id] = token, contents
+        return deepcopy(contents)
+
+    @classmethod
+    def _from_script(cls, nodes):
+        # Converts the nested [label, children] lists from js.tree_read to the read_contents format
+        result = []
+        for label, children in nodes:
+            label = label.encode('utf-8')
+            if children:
+                result.append((label, cls._from_script(children)))
+            else:
+                result.append(label)
+        return result
+
     def _legacy_read_contents(self):
         self._detect()
         entry = sel.element(".//tbody[not(tr/td[contains(@class, 'hiddenRow')])]",
@@ -2016,14 +2245,15 @@ class Quadicon(Pretty):
             this_page: Whether to look for Quadicons only on current page (do not list pages).
         Returns: :py:class:`list` of :py:class:`Quadicon`
         """
-        from cfme.web_ui import paginator  # Prevent circular imports
+        from cfme.web_ui import paginator, quadicon_search  # Prevent circular imports
         if this_page:
             pages = (None, )  # Single, current page. Since we dont care about the value, using None
         else:
             pages = paginator.pages()
         for page in pages:
-            for href in sel.elements("//div[@id='quadicon']/../../../tr/td/a"):
-                yield cls(sel.get_attribute(href, "title"), qtype)
+            # All the titles on the page in one go
+            for name in quadicon_search.page_names():
+                yield cls(name, qtype)
 
     @classmethod
     def first(cls, qtype=None):
@@ -68,6 +68,53 @@ def results_per_page(num):
     sel.select(Select(select), sel.ByText(str(num)))
 
 
+def results_per_page_max():
+    """ Changes the number of results on a page to the largest available.
+
+    Returns: Number of results per page, or ``None`` if it can't be set
+    """
+    try:
+        select = sel.element(_locator + _num_results)
+    except NoSuchElementException:
+        return None
+    # Read all the options at once, not one round trip per option
+    options = sel.execute_script(
+        "var s = arguments[0]; return {selected: s.options[s.selectedIndex].text, "
+        "options: [].map.call(s.options, function(o) { return o.text; })};", select)
+    counts = [int(text) for text in options['options'] if text.strip().isdigit()]
+    if not counts:
+        return None
+    most = max(counts)
+    if options['selected'].strip() != str(most):
+        sel.select(Select(select), sel.ByText(str(most)))
+    return most
+
+
+def current_page(per_page):
+    """ Returns the index of the current page, starting with 0.
+
+    Args:
+        per_page: Number of results per page
+    """
+    return (int(rec_offset()) - 1) // per_page
+
+
+def go_to_page(index, per_page):
+    """ Moves to a page by clicking Next or Previous, without looking at the pages in between.
+
+    Args:
+        index: Index of the page, starting with 0
+        per_page: Number of results per page
+    """
+    if index == 0:
+        reset()
+        return
+    steps = index - current_page(per_page)
+    button = next if steps > 0 else previous
+    for step in range(abs(steps)):
+        sel.click(button())
+
+
 def sort_by(sort):
     """ Changes the sort by field.
 
@@ -0,0 +1,188 @@
+"""Finding quadicons in lists of any length, with as few browser round trips as possible.
+
+Instead of checking every page of a list for a quadicon, the list is indexed: the number of
+results per page is set to the maximum, and every page is scraped with a single script call for
+the titles, links and quadrant data of all of its quadicons. Lookups then go straight to the page
+the quadicon is on. The index is reused for later lookups in the same list until the list changes,
+which is detected by the URL, the list title or the total number of items changing. Explorer lists
+share the URL of their explorer, the title tells them apart.
+
+Usage:
+
+    sel.force_navigate('infra_vms')
+    quadicon = quadicon_search.find('vm_name', 'vm')
+    if quadicon is not None:
+        sel.click(quadicon)
+
+    host_names = quadicon_search.names(href_contains='host/show')
+
+"""
+from collections import OrderedDict, namedtuple
+
+import cfme.fixtures.pytest_selenium as sel
+from cfme import js
+from cfme.web_ui import Quadicon, paginator
+from utils.log import logger
+
+#: A scraped quadicon, ``page`` is the index of its page and ``quadrants`` holds the raw
+#: quadrant data by corner letter, as returned by :py:data:`cfme.js.quadicon_scrape`
+Entry = namedtuple('Entry', ['name', 'href', 'page', 'quadrants'])
+
+# The last index built, lists are indexed one at a time
+_index = None
+
+# Title above the list, e.g. "All VMs" or the name of the explorer tree node selected
+_list_title = "//div[@class='dhtmlxInfoBarLabel' or @class='dhtmlxInfoBarLabel-2']"
+
+
+class QuadiconIndex(object):
+    """All the quadicons of a list, see :py:func:`index`
+
+    Args:
+        key: What identifies the list, see :py:func:`_list_key`
+        entries: :py:class:`Entry` objects by quadicon name, in list order
+        per_page: Number of results per page, ``None`` if the list has no paginator or the
+            number couldn't be set
+
+    """
+    def __init__(self, key, entries, per_page):
+        self.key = key
+        self.entries = entries
+        self.per_page = per_page
+
+    def go_to(self, name):
+        """Go to the page of a quadicon
+
+        Returns: ``True`` if the quadicon is in the index, ``False`` otherwise
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+        if self.per_page is not None:
+            paginator.go_to_page(entry.page, self.per_page)
+        elif self.key is not None:
+            # Without the number of results per page the current page is unknown, so the pages
+            # are stepped through from the first one
+            for page_index, page in enumerate(paginator.pages()):
+                if page_index == entry.page:
+                    break
+        return True
+
+
+def _list_key():
+    # Lists without a paginator fit on one page, they aren't worth caching
+    if not paginator.page_controls_exist():
+        return None
+    titles = sel.elements(_list_title)
+    title = sel.text(titles[0]) if titles else None
+    return sel.current_url(), title, paginator.rec_total()
+
+
+def scrape_page():
+    """Scrape the quadicons on the current page with one script call
+
+    Returns: A list of ``{'name': ..., 'href': ..., 'quadrants': {...}}`` dicts
+    """
+    return sel.execute_script(js.quadicon_scrape)
+
+
+def index(rebuild=False):
+    """Index the quadicons of the current list, or reuse the index if the list is unchanged
+
+    Args:
+        rebuild: Rebuild the index even if the list looks unchanged
+
+    Returns: A :py:class:`QuadiconIndex`
+    """
+    global _index
+    key = _list_key()
+    if not rebuild and key is not None and _index is not None and _index.key == key:
+        return _index
+
+    if key is not None:
+        per_page = paginator.results_per_page_max()
+        if per_page is not None:
+            # Changing the number of results changes the list's pages
+            key = _list_key()
+        pages = paginator.pages()
+    else:
+        per_page, pages = None, [None]
+
+    entries = OrderedDict()
+    page_index = -1
+    for page_index, page in enumerate(pages):
+        for quad in scrape_page():
+            if quad['name'] not in entries:
+                entries[quad['name']] = Entry(
+                    quad['name'], quad['href'], page_index, quad['quadrants'])
+    logger.debug('Indexed {} quadicons on {} pages'.format(len(entries), page_index + 1))
+    _index = QuadiconIndex(key, entries, per_page)
+    return _index
+
+
+def invalidate():
+    """Forget the index, for when a list changed in a way that isn't detected"""
+    global _index
+    _index = None
+
+
+def find(name, qtype=None):
+    """Go to the page of the named quadicon in the current list and return it
+
+    If the quadicon isn't where the index says, the index is rebuilt once.
+
+    Args:
+        name: Name of the quadicon
+        qtype: Type of the quadicon, see :py:class:`cfme.web_ui.Quadicon`
+
+    Returns: A :py:class:`cfme.web_ui.Quadicon`, or ``None`` if it's not in the list
+    """
+    quadicon = Quadicon(name, qtype)
+    cached = _index
+    current = index()
+    # a freshly built index won't get any better by rebuilding it
+    rebuilt = current is not cached or current.key is None
+    for attempt in range(2):
+        if current.go_to(name) and sel.is_displayed(quadicon):
+            return quadicon
+        if rebuilt:
+            break
+        current, rebuilt = index(rebuild=True), True
+    return None
+
+
+def names(href_contains=None):
+    """Names of all the quadicons in the current list
+
+    Args:
+        href_contains: Only include quadicons linking to URLs containing this string,
+            or any of the strings if it's a tuple
+    """
+    if isinstance(href_contains, basestring):
+        href_contains = (href_contains, )
+    return [entry.name for entry in index().entries.itervalues()
+        if href_contains is None or any(part in (entry.href or '') for part in href_contains)]
+
+
+def page_names():
+    """Names of the quadicons on the current page, in one script call"""
+    return [quad['name'] for quad in scrape_page()]
+
+
+def data(name, qtype):
+    """Quadrant values of a quadicon, as the :py:class:`cfme.web_ui.Quadicon` attributes would be
+
+    Args:
+        name: Name of the quadicon
+        qtype: Type of the quadicon, which decides what the quadrants mean
+
+    Returns: A dict of quadrant name: value, or ``None`` if the quadicon isn't in the list
+    """
+    entry = index().entries.get(name)
+    if entry is None:
+        return None
+    result = {}
+    for quad_name, (corner, rtype) in Quadicon.QUADS[qtype].iteritems():
+        quadrant = entry.quadrants.get(corner)
+        result[quad_name] = quadrant[rtype] if quadrant else None
+    return result
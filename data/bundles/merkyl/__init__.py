@@ -1,9 +1,13 @@
-from bottle import request, route, run, template
+from bottle import (HTTPError, _file_iter_range, parse_range_header, request, response, route, run,
+    template)
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
 import os
 import subprocess
 import tempfile
 import sys
 import cgi
+import zlib
 
 try:
     with open(sys.argv[2], "r") as f:
@@ -45,6 +49,26 @@ class Log(object):
         with open(self.f.name, "rb") as infile:
             return infile.read()
 
+    def serve(self):
+        """Streams the log, or the ``Range`` asked for, gzipped if the client accepts it"""
+        response.content_type = 'text/plain'
+        infile = open(self.f.name, "rb")
+        size = os.fstat(infile.fileno()).st_size
+        ranges = list(parse_range_header(request.environ.get('HTTP_RANGE'), size))
+        if ranges:
+            start, end = ranges[0]
+            response.status = 206
+            response.set_header('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, size))
+        else:
+            start, end = 0, size
+        body = _file_iter_range(infile, start, end - start)
+        if 'gzip' in request.environ.get('HTTP_ACCEPT_ENCODING', ''):
+            response.set_header('Content-Encoding', 'gzip')
+            body = gzip_iter(body)
+        else:
+            response.set_header('Content-Length', str(end - start))
+        return closing_iter(body, infile)
+
     def size(self):
         if self.running:
             return os.path.getsize(self.f.name)
@@ -52,6 +76,28 @@ class Log(object):
 Loggers = {}
 
 
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """Serves the logs of a test all at once"""
+    daemon_threads = True
+
+
+def gzip_iter(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def closing_iter(chunks, f):
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        f.close()
+
+
 @route('/setup/<path:path>')
 def setup(path):
     path = os.path.abspath("/" + path)
@@ -117,7 +163,9 @@ def lister():
 
 @route('/get/<name>')
 def get(name):
-    return Loggers[name].get()
+    if name not in Loggers:
+        raise HTTPError(404, "Not logging %s" % name)
+    return Loggers[name].serve()
 
 
 @route('/reset/<name>')
@@ -163,7 +211,7 @@ def quit():
 
 
 def main():
-    run(host='0.0.0.0', port=sys.argv[1])
+    run(host='0.0.0.0', port=sys.argv[1], server_class=ThreadingWSGIServer)
 
 
 if __name__ == "__main__":
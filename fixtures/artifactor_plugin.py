@@ -9,6 +9,7 @@
         server_address: 127.0.0.1
         server_port: 21212
         server_enabled: True
+        async_hooks: True
         plugins:
 
 ``log_dir`` is the destination for all artifacts
@@ -17,6 +18,9 @@
 
 ``reuse_dir`` if this is False and Artifactor comes across a dir that has
 already been used, it will die
+
+``async_hooks`` whether hooks are queued and sent by a background thread instead of waiting
+for the artifactor, True by default. Hooks whose results are used are still synchronous.
 """
 
 from urlparse import urlparse
@@ -24,6 +28,7 @@ from urlparse import urlparse
 from artifactor import ArtifactorClient
 import pytest
 from utils.conf import env, credentials
+from utils.log import art_log_queue, logger
 from utils.net import random_port, net_check
 from utils.path import project_path
 from utils.wait import wait_for
@@ -42,6 +47,12 @@ class DummyClient(object):
     def fire_hook(self, *args, **kwargs):
         return
 
+    def flush(self, timeout=None):
+        return True
+
+    def stats(self):
+        return {}
+
     def __nonzero__(self):
         # DummyClient is always False, so it's easy to see if we have an artiactor client
         return False
@@ -55,7 +66,8 @@ if art_config:
     if 'server_port' not in art_config:
         port = random_port()
         art_config['server_port'] = port
-    art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'])
+    art_client = ArtifactorClient(art_config['server_address'], art_config['server_port'],
+        async_hooks=art_config.get('async_hooks', True))
 else:
     art_client = DummyClient()
 
@@ -95,6 +107,8 @@ def pytest_configure(config):
 
 def pytest_runtest_protocol(item):
     name, location = get_test_idents(item)
+    # Log records of the previous test belong into its log
+    art_log_queue.flush(timeout=10)
     art_client.fire_hook('start_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address)
 
@@ -106,6 +120,7 @@ def pytest_runtest_teardown(item, nextitem):
         word = credentials[cred].get('password', None)
         if word:
             words.append(word)
+    art_log_queue.flush(timeout=10)
     art_client.fire_hook('finish_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address)
     art_client.fire_hook('sanitize', test_location=location, test_name=name,
@@ -137,11 +152,18 @@ def pytest_runtest_logreport(report):
 @pytest.mark.trylast
 def pytest_unconfigure():
     global proc
+    if art_client:
+        logger.info('Artifactor hook queue: {}'.format(', '.join(
+            '{}: {}'.format(key, value) for key, value in sorted(art_client.stats().items()))))
+    art_log_queue.flush(timeout=10)
+    logger.info('Artifactor log queue: {} records dropped'.format(art_log_queue.dropped))
     if not SLAVEID:
         art_client.fire_hook('finish_session')
     art_client.fire_hook('teardown_merkyl', ip=appliance_ip_address)
     if not SLAVEID:
         art_client.fire_hook('terminate')
+    # Slaves don't terminate the artifactor, their queued hooks are sent here
+    art_client.flush(timeout=60)
 
 
 if not SLAVEID:
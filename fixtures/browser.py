@@ -89,6 +89,9 @@ def pytest_exception_interact(node, call, report):
 
 
 def pytest_sessionfinish(session, exitstatus):
+    from cfme.fixtures import pytest_selenium
+    pytest_selenium.log_ajax_stats()
+
     failed_tests_template = template_env.get_template('failed_browser_tests.html')
     outfile = log_path.join('failed_browser_tests.html')
 
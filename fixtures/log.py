@@ -3,6 +3,7 @@ import collections
 import pytest
 
 from utils import log
+from utils.wait import log_wait_stats
 
 
 #: A dict of tests, and their state at various test phases
@@ -71,6 +72,7 @@ def pytest_sessionfinish(session, exitstatus):
     summary = ', '.join(results)
     logger().info(log.format_marker('Finished test run', mark='='))
     logger().info(log.format_marker(str(summary), mark='='))
+    log_wait_stats()
 
 
 def _test_status(test_name):
@@ -18,16 +18,54 @@ The Workflow
   across all nodes
 - Master enters main runtest loop, uses a generator to build lists of test groups which are then
   sent to slaves, one group at a time
+
+  - Test groups keep tests sharing a module and a parametrized id (e.g. a provider) together,
+    so their fixtures only need to be set up once on one slave
+  - If test durations were recorded on earlier runs, groups are sent longest first, so the
+    long groups start early and the short ones even out the slave run times at the end
 - For each phase of each test, the slave serializes test reports, which are then unserialized on
   the master and handed to the normal pytest reporting hooks, which is able to deal with test
   reports arriving out of order
 - Before running the last test in a group, the slave will request more tests from the master
 
   - If more tests are received, they are run
-  - If no tests are received, the slave will shut down after running its final test
+  - If no tests are left to send, the master tries to steal tests for the slave from the slave
+    with the most work queued (see below)
+  - If no tests are received, the slave runs its final test and asks again; if there are still
+    none, it shuts down
+
+- Work stealing: the master keeps track of the tests each slave has been sent but not started.
+  When an idle slave asks for tests and none are left, the master picks the busiest slave
+  and asks it to give up the untouched tail of its queue:
+
+  - A slave asking before its last test is answered right away with no tests, so it isn't kept
+    from running its last test while the busy slave gets around to the steal; it gets the
+    stolen tests when it asks again. A slave with nothing left to run isn't answered until
+    the tests are released.
+  - The busy slave gets a steal request in place of the ack of its next test report
+  - The busy slave removes the requested tests that it hasn't started from its queue, and
+    sends them back in a ``steal`` event
+  - The master sends the released tests to the idle slave
+  - Steal requests carry an id that the busy slave sends back; tests released for a steal that
+    was already called off are put back in the pool for the next slave that asks
+  - Tests in the same class are never split up, and tails shorter than ``--steal-min-tests``
+    are not worth setting the module fixtures up again on another slave, so they aren't stolen
+
+- Transports, chosen with ``--parallel-transport``:
+
+  - ``reqrep``: every event is a JSON request from the slave, which blocks until the master
+    has handled it and sent back an ack
+  - ``pushpull``: test start and report events are batched by the slaves and pushed to the master
+    without acks, msgpack encoded if msgpack is installed; the request socket is kept for events
+    that need an answer, like ``need_tests``, and steal requests are published to the slaves
+    on a control socket
+
+- Master loop latency stats, including how long slaves spent waiting on the master, are logged
+  at the end of the runtest loop
 
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
+- Test durations reported by the slaves are merged into the duration history for the next run
 
 """
 
@@ -35,7 +73,9 @@ import difflib
 import json
 import os
 import subprocess
-from collections import OrderedDict, defaultdict, namedtuple
+import time
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from itertools import count
 from threading import Timer
 
 import pytest
@@ -48,6 +88,7 @@ from fixtures.terminalreporter import reporter
 from utils import at_exit, conf
 from utils.appliance import IPAppliance
 from utils.log import create_sublogger
+from utils.path import log_path
 from utils.sprout import SproutClient
 from utils.wait import wait_for
 
@@ -82,6 +123,11 @@ def pytest_addoption(parser):
         '--sprout-version', dest='sprout_version', default=None, help="Which version to use.")
     group._addoption(
         '--sprout-date', dest='sprout_date', default=None, help="Which date to use.")
+    group._addoption('--parallel-transport', dest='parallel_transport', default='reqrep',
+        choices=['reqrep', 'pushpull'],
+        help="How slaves send events to the master, pushpull batches reports without acks.")
+    group._addoption('--steal-min-tests', dest='steal_min_tests', type=int, default=2,
+        help="Smallest number of tests an idle slave may steal from a busy one, 0 disables.")
 
 
 @pytest.mark.tryfirst
@@ -106,6 +152,28 @@ class ParallelSession(object):
         self.terminal = reporter()
         self.trdist = None
         self.slaves = {}
+        # tests sent to each slave that it hasn't started yet, in order
+        self.slave_tests = defaultdict(list)
+        # victim slaveid: (thief slaveid, node ids requested from the victim, steal id)
+        self.pending_steals = {}
+        self.steal_ids = count(1)
+        self.steals = 0
+        # thieves with nothing left to run, their need_tests is answered when a steal finishes
+        self.waiting_thieves = set()
+        # thief slaveid: stolen tests held for the thief's next need_tests
+        self.stolen_tests = defaultdict(list)
+        # released tests nobody was waiting for, sent before the remaining test groups
+        self.requeued_tests = deque()
+        # sockets and state of the pushpull transport
+        self.report_sock = None
+        self.control_sock = None
+        self.poller = None
+        self.pushed_events = deque()
+        self.pushed_received = defaultdict(int)
+        # slaveid: number of events pushed by a finished slave
+        self.finishing = {}
+        self.loop_stats = LoopStats()
+        self.durations = DurationHistory(log_path.join('test_durations.json').strpath)
         self.test_groups = self._test_item_generator()
         self.sprout_client = None
         self.sprout_timer = None
@@ -194,10 +262,12 @@ class ParallelSession(object):
 
         Raises RuntimeError if unexpected events are received.
 
+        Events pushed by the slaves have ``_pushed`` set in their event data, they mustn't be acked.
+
         """
         while True:
-            slaveid, empty, event_json = self.sock.recv_multipart()
-            event_data = json.loads(event_json)
+            slaveid, event_data = self._recv_event()
+            self.loop_stats.delivered(event_data.pop('_sent', None))
             event_name = event_data.pop('_event_name')
 
             if event_name == 'message':
@@ -212,6 +282,29 @@ class ParallelSession(object):
             else:
                 return slaveid, event_data, event_name
 
+    def _recv_event(self):
+        # Returns the next slaveid and event data pair, pushed events are handled first
+        if not self.pushed_events and self.poller is not None:
+            ready = dict(self.poller.poll())
+            if self.report_sock in ready:
+                slaveid, events = remote.unpack_events(self.report_sock.recv())
+                slaveid = str(slaveid)
+                for event_data in events:
+                    event_data['_pushed'] = True
+                    self.pushed_events.append((slaveid, event_data))
+                self.pushed_received[slaveid] += len(events)
+        if self.pushed_events:
+            return self.pushed_events.popleft()
+        slaveid, empty, event_json = self.sock.recv_multipart()
+        return slaveid, json.loads(event_json)
+
+    def _in_flight(self):
+        # True if finished slaves still have pushed events on the way
+        for slaveid, pushed in self.finishing.items():
+            if self.pushed_received[slaveid] >= pushed:
+                del self.finishing[slaveid]
+        return bool(self.finishing)
+
     def print_message(self, message, prefix='master', **markup):
         """Print a message from a node to the py.test console
 
@@ -245,16 +338,165 @@ class ParallelSession(object):
         if slave:
             slave.kill()
 
-    def send_tests(self, slaveid):
-        """Send a slave a group of tests"""
+    def send_tests(self, slaveid, idle=True):
+        """Send a slave a group of tests
+
+        Args:
+            slaveid: The slave asking for tests
+            idle: ``False`` if the slave still has its last test to run
+
+        If there are no groups left to send, try to steal some tests from another slave.
+        A slave that still has a test to run is sent no tests for now, and gets the stolen
+        tests the next time it asks. An idle slave gets its tests once the other slave has
+        released them.
+
+        """
         try:
-            tests = self.test_groups.next()
+            if self.stolen_tests.get(slaveid):
+                tests = self.stolen_tests.pop(slaveid)
+            elif self.requeued_tests:
+                tests = self.requeued_tests.popleft()
+            else:
+                tests = self.test_groups.next()
         except StopIteration:
+            if (slaveid in self._thieves() or self.start_steal(slaveid)) and idle:
+                self.waiting_thieves.add(slaveid)
+                return []
             tests = []
+        self._send_tests(slaveid, tests)
+        return tests
+
+    def _send_tests(self, slaveid, tests):
         self.send(slaveid, tests)
+        self.slave_tests[slaveid].extend(tests)
         if tests:
             self.print_message('sent %d tests to %s' % (len(tests), slaveid))
-        return tests
+
+    def _stealable_tail(self, slaveid):
+        # The first queued test may already be in use by the slave as the next item,
+        # so only the tests after it are considered. Tests in the same class are kept together,
+        # and no more than half of the queued work is taken.
+        queued = self.slave_tests[slaveid]
+        chunks = []
+        for test in queued[1:]:
+            key = test.rsplit('::', 1)[0] if test.count('::') > 1 else test
+            if chunks and chunks[-1][0] == key:
+                chunks[-1][1].append(test)
+            else:
+                chunks.append((key, [test]))
+
+        half = self.durations.group_estimate(queued) / 2.
+        tail, estimate = [], 0.
+        for key, tests in reversed(chunks):
+            chunk_estimate = self.durations.group_estimate(tests)
+            if tail and estimate + chunk_estimate > half:
+                break
+            tail[:0] = tests
+            estimate += chunk_estimate
+        return tail, estimate
+
+    def start_steal(self, thief, exclude=()):
+        """Ask the busiest slave to release tests for an idle slave
+
+        Args:
+            thief: The idle slave to send the stolen tests to
+            exclude: Slave ids not to steal from
+
+        Returns True if a steal request is pending. The stolen tests are handed over by
+        :py:meth:`finish_steal` once the victim has released them.
+
+        """
+        min_tests = self.config.getvalue('steal_min_tests')
+        if not min_tests:
+            return False
+        # thieves have run out of tests, they have nothing to release
+        thieves = self._thieves()
+        best = None
+        for victim in self.slaves:
+            if (victim == thief or victim in exclude or victim in thieves
+                    or victim in self.pending_steals):
+                continue
+            tail, estimate = self._stealable_tail(victim)
+            if len(tail) >= min_tests and (best is None or estimate > best[2]):
+                best = victim, tail, estimate
+        if best is None:
+            return False
+        victim, tail, estimate = best
+        steal_id = next(self.steal_ids)
+        self.pending_steals[victim] = thief, tail, steal_id
+        self.log.info('%s stealing %d tests from %s' % (thief, len(tail), victim))
+        if self.control_sock is not None:
+            # pushing slaves don't wait for acks, so they are asked on the control socket
+            self.control_sock.send_multipart(
+                [victim, json.dumps({'steal': tail, 'steal_id': steal_id})])
+        return True
+
+    def _thieves(self):
+        return set(thief for thief, tests, steal_id in self.pending_steals.values())
+
+    def finish_steal(self, victim, released, steal_id=None):
+        """Hand the tests released by a steal victim over to the thief
+
+        Args:
+            victim: The slave that released the tests
+            released: Node ids of the released tests
+            steal_id: Id of the steal request the victim answered, ``None`` when the steal
+                is called off by the master
+
+        A thief waiting for tests is sent the released tests, or another steal is tried
+        for it if there were none. A thief that's still running its last test gets them
+        on its next ``need_tests``.
+
+        A victim can answer a steal request after it was called off, when its ``need_tests``
+        crossed the request on the way. Nobody is waiting for those tests any more,
+        so they are put back in the pool.
+
+        """
+        for test in released:
+            if test in self.slave_tests[victim]:
+                self.slave_tests[victim].remove(test)
+        thief, requested, pending_id = self.pending_steals.get(victim, (None, None, None))
+        if thief is None or steal_id not in (None, pending_id):
+            self.requeue_tests(released)
+            return
+        del self.pending_steals[victim]
+        if thief not in self.slaves:
+            # The thief is gone, the next slave asking for tests can have them
+            self.requeue_tests(released)
+            return
+        if released:
+            self.steals += 1
+            self.print_message('%s stole %d tests from %s' % (thief, len(released), victim))
+            if thief in self.waiting_thieves:
+                self.waiting_thieves.remove(thief)
+                self._send_tests(thief, released)
+            else:
+                self.stolen_tests[thief].extend(released)
+        elif thief in self.waiting_thieves and not self.start_steal(thief, exclude=[victim]):
+            self.waiting_thieves.remove(thief)
+            self._send_tests(thief, [])
+
+    def requeue_tests(self, tests):
+        """Put tests released by a slave back in the pool"""
+        if tests:
+            self.log.info('requeueing %d released tests' % len(tests))
+            self.requeued_tests.append(list(tests))
+
+    def cancel_steal(self, victim):
+        """Call off the steal from a victim that won't be giving up any tests"""
+        if victim in self.pending_steals:
+            self.finish_steal(victim, [])
+
+    def ack_or_steal(self, slaveid, event_name, pushed=False):
+        """Acknowledge a slave's message, or ask it to release tests if it's a steal victim"""
+        if pushed:
+            # nobody is waiting for an answer
+            return
+        elif slaveid in self.pending_steals:
+            thief, tests, steal_id = self.pending_steals[slaveid]
+            self.send(slaveid, {'steal': tests, 'steal_id': steal_id})
+        else:
+            self.ack(slaveid, event_name)
 
     @pytest.mark.trylast
     def pytest_sessionstart(self, session):
@@ -279,6 +521,19 @@ class ParallelSession(object):
         ctx = zmq.Context.instance()
         self.sock = ctx.socket(zmq.ROUTER)
         self.sock.bind('%s' % zmq_endpoint)
+        report_endpoint = control_endpoint = None
+        if self.config.getvalue('parallel_transport') == 'pushpull':
+            report_endpoint = 'ipc://%s' % os.path.join(
+                session.fspath.strpath, '.pytest-parallel-reports.ipc')
+            control_endpoint = 'ipc://%s' % os.path.join(
+                session.fspath.strpath, '.pytest-parallel-control.ipc')
+            self.report_sock = ctx.socket(zmq.PULL)
+            self.report_sock.bind(report_endpoint)
+            self.control_sock = ctx.socket(zmq.PUB)
+            self.control_sock.bind(control_endpoint)
+            self.poller = zmq.Poller()
+            self.poller.register(self.report_sock, zmq.POLLIN)
+            self.poller.register(self.sock, zmq.POLLIN)
 
         # write out the slave config
         # The relies on args and option being easily serializable as yaml.
@@ -287,6 +542,8 @@ class ParallelSession(object):
             'args': self.config.args,
             'options': self.config.option,
             'zmq_endpoint': zmq_endpoint,
+            'report_endpoint': report_endpoint,
+            'control_endpoint': control_endpoint,
             'sprout': self.sprout_client is not None and self.sprout_pool is not None,
         }
         if hasattr(self, "slave_appliances_data"):
@@ -333,7 +590,7 @@ class ParallelSession(object):
                             slaveid, returncode)
                         )
 
-                if not self.slaves:
+                if not self.slaves and not self._in_flight():
                     # All slaves are killed or errored, we're done with tests
                     self.session_finished = True
                     break
@@ -343,8 +600,11 @@ class ParallelSession(object):
                     'need_tests',
                     'runtest_logreport',
                     'runtest_logstart',
-                    'sessionfinish'
+                    'sessionfinish',
+                    'steal'
                 )
+                handling_started = time.time()
+                pushed = event_data.pop('_pushed', False)
 
                 if event_name == 'collectionfinish':
                     slave_collections.append(event_data['node_ids'])
@@ -353,19 +613,32 @@ class ParallelSession(object):
                     # Don't ack here, leave the slaves blocking on recv
                     # after sending collectionfinish, then sync up when all collections are diffed
                 elif event_name == 'need_tests':
-                    self.send_tests(slaveid)
-                elif event_name == 'runtest_logstart':
+                    # a slave that's running out of tests has nothing left to steal
+                    self.cancel_steal(slaveid)
+                    self.send_tests(slaveid, event_data.get('idle', True))
+                elif event_name == 'steal':
                     self.ack(slaveid, event_name)
+                    self.finish_steal(
+                        slaveid, event_data['node_ids'], event_data.get('steal_id'))
+                elif event_name == 'runtest_logstart':
+                    if event_data['nodeid'] in self.slave_tests[slaveid]:
+                        self.slave_tests[slaveid].remove(event_data['nodeid'])
+                    self.ack_or_steal(slaveid, event_name, pushed)
                     self.trdist.runtest_logstart(slaveid,
                         event_data['nodeid'], event_data['location'])
                 elif event_name == 'runtest_logreport':
-                    self.ack(slaveid, event_name)
+                    self.ack_or_steal(slaveid, event_name, pushed)
                     report = unserialize_report(event_data['report'])
+                    self.durations.record(report)
                     self.trdist.runtest_logreport(slaveid, report)
                 elif event_name == 'sessionfinish':
                     self.ack(slaveid, event_name)
                     slave = self.slaves.pop(slaveid)
                     slave.wait()
+                    self.cancel_steal(slaveid)
+                    self.finishing[slaveid] = event_data.get('pushed', 0)
+                    self.loop_stats.reply_wait[slaveid] = event_data.get('reply_wait', 0.)
+                self.loop_stats.handled(time.time() - handling_started)
 
                 # wait for all slave collections to arrive, then diff collections and ack
                 if slave_collections is not None:
@@ -403,21 +676,42 @@ class ParallelSession(object):
         finally:
             # Restore the terminal reporter for exit hooks
             self.config.pluginmanager.register(self.terminal, 'terminalreporter')
+            self.log.info('%d steals between slaves' % self.steals)
+            for line in self.loop_stats.summary():
+                self.log.info(line)
+                self.print_message(line)
+            if self.steals:
+                self.print_message('%d test groups were stolen by idle slaves' % self.steals)
+            try:
+                self.durations.save()
+            except Exception as ex:
+                self.log.error('Unable to save test durations: {}'.format(ex))
 
         # Suppress other runtestloop calls
         return True
 
     def _test_item_generator(self):
-        for tests in self._modscope_item_generator():
+        groups = list(self._modscope_item_generator())
+        if self.durations:
+            # Longest processing time first: slaves pull the next group when they run dry,
+            # so handing out the longest groups first keeps the slave finish times close
+            groups = self.durations.schedule(groups)
+            estimate = sum(map(self.durations.group_estimate, groups))
+            self.print_message('Scheduling %d test groups by duration history, '
+                'estimated %d seconds of tests' % (len(groups), estimate))
+
+        sent_tests = 0
+        collection_len = len(self.collection)
+        for tests in groups:
+            sent_tests += len(tests)
+            self.log.info('%d tests remaining to send' % (collection_len - sent_tests))
             yield tests
 
     def _modscope_item_generator(self):
         # breaks out tests by module, can work just about any way we want
         # as long as it yields lists of tests id from the master collection
-        sent_tests = 0
         module_items_cache = []
         collection_ids = self.collection.keys()
-        collection_len = len(collection_ids)
         for i, item_id in enumerate(collection_ids):
             # everything before the first '::' is the module fspath
             i_fspath = item_id.split('::')[0]
@@ -439,10 +733,6 @@ class ParallelSession(object):
                     continue
 
                 for tests in self._modscope_id_splitter(module_items_cache):
-                    tests_len = len(tests)
-                    sent_tests += tests_len
-                    self.log.info('%d tests remaining to send'
-                        % (collection_len - sent_tests))
                     yield tests
 
                 # Then clear the cache in-place
@@ -464,7 +754,7 @@ class ParallelSession(object):
         for id, tests in parametrized_ids.items():
             if id is None:
                 id = 'no params'
-            self.log.info('sent tests with param %s %r' % (id, tests))
+            self.log.info('queued tests with param %s %r' % (id, tests))
             yield tests
 
 
@@ -497,6 +787,110 @@ def report_collection_diff(from_collection, to_collection, slaveid):
     raise RuntimeError(err)
 
 
+class LoopStats(object):
+    """Latency stats of the master runtest loop
+
+    - delivery: seconds between a slave sending an event and the master picking it up
+    - handling: seconds the master spent handling an event
+    - reply_wait: seconds each slave spent blocked waiting on replies from the master
+
+    """
+    def __init__(self):
+        self.delivery = []
+        self.handling = []
+        self.reply_wait = {}
+
+    def delivered(self, sent):
+        if sent is not None:
+            self.delivery.append(time.time() - sent)
+
+    def handled(self, duration):
+        self.handling.append(duration)
+
+    @staticmethod
+    def _describe(name, values):
+        if not values:
+            return '{}: no events'.format(name)
+        values = sorted(values)
+        percentile = lambda p: values[int(p * (len(values) - 1))]
+        return '{}: {} events, mean {:.2f}ms, p50 {:.2f}ms, p95 {:.2f}ms, max {:.2f}ms'.format(
+            name, len(values), 1000 * sum(values) / len(values),
+            1000 * percentile(.5), 1000 * percentile(.95), 1000 * values[-1])
+
+    def summary(self):
+        """Lines describing the collected stats, for logging"""
+        lines = [
+            self._describe('master loop delivery latency', self.delivery),
+            self._describe('master loop handling time', self.handling),
+        ]
+        for slaveid, wait in sorted(self.reply_wait.items()):
+            lines.append('{} waited {:.1f}s on master replies'.format(slaveid, wait))
+        return lines
+
+
+class DurationHistory(object):
+    """Run times of tests from previous runs, used to schedule the longest test groups first
+
+    Durations of all the phases (setup, call, teardown) of a test are added up per node id.
+    Durations recorded in a session are merged into the history file on :py:meth:`save`,
+    so tests that weren't run this time keep their history.
+
+    Args:
+        path: Path of the JSON file the history is kept in
+
+    The history is falsy if nothing is known yet, in which case collection order should be kept.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.current = defaultdict(float)
+        try:
+            with open(self.path) as f:
+                self.history = json.load(f)
+        except (IOError, ValueError):
+            # No history yet, or a broken file that will be replaced on save
+            self.history = {}
+        if self.history:
+            durations = sorted(self.history.values())
+            self.default = durations[len(durations) // 2]
+        else:
+            # Without history, all tests are weighted the same
+            self.default = 1.0
+
+    def __nonzero__(self):
+        return bool(self.history)
+
+    def record(self, report):
+        """Add up a phase duration from a test report
+
+        Args:
+            report: A :py:class:`TestReport <pytest:_pytest.runner.TestReport>`
+
+        """
+        self.current[report.nodeid] += getattr(report, 'duration', 0.0)
+
+    def estimate(self, nodeid):
+        """Expected duration of a test; the median duration is used for unknown tests"""
+        return self.history.get(nodeid, self.default)
+
+    def group_estimate(self, tests):
+        return sum(map(self.estimate, tests))
+
+    def schedule(self, groups):
+        """Order test groups longest first, keeping collection order between equal groups"""
+        return sorted(groups, key=self.group_estimate, reverse=True)
+
+    def save(self):
+        if not self.current:
+            return
+        self.history.update(self.current)
+        self.current.clear()
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(self.history, f, indent=1, sort_keys=True)
+        os.rename(tmp_path, self.path)
+
+
 class TerminalDistReporter(object):
     """Terminal Reporter for Distributed Testing
 
@@ -1,11 +1,18 @@
 import argparse
+import json
 import os
 import sys
+import time
 from collections import deque
 from urlparse import urlparse
 
 import zmq
 from py.path import local
+try:
+    # Compact and fast, used for batched reports if available
+    import msgpack
+except ImportError:
+    msgpack = None
 
 import utils.log
 from fixtures.pytest_store import store
@@ -15,10 +22,32 @@ from utils.sprout import SproutClient, SproutException
 
 SLAVEID = None
 
+#: Most events pushed to the master in one frame
+BATCH_SIZE = 32
+#: Longest time in seconds an event is held back for batching
+BATCH_INTERVAL = 0.5
+
+
+def pack_events(slaveid, events):
+    """Pack a batch of events pushed from a slave into a single frame"""
+    if msgpack is not None:
+        return msgpack.packb([slaveid, events])
+    else:
+        return json.dumps([slaveid, events])
+
+
+def unpack_events(frame):
+    """Unpack a frame made by :py:func:`pack_events` into a slaveid and a list of events"""
+    if msgpack is not None:
+        return msgpack.unpackb(frame, encoding='utf-8')
+    else:
+        return json.loads(frame)
+
 
 class SlaveManager(object):
     """SlaveManager which coordinates with the master process for parallel testing"""
-    def __init__(self, config, slaveid, base_url, zmq_endpoint, under_sprout):
+    def __init__(self, config, slaveid, base_url, zmq_endpoint, under_sprout,
+            report_endpoint=None, control_endpoint=None):
         self.config = config
         self.session = None
         self.collection = None
@@ -35,25 +64,107 @@ class SlaveManager(object):
         self.sock.setsockopt_string(zmq.IDENTITY, u'%s' % self.slaveid)
         self.sock.connect(zmq_endpoint)
 
+        # With the push transport, test reports are batched and pushed to the master without acks,
+        # the request socket above is only used for events that need an answer
+        self.report_sock = self.control_sock = None
+        if report_endpoint:
+            self.report_sock = ctx.socket(zmq.PUSH)
+            self.report_sock.connect(report_endpoint)
+            self.control_sock = ctx.socket(zmq.SUB)
+            self.control_sock.setsockopt_string(zmq.SUBSCRIBE, u'%s' % self.slaveid)
+            self.control_sock.connect(control_endpoint)
+        self.report_batch = []
+        self.batch_started = None
+        self.pushed = 0
+        # time spent blocking on replies from the master
+        self.reply_wait = 0.0
+
         self.messages = {}
+        # ids of the tests received from the master that haven't been started yet
+        self.tests = deque()
         if under_sprout:
             self.sprout = SproutClient.from_config()
         else:
             self.sprout = None
 
     def send_event(self, name, **kwargs):
+        # Pushed reports have to reach the master before anything sent after them
+        self.flush_events()
         kwargs['_event_name'] = name
+        kwargs['_sent'] = time.time()
         self.log.trace("sending %s %r", name, kwargs)
         self.sock.send_json(kwargs)
         recv = self.sock.recv_json()
+        self.reply_wait += time.time() - kwargs['_sent']
         if recv == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
+        elif isinstance(recv, dict) and 'steal' in recv:
+            self._release_tests(recv['steal'], recv.get('steal_id'))
         else:
             self.log.trace('received "%r" from master', recv)
             if recv != 'ack':
                 return recv
 
+    def push_event(self, name, flush=False, **kwargs):
+        """Send an event that doesn't need an answer from the master
+
+        With the push transport, events are batched up until there are :py:data:`BATCH_SIZE`
+        of them, the oldest is :py:data:`BATCH_INTERVAL` seconds old, or ``flush`` is set.
+        Otherwise, this is the same as :py:meth:`send_event`.
+
+        """
+        if self.report_sock is None:
+            self.send_event(name, **kwargs)
+            return
+        now = time.time()
+        kwargs['_event_name'] = name
+        kwargs['_sent'] = now
+        self.log.trace("queueing %s %r", name, kwargs)
+        if not self.report_batch:
+            self.batch_started = now
+        self.report_batch.append(kwargs)
+        if (flush or len(self.report_batch) >= BATCH_SIZE
+                or now - self.batch_started >= BATCH_INTERVAL):
+            self.flush_events()
+        self.check_control()
+
+    def flush_events(self):
+        """Push all the batched events to the master"""
+        if not self.report_batch:
+            return
+        self.report_sock.send(pack_events(self.slaveid, self.report_batch))
+        self.pushed += len(self.report_batch)
+        self.report_batch = []
+
+    def check_control(self):
+        """Handle requests published by the master on the control socket, without blocking"""
+        while self.control_sock is not None and self.control_sock.poll(0):
+            slaveid, request_json = self.control_sock.recv_multipart()
+            if slaveid != self.slaveid:
+                # subscriptions match on prefix, so slave1 also gets slave10's requests
+                continue
+            request = json.loads(request_json)
+            if 'steal' in request:
+                self._release_tests(request['steal'], request.get('steal_id'))
+
+    def _release_tests(self, node_ids, steal_id=None):
+        """Give tests back to the master, so an idle slave can run them
+
+        The first queued test may already be the next item of the running test,
+        so it's always kept. The tests actually released are reported in a ``steal`` event,
+        along with the ``steal_id`` of the request, so the master can tell a stale request's
+        answer from the one it's waiting for.
+
+        """
+        wanted = set(node_ids)
+        queued = list(self.tests)
+        released = [test for test in queued[1:] if test in wanted]
+        self.tests.clear()
+        self.tests.extend(queued[:1] + [test for test in queued[1:] if test not in wanted])
+        self.log.info('releasing %d tests to the master' % len(released))
+        self.send_event('steal', node_ids=released, steal_id=steal_id)
+
     def message(self, message):
         """Send a message to the master, which should get printed to the console"""
         self.send_event('message', message=message)  # message!
@@ -74,7 +185,7 @@ class SlaveManager(object):
         - sends logstart notice to the master
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        self.push_event("runtest_logstart", nodeid=nodeid, location=location)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
@@ -82,7 +193,9 @@ class SlaveManager(object):
         - sends serialized log reports to the master
 
         """
-        self.send_event("runtest_logreport", report=serialize_report(report))
+        # Flushing after setup gets the start of a long test to the master in good time
+        self.push_event("runtest_logreport", report=serialize_report(report),
+            flush=report.when == 'setup')
 
     def pytest_internalerror(self, excrepr):
         """pytest internal error hook
@@ -101,7 +214,10 @@ class SlaveManager(object):
 
         """
         # Send this non-blocking, quit as soon as possible
-        self.send_event('sessionfinish', exit=exitstatus)
+        # The master waits for the pushed events that are still in flight before letting us go
+        self.log.info('spent %.1f seconds waiting on the master' % self.reply_wait)
+        self.send_event('sessionfinish', exit=exitstatus, pushed=self.pushed,
+            reply_wait=self.reply_wait)
 
     def pytest_runtestloop(self, session):
         """pytest runtest loop
@@ -133,24 +249,30 @@ class SlaveManager(object):
 
     def _test_generator(self):
         # Pull the first batch of tests, stash in a deque
-        tests = self._get_tests()
+        # the deque is shared with _release_tests, so it's only ever changed in place
+        tests = self.tests
+        tests.extend(self._get_tests())
         while True:
+            # steal requests are otherwise only seen when events are pushed
+            self.check_control()
             # pop the first test, try to get the next
             try:
                 test_id = tests.popleft()
             except IndexError:
-                tests.extend(self._get_tests())
+                # Nothing left to run, the master may still be stealing tests for us
+                tests.extend(self._get_tests(idle=True))
                 if not tests:
                     # If tests is empty at this point, no tests were received;
                     # there's nothing to do, and the runtest loop is done
                     break
+                test_id = tests.popleft()
 
             try:
                 next_test_id = tests[0]
             except IndexError:
                 # pytest_runtest_protocol needs an item and a nextitem, so we need to
                 # pull new tests before running the last test in the previous test group
-                tests.extend(self._get_tests())
+                tests.extend(self._get_tests(idle=False))
                 if tests:
                     # We got a new batch of tests, so we can get the next item
                     next_test_id = tests[0]
@@ -165,8 +287,9 @@ class SlaveManager(object):
                 next_test_item = None
             yield test_item, next_test_item
 
-    def _get_tests(self):
-        tests = self.send_event('need_tests')
+    def _get_tests(self, idle=True):
+        # An empty answer while a test is still to run isn't final, we ask again once idle
+        tests = self.send_event('need_tests', idle=idle)
         return deque(tests)
 
 
@@ -231,6 +354,7 @@ if __name__ == '__main__':
         conf.runtime["cfme_data"]["basic_info"]["appliances_provider"] = provider_name
     config = _init_config(slave_options, slave_args)
     slave_manager = SlaveManager(config, args.slaveid, args.base_url,
-        conf.slave_config['zmq_endpoint'], conf.slave_config['sprout'])
+        conf.slave_config['zmq_endpoint'], conf.slave_config['sprout'],
+        conf.slave_config.get('report_endpoint'), conf.slave_config.get('control_endpoint'))
     config.pluginmanager.register(slave_manager, 'slave_manager')
     config.hook.pytest_cmdline_main(config=config)
@@ -1,8 +1,20 @@
 import pytest
 
 import utils.soap
+from utils import miq_soap
+from utils.log import logger
 
 
 @pytest.fixture()  # IGNORE:E1101
 def soap_client(uses_soap):
     return utils.soap.soap_client()
+
+
+def pytest_runtest_logreport(report):
+    # Log and reset the number of SOAP calls made by utils.miq_soap during each test
+    if report.when != 'teardown' or not miq_soap.soap_calls:
+        return
+    calls = miq_soap.soap_calls
+    logger.info('%d SOAP calls by %s: %s' % (sum(calls.values()), report.nodeid,
+        ', '.join('%s: %d' % item for item in calls.most_common())))
+    calls.clear()
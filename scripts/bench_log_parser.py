@@ -0,0 +1,168 @@
+#!/usr/bin/env python2
+"""Benchmark the production.log parser of utils.pagestats against the line by line parser it
+replaced, on a recorded log (by default the one used by utils/tests/test_pagestats.py).
+
+The log is repeated to get a meaningful amount of lines, both parsers have to find the same pages.
+
+Reading the log is benchmarked as well, through a paramiko file reading from the local log the
+way an SFTP file reads from the server: line by line as SSHTail used to, and in large chunks as
+SSHTail.lines does now. Every read request would be a round trip to the appliance, unless the
+requests are pipelined with prefetch (which SSHTail.lines does).
+
+Example usage:
+
+    scripts/bench_log_parser.py --repeat 200
+    scripts/bench_log_parser.py --pid 1234 /path/to/production.log
+
+"""
+import argparse
+import re
+import sys
+from StringIO import StringIO
+from time import time
+
+from paramiko.file import BufferedFile
+
+from utils.pagestats import PageStat, ProductionLogParser
+from utils.path import data_path
+from utils.ssh import SSHTail
+
+default_log = data_path.join('utils', 'test_pagestats', 'production.log')
+
+
+def legacy_parse(lines, uiworker_pid, query_time):
+    """The parsing loop perf_click used before ProductionLogParser"""
+    status_re = re.compile(r'Completed\s([0-9]*\s[a-zA-Z]*)\sin\s([0-9\.]*)ms')
+    select_query_time_re = re.compile(r'\s\(([0-9\.]*)ms\)')
+    worker_pid = '#' + uiworker_pid
+    pgstats = []
+    pgstat = PageStat()
+    for line in lines:
+        if worker_pid in line:
+            if 'SELECT' in line:
+                pgstat.selectcount += 1
+                selecttime = select_query_time_re.search(line)
+                if selecttime:
+                    if float(selecttime.group(1)) > query_time:
+                        pgstat.slowselects.append(line)
+            if 'CACHE' in line:
+                pgstat.cachedcount += 1
+            if 'INFO -- : Started' in line:
+                started_idx = line.index('Started') + 8
+                pgstat.request = line[started_idx:line.index('for', 72)]
+            if 'INFO -- : Completed' in line:
+                status_result = status_re.search(line)
+                if status_result:
+                    pgstat.status = status_result.group(1)
+                    pgstat.completedintime = float(status_result.group(2))
+                pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
+                try:
+                    vanchor = line.index('Views') + 7
+                    pgstat.viewstime = line[vanchor:line.index('ms', vanchor)]
+                except:
+                    pass
+                try:
+                    aranchor = line.index('ActiveRecord') + 14
+                    pgstat.activerecordtime = line[aranchor:line.index('ms', aranchor)]
+                except:
+                    pass
+                pgstats.append(pgstat)
+                pgstat = PageStat()
+    return pgstats
+
+
+class LocalSFTPFile(BufferedFile):
+    """A paramiko file reading from a string, counting the read requests"""
+    # Largest read request of paramiko.SFTPFile
+    MAX_REQUEST_SIZE = 32768
+
+    def __init__(self, contents):
+        BufferedFile.__init__(self)
+        self._set_mode('r')
+        self._source = StringIO(contents)
+        self.requests = 0
+
+    def _read(self, size):
+        self.requests += 1
+        return self._source.read(min(size, self.MAX_REQUEST_SIZE)) or None
+
+
+def read_by_line(contents):
+    remote_file = LocalSFTPFile(contents)
+    lines = []
+    while remote_file.tell() < len(contents):
+        lines.append(remote_file.readline().rstrip())
+    return len(lines), remote_file.requests
+
+
+def read_by_chunk(contents):
+    remote_file = LocalSFTPFile(contents)
+    lines = []
+    pending = ''
+    while True:
+        chunk = remote_file.read(SSHTail.chunk_size)
+        if not chunk:
+            break
+        chunk_lines = (pending + chunk).split('\n')
+        pending = chunk_lines.pop()
+        lines.extend(line.rstrip() for line in chunk_lines)
+    return len(lines), remote_file.requests
+
+
+def summary(pages):
+    return [(page.request, page.status, page.completedintime, float(page.viewstime),
+        float(page.activerecordtime), page.selectcount, page.cachedcount, page.uncachedcount,
+        len(page.slowselects)) for page in pages]
+
+
+def best_of(runs, func, *args):
+    times = []
+    for run in range(runs):
+        starttime = time()
+        result = func(*args)
+        times.append(time() - starttime)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', nargs='?', default=default_log.strpath,
+        help='production.log to parse')
+    parser.add_argument('--pid', default='2391',
+        help='PID of the UI worker in the log')
+    parser.add_argument('--repeat', type=int, default=100,
+        help='how many times the log is repeated')
+    parser.add_argument('--runs', type=int, default=5,
+        help='how many times each parser runs, the best time is reported')
+    parser.add_argument('--query-time', type=float, default=100,
+        help='threshold of slow queries in ms')
+    args = parser.parse_args()
+
+    with open(args.log) as log:
+        contents = log.read() * args.repeat
+    lines = contents.splitlines()
+
+    print 'Read {} bytes'.format(len(contents))
+    for name, reader in [('line by line', read_by_line), ('chunks', read_by_chunk)]:
+        duration, (line_count, requests) = best_of(args.runs, reader, contents)
+        print '{:>20}: {:.3f}s, {} lines, {} read requests'.format(
+            name, duration, line_count, requests)
+
+    legacy_time, legacy_pages = best_of(args.runs, legacy_parse, lines, args.pid, args.query_time)
+    new_time, new_pages = best_of(args.runs,
+        lambda: list(ProductionLogParser(args.pid, args.query_time).parse(lines)))
+
+    print '\nParsed {} lines, {} pages'.format(len(lines), len(new_pages))
+    for name, duration in [('line by line', legacy_time), ('ProductionLogParser', new_time)]:
+        print '{:>20}: {:.3f}s, {:.0f} lines/s'.format(name, duration, len(lines) / duration)
+    print '{:>20}: {:.2f}x'.format('speedup', legacy_time / new_time)
+
+    if summary(legacy_pages) != summary(new_pages):
+        print 'The parsers found different pages!'
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
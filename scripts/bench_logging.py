@@ -0,0 +1,138 @@
+#!/usr/bin/env python2
+"""Benchmark log calls through utils.log.ArtifactorLoggerAdapter against the adapter it replaced.
+
+Both adapters log into a logger at INFO level with a handler that drops the records, and hand
+records to a fake artifactor client that takes ``--hook-latency`` seconds per hook call, like the
+round trip to the artifactor server would. Calls are made from a few frames deep, the way tests
+log through page objects.
+
+Example usage:
+
+    scripts/bench_logging.py
+    scripts/bench_logging.py --calls 20000 --hook-latency 0.0005
+
+"""
+import argparse
+import inspect
+import logging
+import sys
+from time import sleep, time
+
+from utils.log import ArtifactorLogQueue, ArtifactorLoggerAdapter
+from utils.path import get_rel_path
+
+
+class FakeClient(object):
+    def __init__(self, latency):
+        self.latency = latency
+        self.records = 0
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.records += len(kwargs['log_records']) if 'log_records' in kwargs else 1
+        if self.latency:
+            sleep(self.latency)
+
+    def __nonzero__(self):
+        return True
+
+
+class LegacyAdapter(logging.LoggerAdapter):
+    """The adapter before the level checks, frame walking and batching"""
+    def __init__(self, logger, client):
+        logging.LoggerAdapter.__init__(self, logger, {})
+        self.artifactor = client
+
+    def art_log(self, level_name, message, kwargs):
+        art_log_record = {
+            'level': level_name,
+            'message': str(message),
+            'extra': kwargs.get('extra', '')
+        }
+        self.artifactor.fire_hook('log_message', log_record=art_log_record, slaveid='')
+
+    def trace(self, msg, *args, **kwargs):
+        msg, kwargs = self.process(msg, kwargs)
+        self.art_log('trace', msg, kwargs)
+        if self.logger.isEnabledFor(logging.TRACE):
+            return self.logger.log(logging.TRACE, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        msg, kwargs = self.process(msg, kwargs)
+        self.art_log('debug', msg, kwargs)
+        return self.logger.debug(msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        msg, kwargs = self.process(msg, kwargs)
+        self.art_log('info', msg, kwargs)
+        return self.logger.info(msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        frameinfo = inspect.getframeinfo(inspect.stack(1)[2][0])
+        extra = kwargs.get('extra', {})
+        extra.update({
+            'source_file': get_rel_path(frameinfo.filename) or frameinfo.filename,
+            'source_lineno': frameinfo.lineno
+        })
+        kwargs['extra'] = extra
+        return msg, kwargs
+
+
+def make_logger():
+    bench_logger = logging.getLogger('bench_logging')
+    bench_logger.propagate = False
+    bench_logger.handlers = [logging.NullHandler()]
+    bench_logger.setLevel(logging.INFO)
+    return bench_logger
+
+
+def new_adapter(client, art_level):
+    adapter = ArtifactorLoggerAdapter(make_logger(), {})
+    adapter.artifactor = client
+    adapter.slaveid = ''
+    adapter.art_level = art_level
+    adapter.art_queue = ArtifactorLogQueue(client=client)
+    return adapter
+
+
+def log_calls(log_method, calls, depth=5):
+    """Calls log_method from ``depth`` frames down"""
+    if depth:
+        return log_calls(log_method, calls, depth - 1)
+    starttime = time()
+    for i in xrange(calls):
+        log_method('Message %s', i)
+    return time() - starttime
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=10000,
+        help='how many log calls per benchmark')
+    parser.add_argument('--hook-latency', type=float, default=0.0,
+        help='seconds each artifactor hook call takes')
+    args = parser.parse_args()
+
+    print '{:>28} {:>14} {:>14} {:>8}'.format('', 'before/s', 'after/s', 'speedup')
+    for level_name, art_level in [
+            ('trace', logging.DEBUG), ('trace', None), ('debug', logging.DEBUG),
+            ('info', logging.DEBUG)]:
+        legacy_client, client = FakeClient(args.hook_latency), FakeClient(args.hook_latency)
+        legacy = LegacyAdapter(make_logger(), legacy_client)
+        adapter = new_adapter(client, art_level)
+        legacy_time = log_calls(getattr(legacy, level_name), args.calls)
+        new_time = log_calls(getattr(adapter, level_name), args.calls)
+        # Sending happens in the background, but it has to keep up
+        drain_starttime = time()
+        adapter.art_queue.flush()
+        drain_time = time() - drain_starttime
+        name = '{} (artifactor {})'.format(
+            level_name, logging.getLevelName(art_level) if art_level else 'off')
+        print '{:>28} {:>14.0f} {:>14.0f} {:>7.1f}x   {} records sent, {:.3f}s to drain'.format(
+            name, args.calls / legacy_time, args.calls / new_time, legacy_time / new_time,
+            client.records, drain_time)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
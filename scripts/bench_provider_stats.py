@@ -0,0 +1,199 @@
+#!/usr/bin/env python2
+"""Benchmark provider stats collection through VMWareSystem.stats against the per-stat lambdas.
+
+Runs the stats polls of a provider validation against a fake vSphere holding ``--vms`` VMs, once
+the way they were collected before (every stat on its own: a VM sweep each for ``num_vm`` and
+``num_template``, a managed object enumeration each for hosts, clusters and datastores, on every
+poll) and once through :py:meth:`utils.mgmt_system.MgmtSystemAPIBase.stats` with the polls
+reusing the stats for ``stats_ttl`` seconds, as ``Provider.validate`` does. Every API call costs
+``--call-latency`` seconds plus ``--object-latency`` per managed object sent back. Polls don't
+really wait for each other, the clock is simulated.
+
+Example usage:
+
+    scripts/bench_provider_stats.py
+    scripts/bench_provider_stats.py --vms 20000 --polls 30 --call-latency 0.2
+
+"""
+import argparse
+import sys
+from collections import Counter
+from time import sleep, time
+
+from utils import mgmt_system
+from utils.mgmt_system import VMWareSystem
+
+STATS = ['num_template', 'num_vm', 'num_datastore', 'num_host', 'num_cluster']
+
+
+class Spec(object):
+    pass
+
+
+class MoRef(object):
+    def __init__(self, type_name, value):
+        self._type = type_name
+        self.value = value
+
+
+class Property(object):
+    def __init__(self, name, val):
+        self.name = name
+        self.val = val
+
+
+class ObjectContent(object):
+    def __init__(self, obj, props):
+        self.obj = obj
+        self.propSet = [Property(name, val) for name, val in props.iteritems()]
+
+
+class FakeVSphere(object):
+    """Managed objects of a vSphere, and the API calls made to fetch them"""
+    def __init__(self, vms, templates, hosts, clusters, datastores, call_latency, object_latency):
+        self.call_latency = call_latency
+        self.object_latency = object_latency
+        self.calls = Counter()
+        self.objects_sent = 0
+        self.objects = {
+            'VirtualMachine': [
+                {'name': 'vm_{}'.format(i), 'config.template': i < templates}
+                for i in xrange(vms + templates)],
+            'HostSystem': [{'name': 'host_{}'.format(i)} for i in xrange(hosts)],
+            'ClusterComputeResource': [
+                {'name': 'cluster_{}'.format(i)} for i in xrange(clusters)],
+            # One datastore isn't mounted anywhere, it's not counted
+            'Datastore': [
+                {'name': 'datastore_{}'.format(i), 'host': ['mount'] if i else []}
+                for i in xrange(datastores)],
+        }
+
+    def call(self, name, objects):
+        self.calls[name] += 1
+        self.objects_sent += objects
+        delay = self.call_latency + self.object_latency * objects
+        if delay:
+            sleep(delay)
+
+    def RetrieveProperties(self, specSet):
+        contents = []
+        for pfs in specSet:
+            for property_spec in pfs.propSet:
+                for i, obj in enumerate(self.objects[property_spec.type]):
+                    contents.append(ObjectContent(
+                        MoRef(property_spec.type, '{}-{}'.format(property_spec.type, i)),
+                        {path: obj[path] for path in property_spec.pathSet if path in obj}))
+        self.call('RetrieveProperties', len(contents))
+        return contents
+
+    def all(self, type_name):
+        """What a psphere ``mobs.<type>.all`` enumeration fetches, all properties of every object"""
+        objects = self.objects[type_name]
+        self.call('{}.all'.format(type_name), len(objects))
+        return [type(type_name, (object, ), obj)() for obj in objects]
+
+
+class FakeApi(object):
+    def __init__(self, vsphere):
+        class content(object):
+            rootFolder = 'root'
+            propertyCollector = vsphere
+
+        class si(object):
+            pass
+        si.content = content
+        self.si = si
+
+    def create(self, type_name):
+        return Spec()
+
+    def get_search_filter_spec(self, root, property_spec):
+        pfs = Spec()
+        pfs.propSet = [property_spec]
+        return pfs
+
+
+class FakeMobs(object):
+    """Stands in for ``psphere.managedobjects``, with the enumerations the stats use"""
+    def __init__(self, vsphere):
+        for type_name in ['HostSystem', 'ClusterComputeResource', 'Datastore']:
+            setattr(self, type_name, type(type_name, (object, ), {
+                'all': staticmethod(lambda api, type_name=type_name: vsphere.all(type_name))}))
+
+
+class Clock(object):
+    """Replaces the time module in utils.mgmt_system, the polls move it forward"""
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+def run_polls(args, poll):
+    vsphere = FakeVSphere(args.vms, args.templates, args.hosts, args.clusters, args.datastores,
+        args.call_latency, args.object_latency)
+    system = VMWareSystem('vsphere.example.com', 'user', 'password')
+    system._api = FakeApi(vsphere)
+    clock = Clock()
+    real_mobs, real_time = mgmt_system.mobs, mgmt_system.time
+    mgmt_system.mobs, mgmt_system.time = FakeMobs(vsphere), clock
+    try:
+        for i in xrange(args.polls):
+            stats = poll(system)
+            clock.now += args.poll_interval
+    finally:
+        mgmt_system.mobs, mgmt_system.time = real_mobs, real_time
+    return stats, vsphere
+
+
+def legacy_poll(system):
+    return {stat: system._stats_available[stat](system) for stat in STATS}
+
+
+def cached_poll(system):
+    return system.stats(*STATS, max_age=system.stats_ttl)
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vms', type=int, default=10000, help='how many vms the provider has')
+    parser.add_argument('--templates', type=int, default=200, help='how many templates')
+    parser.add_argument('--hosts', type=int, default=50, help='how many hosts')
+    parser.add_argument('--clusters', type=int, default=5, help='how many clusters')
+    parser.add_argument('--datastores', type=int, default=40, help='how many datastores')
+    parser.add_argument('--polls', type=int, default=10,
+        help='how many times validation polls the stats')
+    parser.add_argument('--poll-interval', type=float, default=10,
+        help='seconds between the polls, like Provider.validate')
+    parser.add_argument('--call-latency', type=float, default=0.05,
+        help='seconds each API call takes')
+    parser.add_argument('--object-latency', type=float, default=0.00002,
+        help='seconds each managed object sent back adds to a call')
+    args = parser.parse_args()
+
+    results = []
+    for name, poll in [('before', legacy_poll), ('after', cached_poll)]:
+        starttime = time()
+        stats, vsphere = run_polls(args, poll)
+        results.append((name, stats, vsphere, time() - starttime))
+
+    print '{} polls of {} every {:g}s, {} vms, {} templates:'.format(
+        args.polls, ', '.join(STATS), args.poll_interval, args.vms, args.templates)
+    print '{:>8} {:>10} {:>14} {:>10}   {}'.format(
+        '', 'API calls', 'objects sent', 'seconds', 'calls')
+    for name, stats, vsphere, duration in results:
+        print '{:>8} {:>10} {:>14} {:>10.2f}   {}'.format(
+            name, sum(vsphere.calls.values()), vsphere.objects_sent, duration,
+            ', '.join('{} {}'.format(call, count) for call, count in sorted(vsphere.calls.items())))
+    (_, legacy_stats, legacy, legacy_time), (_, stats, vsphere, new_time) = results
+    assert stats == legacy_stats, 'the stats differ: {} != {}'.format(stats, legacy_stats)
+    print 'stats {}, {:.1f}x fewer API calls, {:.1f}x faster'.format(
+        ', '.join('{}={}'.format(stat, stats[stat]) for stat in STATS),
+        float(sum(legacy.calls.values())) / sum(vsphere.calls.values()), legacy_time / new_time)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -42,6 +42,10 @@ def process_provider_vms(provider_key, matchers, delta, vms_to_delete):
     try:
         now = datetime.datetime.now()
         provider = provider_factory(provider_key)
+        if hasattr(provider, 'inventory'):
+            # Take one snapshot of all VMs so the creation time lookups below don't each
+            # make their own API call; it's only used while it's fresh
+            provider.inventory(props=['boot_time'], max_age=0)
         for vm_name in provider.list_vm():
             if not match(matchers, vm_name):
                 continue
@@ -103,13 +107,18 @@ def cleanup_vms(texts, max_days=2, providers=None, prompt=True):
 
     for provider_key, vm_set in vms_to_delete.items():
         provider = provider_factory(provider_key)
-        for vm_name, __ in vm_set:
-            print 'Deleting %s on %s' % (vm_name, provider_key)
-            try:
-                provider.delete_vm(vm_name)
-            except Exception as ex:
+        vm_names = [vm_name for vm_name, __ in vm_set]
+        print 'Deleting %s on %s' % (', '.join(vm_names), provider_key)
+        try:
+            # Submits all deletions at once and waits for them together
+            results = provider.delete_vms(vm_names)
+        except Exception as ex:
+            print 'Failed to delete VMs on %s' % provider_key
+            logger.exception(ex)
+            continue
+        for vm_name, deleted in results.items():
+            if not deleted:
                 print 'Failed to delete %s on %s' % (vm_name, provider_key)
-                logger.exception(ex)
 
 if __name__ == "__main__":
     args = parse_cmd_line()
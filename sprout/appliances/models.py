@@ -103,6 +103,24 @@ class Provider(models.Model):
     def ip_address(self):
         return self.provider_data.get("ipaddress")
 
+    def retrieve_power_states(self, appliance_names):
+        """Retrieves the power states of appliances with one inventory call to the provider.
+
+        Args:
+            appliance_names: Names of the appliances in this provider.
+        Returns: A dict of appliance name: :py:class:`Appliance.Power` state. Appliances that
+            are not in the provider are orphaned.
+        """
+        statuses = self.api.vm_statuses(appliance_names)
+        power_states = {}
+        for name in appliance_names:
+            if name in statuses:
+                power_states[name] = Appliance.POWER_STATES_MAPPING.get(
+                    statuses[name], Appliance.Power.UNKNOWN)
+            else:
+                power_states[name] = Appliance.Power.ORPHANED
+        return power_states
+
     def __unicode__(self):
         return "{} {}".format(self.__class__.__name__, self.id)
 
@@ -4,6 +4,8 @@ from __future__ import absolute_import
 import hashlib
 import random
 import re
+import time
+from collections import defaultdict
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
@@ -11,6 +13,7 @@ from django.utils import timezone
 from celery import chain, shared_task
 from datetime import timedelta
 from functools import wraps
+from multiprocessing.pool import ThreadPool
 from novaclient.exceptions import OverLimit as OSOverLimit
 
 from appliances.models import (
@@ -25,6 +28,8 @@ from utils.trackerbot import api, parse_template
 
 
 LOCK_EXPIRE = 60 * 5
+# How many providers are asked for power states at the same time
+POWER_STATE_WORKERS = 8
 VERSION_REGEXPS = [
     # 4 digits
     r"cfme-(\d)(\d)(\d)(\d)-",      # cfme-5242-    -> 5.2.4.2
@@ -676,13 +681,70 @@ def retrieve_appliance_ip(self, appliance_id):
         appliance.set_status("IP address retrieved.")
 
 
+def update_appliances_power_states(appliances, power_states):
+    """Updates the power states of appliances with one query per distinct state.
+
+    Args:
+        appliances: ``(id, name)`` tuples of the appliances.
+        power_states: A dict of appliance name: power state.
+    Returns: The number of appliances whose power state changed.
+    """
+    renaming_appliances = redis.renaming_appliances
+    ids_by_state = defaultdict(list)
+    for appliance_id, name in appliances:
+        if name not in renaming_appliances and name in power_states:
+            ids_by_state[power_states[name]].append(appliance_id)
+    changed = 0
+    with transaction.atomic():
+        for power_state, appliance_ids in ids_by_state.iteritems():
+            changed += Appliance.objects.filter(id__in=appliance_ids).exclude(
+                power_state=power_state).update(power_state=power_state)
+    return changed
+
+
 @singleton_task()
 def retrieve_appliances_power_states(self):
-    """Continuously loops over all appliances and retrieves power states. After the execution ends,
-    it schedules itself for execution again after some time"""
-    for a in Appliance.objects.all():
-        if a.name not in redis.renaming_appliances:
-            a.retrieve_power_state()
+    """Retrieves the power states of all appliances, with one inventory call per provider.
+
+    The providers are asked in parallel and the appliances of each provider are updated in bulk
+    as soon as its power states arrive. A provider that fails is skipped until the next sweep.
+
+    Returns: Duration of the sweep in seconds.
+    """
+    start_time = time.time()
+    appliances_by_provider = defaultdict(list)
+    for appliance_id, name, provider_id in Appliance.objects.values_list(
+            "id", "name", "template__provider"):
+        appliances_by_provider[provider_id].append((appliance_id, name))
+    if not appliances_by_provider:
+        return 0.0
+    providers = Provider.objects.in_bulk(appliances_by_provider.keys())
+
+    def _retrieve(provider_id):
+        names = [name for appliance_id, name in appliances_by_provider[provider_id]]
+        try:
+            return provider_id, providers[provider_id].retrieve_power_states(names)
+        except Exception as e:
+            logger().error("Could not retrieve power states from provider {}: {}: {}".format(
+                provider_id, type(e).__name__, str(e)))
+            return provider_id, None
+
+    changed = 0
+    pool = ThreadPool(min(POWER_STATE_WORKERS, len(appliances_by_provider)))
+    try:
+        for provider_id, power_states in pool.imap_unordered(_retrieve, appliances_by_provider):
+            if power_states is not None:
+                changed += update_appliances_power_states(
+                    appliances_by_provider[provider_id], power_states)
+    finally:
+        pool.close()
+        pool.join()
+    duration = time.time() - start_time
+    logger().info(
+        "Power states of {} appliances on {} providers retrieved in {:.2f}s, {} changed".format(
+            sum(map(len, appliances_by_provider.itervalues())), len(appliances_by_provider),
+            duration, changed))
+    return duration
 
 
 @singleton_task()
@@ -1,4 +1,87 @@
 # -*- coding: utf-8 -*-
-# from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from appliances import models, tasks
+from appliances.models import Appliance, Group, Provider, Template
+
+
+class FakeMgmtSystem(object):
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = 0
+
+    def vm_statuses(self, vm_names=None):
+        self.calls += 1
+        return {
+            name: status for name, status in self.statuses.iteritems()
+            if vm_names is None or name in vm_names}
+
+
+class BrokenMgmtSystem(object):
+    def vm_statuses(self, vm_names=None):
+        raise IOError("Connection refused")
+
+
+class FakeRedis(object):
+    renaming_appliances = {"renaming"}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RetrieveAppliancesPowerStatesTest(TestCase):
+    def setUp(self):
+        self.mgmt_systems = {
+            "vsphere": FakeMgmtSystem({
+                "running": "poweredOn", "stopped": "poweredOff", "booting": "booting",
+                "renaming": "poweredOff"}),
+            "rhevm": FakeMgmtSystem({"up": "up", "suspended": "suspended"}),
+            "broken": BrokenMgmtSystem(),
+        }
+        self._provider_factory, models.provider_factory = (
+            models.provider_factory, self.mgmt_systems.__getitem__)
+        self._redis, tasks.redis = tasks.redis, FakeRedis()
+
+        group = Group.objects.create(id="upstream")
+        appliances = {
+            "vsphere": ["running", "stopped", "booting", "renaming", "gone"],
+            "rhevm": ["up", "suspended"],
+            "broken": ["unreachable"],
+        }
+        for provider_id, names in appliances.iteritems():
+            template = Template.objects.create(
+                provider=Provider.objects.create(id=provider_id), template_group=group,
+                date=date.today(), original_name="template", name="template")
+            for name in names:
+                Appliance.objects.create(template=template, name=name, power_state="on")
+
+    def tearDown(self):
+        models.provider_factory = self._provider_factory
+        tasks.redis = self._redis
+
+    def power_states(self):
+        return dict(Appliance.objects.values_list("name", "power_state"))
+
+    def test_power_states_retrieved_in_bulk(self):
+        tasks.retrieve_appliances_power_states()
+        self.assertEqual(self.power_states(), {
+            "running": Appliance.Power.ON,
+            "stopped": Appliance.Power.OFF,
+            "booting": Appliance.Power.UNKNOWN,
+            "gone": Appliance.Power.ORPHANED,
+            "up": Appliance.Power.ON,
+            "suspended": Appliance.Power.SUSPENDED,
+            # Left alone
+            "renaming": Appliance.Power.ON,
+            "unreachable": Appliance.Power.ON,
+        })
+        # One inventory call per provider
+        self.assertEqual(self.mgmt_systems["vsphere"].calls, 1)
+        self.assertEqual(self.mgmt_systems["rhevm"].calls, 1)
+
+    def test_only_changed_appliances_updated(self):
+        changed = tasks.update_appliances_power_states(
+            Appliance.objects.filter(name__in=["up", "suspended"]).values_list("id", "name"),
+            {"up": Appliance.Power.ON, "suspended": Appliance.Power.SUSPENDED})
+        self.assertEqual(changed, 1)
@@ -24,7 +24,7 @@ from utils.net import net_check
 from utils.path import data_path, scripts_path
 from utils.providers import provider_factory
 from utils.randomness import generate_random_string
-from utils.ssh import SSHClient
+from utils.ssh import SSHClient, run_on_hosts
 from utils.version import get_stream, get_version, LATEST
 from utils.wait import wait_for
 
@@ -398,6 +398,8 @@ class IPAppliance(object):
         Note:
 
             The credentials default to those found under ``ssh`` key in ``credentials.yaml``.
+            The connection is shared through :py:data:`utils.ssh.ssh_pool`, so calling this
+            repeatedly does not reconnect to the appliance.
 
         """
         if not self.is_ssh_running:
@@ -1310,6 +1312,22 @@ class ApplianceSet(object):
                 return appliance
         return None
 
+    def run_command(self, command, timeout=None):
+        """Runs a command on all appliances in the set at once
+
+        Args:
+            command: Command to run in the remote shell.
+            timeout: Seconds each appliance has to finish the command, ``None`` waits forever.
+
+        Returns: :py:class:`utils.ssh.FanOutResult` keyed by appliance address; appliances that
+            can't be reached are in its ``errors``
+        """
+        # Connecting is left to the fan-out, so an unreachable appliance fails on its own
+        return run_on_hosts(
+            [appliance.address for appliance in self.all_appliances], command, timeout=timeout,
+            username=conf.credentials['ssh']['username'],
+            password=conf.credentials['ssh']['password'])
+
 
 def provision_appliance(version=None, vm_name_prefix='cfme', template=None, provider_name=None,
                         vm_name=None):
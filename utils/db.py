@@ -1,11 +1,14 @@
+import os
+import pickle
 from collections import Mapping
 from contextlib import contextmanager
 from itertools import izip
 from tempfile import NamedTemporaryFile
 
 import yaml
-from sqlalchemy import MetaData, create_engine, event, inspect
-from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError
+from sqlalchemy import (
+    MetaData, and_, bindparam, create_engine, event, func, inspect, literal, select)
+from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import Pool
@@ -14,11 +17,15 @@ from fixtures.pytest_store import store
 from utils import conf, lazycache
 from utils.datafile import load_data_file
 from utils.log import logger
-from utils.path import data_path
+from utils.path import data_path, log_path
 from utils.signals import fire, on_signal
 from utils.ssh import SSHClient
 
 
+#: Where :py:class:`Db` keeps reflected tables between runs, one file per host and schema version
+reflection_cache_path = log_path.join('db_reflection')
+
+
 @on_signal("server_config_changed")
 def invalidate_server_config():
     del store.current_appliance.db_yamls
@@ -77,8 +84,12 @@ class Db(Mapping):
         a latent connection, this can be extremely slow, which will affect methods that return
         tables, like the mapping interface or :py:meth:`values`.
 
+        Reflected tables are therefore saved in :py:data:`reflection_cache_path`, keyed by the
+        hostname and the :py:attr:`schema_version` of the database. They are loaded from there the
+        first time :py:attr:`metadata` is used, so that tables reflected by any earlier process are
+        not reflected again until the appliance's schema changes.
+
     """
-    _table_cache = dict()
 
     def __init__(self, hostname=None, credentials=None):
         if hostname is None:
@@ -87,6 +98,8 @@ class Db(Mapping):
             self.hostname = hostname
 
         self.credentials = credentials or conf.credentials['database']
+        self._table_cache = dict()
+        self._statement_cache = dict()
 
     def __getitem__(self, table_name):
         """Access tables as items contained in this db
@@ -190,7 +203,8 @@ class Db(Mapping):
     def metadata(self):
         """:py:class:`MetaData <sqlalchemy:sqlalchemy.schema.MetaData>` for this database
 
-        This can be used for introspection of reflected items.
+        This can be used for introspection of reflected items. It starts with the tables from
+        the reflection cache, if there are any.
 
         Note:
 
@@ -198,7 +212,58 @@ class Db(Mapping):
             use :py:meth:`reflect_table`.
 
         """
-        return MetaData(bind=self.engine)
+        metadata = self._load_reflection_cache() or MetaData()
+        metadata.bind = self.engine
+        return metadata
+
+    @lazycache
+    def schema_version(self):
+        """The latest rails migration of this database, ``None`` if it couldn't be read"""
+        try:
+            return self.engine.execute('SELECT max(version) FROM schema_migrations').scalar()
+        except SQLAlchemyError as e:
+            logger.warning('Could not read the schema version of %s: %s' % (self.hostname, e))
+            return None
+
+    @lazycache
+    def reflection_cache_file(self):
+        """The reflection cache file of this database, ``None`` if it has no schema version"""
+        if self.schema_version is None:
+            return None
+        return reflection_cache_path.join('%s-%s.pickle' % (self.hostname, self.schema_version))
+
+    def _load_reflection_cache(self):
+        cache_file = self.reflection_cache_file
+        if cache_file is None or not cache_file.check():
+            return None
+        try:
+            with cache_file.open('rb') as f:
+                metadata = pickle.load(f)
+        except Exception as e:
+            logger.warning('Could not load the reflection cache %s: %s' % (cache_file, e))
+            return None
+        logger.debug('Loaded %d reflected tables from %s' % (len(metadata.tables), cache_file))
+        return metadata
+
+    def _save_reflection_cache(self):
+        cache_file = self.reflection_cache_file
+        if cache_file is None:
+            return
+        # Keep the tables other processes have saved in the meantime
+        saved = self._load_reflection_cache()
+        if saved is not None:
+            for table_name, table in saved.tables.iteritems():
+                if table_name not in self.metadata.tables:
+                    table.tometadata(self.metadata)
+        # Written under a temporary name and renamed, so nobody reads a partial file
+        temp_file = cache_file.new(basename='%s.%d.tmp' % (cache_file.basename, os.getpid()))
+        try:
+            cache_file.dirpath().ensure(dir=True)
+            with temp_file.open('wb') as f:
+                pickle.dump(self.metadata, f, pickle.HIGHEST_PROTOCOL)
+            temp_file.rename(cache_file)
+        except Exception as e:
+            logger.warning('Could not save the reflection cache %s: %s' % (cache_file, e))
 
     @lazycache
     def db_url(self):
@@ -258,15 +323,107 @@ class Db(Mapping):
         """
         self.metadata.reflect(only=[table_name])
 
+    @lazycache
+    def _lookup_engine(self):
+        # The SQL of the lookup statements is compiled once and reused with new parameters
+        return self.engine.execution_options(compiled_cache={})
+
+    def _lookup(self, kind, table_name, filters):
+        """Runs a lookup statement built by :py:meth:`_lookup_statement`"""
+        statement = self._lookup_statement(kind, table_name, filters)
+        params = {name: value for name, value in filters.iteritems() if value is not None}
+        return self._lookup_engine.execute(statement, **params)
+
+    def _lookup_statement(self, kind, table_name, filters):
+        """Builds (or reuses) a ``SELECT`` of the table filtered by column equality
+
+        The filter values are bound parameters, so one statement serves every lookup of the same
+        kind, table and filtered columns. ``None`` values are matched with ``IS NULL``.
+        """
+        filtered = tuple(sorted((name, value is None) for name, value in filters.iteritems()))
+        key = (kind, table_name, filtered)
+        try:
+            return self._statement_cache[key]
+        except KeyError:
+            pass
+        # Tables without a primary key don't get a table class, but they're reflected
+        self[table_name]
+        table = self.metadata.tables[table_name]
+        criteria = []
+        for name, is_null in filtered:
+            column = table.c[name]
+            criteria.append(column.is_(None) if is_null else column == bindparam(name))
+        if kind == 'count':
+            statement = select([func.count()]).select_from(table)
+        elif kind == 'exists':
+            statement = select([literal(1)]).select_from(table).limit(1)
+        else:
+            statement = select([table]).limit(1)
+        if criteria:
+            statement = statement.where(and_(*criteria))
+        self._statement_cache[key] = statement
+        return statement
+
+    def exists(self, table_name, **filters):
+        """Whether a table has any row with the given column values
+
+        The lookup helpers filter in the database and stop at the first matching row, instead of
+        loading the table, so they take the same time no matter how big the table is. They run
+        on their own pooled connection, outside of :py:meth:`transaction`.
+
+        Usage:
+
+            db.exists('pxe_servers', name='my_pxe_server')
+
+        Args:
+            table_name: Name of the table
+            **filters: Column name: value pairs the row has to match
+
+        """
+        return self._lookup('exists', table_name, filters).scalar() is not None
+
+    def get_one(self, table_name, **filters):
+        """The first row of a table with the given column values, ``None`` if there's no such row
+
+        See :py:meth:`exists`, the row's columns are accessible as attributes.
+        """
+        return self._lookup('get_one', table_name, filters).first()
+
+    def count(self, table_name, **filters):
+        """Number of rows of a table with the given column values, see :py:meth:`exists`"""
+        return self._lookup('count', table_name, filters).scalar()
+
+    def execute_cached(self, key, build, **params):
+        """Runs a statement that is built and compiled only once per ``key``
+
+        ``build`` is called with this db to make the statement the first time ``key`` is used,
+        later calls reuse it with new ``params``. Like the lookup helpers, it runs outside of
+        :py:meth:`transaction`.
+
+        Usage:
+
+            db.execute_cached(('vms_named', ), lambda db: select([db['vms']]).where(
+                db['vms'].name == bindparam('name')), name='my_vm')
+
+        """
+        try:
+            statement = self._statement_cache[key]
+        except KeyError:
+            statement = self._statement_cache[key] = build(self)
+        return self._lookup_engine.execute(statement, **params)
+
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
 
-        Actual implementation of __getitem__
+        Actual implementation of __getitem__. Tables are only reflected if they're not in the
+        reflection cache yet.
         """
         try:
             return self._table_cache[table_name]
         except KeyError:
-            self.reflect_table(table_name)
+            if table_name not in self.metadata.tables:
+                self.reflect_table(table_name)
+                self._save_reflection_cache()
             table = self.metadata.tables[table_name]
             table_dict = {
                 '__table__': table,
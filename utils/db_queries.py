@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, distinct, false, func, literal_column, select, true, union_all
 
 from utils.db import cfmedb, Db
 
+#: The provider stats :py:func:`get_provider_stats` counts, in the order it counts them
+provider_stats = ('num_vm', 'num_template', 'num_host', 'num_cluster', 'num_datastore')
+
 
 def get_configuration_details(db=None, ip_address=None):
     """Return details that are necessary to navigate through Configuration accordions.
@@ -84,3 +90,80 @@ def get_host_id(hostname, ip_address=None, db=None):
         return str(hosts[0].id)
     else:
         return None
+
+
+def _provider_stats_statement(db, stats, name_count):
+    """A ``SELECT`` of ``(provider name, stat, count)`` rows, every stat a grouped ``COUNT``
+
+    The provider names are the bound parameters ``name_0`` to ``name_<name_count - 1>``.
+    """
+    table_names = ['ext_management_systems', 'vms', 'hosts', 'ems_clusters', 'storages',
+        'hosts_storages']
+    for table_name in table_names:
+        # Tables without a primary key don't get a table class, but they're reflected
+        db[table_name]
+    ems, vms, hosts, clusters, storages, hosts_storages = [
+        db.metadata.tables[table_name] for table_name in table_names]
+    ems_ids = select([ems.c.id]).where(
+        ems.c.name.in_([bindparam('name_{}'.format(i)) for i in range(name_count)]))
+
+    def counts(stat, ems_id, count, from_obj, *criteria):
+        statement = (
+            select([ems_id.label('ems_id'), literal_column("'{}'".format(stat)).label('stat'),
+                    count.label('count')])
+            .select_from(from_obj)
+            .where(ems_id.in_(ems_ids)))
+        for criterion in criteria:
+            statement = statement.where(criterion)
+        return statement.group_by(ems_id)
+
+    queries = {
+        'num_vm': lambda: counts(
+            'num_vm', vms.c.ems_id, func.count(), vms, vms.c.template == false()),
+        'num_template': lambda: counts(
+            'num_template', vms.c.ems_id, func.count(), vms, vms.c.template == true()),
+        'num_host': lambda: counts('num_host', hosts.c.ems_id, func.count(), hosts),
+        'num_cluster': lambda: counts('num_cluster', clusters.c.ems_id, func.count(), clusters),
+        'num_datastore': lambda: counts(
+            'num_datastore', hosts.c.ems_id, func.count(distinct(storages.c.name)),
+            hosts.join(hosts_storages, hosts.c.id == hosts_storages.c.host_id)
+            .join(storages, storages.c.id == hosts_storages.c.storage_id)),
+    }
+    stat_counts = union_all(*[queries[stat]() for stat in stats]).alias('stat_counts')
+    return (select([ems.c.name, stat_counts.c.stat, stat_counts.c.count])
+            .select_from(ems.join(stat_counts, stat_counts.c.ems_id == ems.c.id)))
+
+
+def get_provider_stats(provider_names, stats=provider_stats, db=None):
+    """Counts the vms, templates, hosts, clusters and datastores of providers in one query
+
+    Every stat is a grouped ``COUNT`` in the database, and all of them go out as a single
+    statement, which is only built once for the same stats and number of providers.
+
+    Args:
+        provider_names: Names of the providers, as in the ``ext_management_systems`` table
+        stats: Which of :py:data:`provider_stats` to count
+        db: :py:class:`utils.db.Db` to query, the appliance's by default
+
+    Returns:
+        :py:class:`collections.OrderedDict` of provider name to a dict of stat name to count,
+        providers not in the database have every count at 0.
+    """
+    if db is None:
+        db = cfmedb()
+    provider_names = list(provider_names)
+    stats = tuple(stats)
+    unknown = set(stats) - set(provider_stats)
+    if unknown:
+        raise ValueError("Unknown provider stats: {}".format(", ".join(sorted(unknown))))
+    results = OrderedDict(
+        (name, OrderedDict((stat, 0) for stat in stats)) for name in provider_names)
+    if not provider_names or not stats:
+        return results
+    names = {'name_{}'.format(i): name for i, name in enumerate(provider_names)}
+    rows = db.execute_cached(
+        ('provider_stats', stats, len(provider_names)),
+        lambda db: _provider_stats_statement(db, stats, len(provider_names)), **names)
+    for name, stat, count in rows:
+        results[name][stat] = count
+    return results
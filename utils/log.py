@@ -133,10 +133,14 @@ Members
 import inspect
 import logging
 import sys
+import threading
 import warnings
 import datetime as dt
+from itertools import groupby
 from logging.handlers import RotatingFileHandler, SysLogHandler
+from operator import itemgetter
 from pkgutil import iter_modules
+from Queue import Empty, Full, Queue
 from time import time
 from traceback import extract_tb
 
@@ -249,10 +253,10 @@ class _RelpathFilter(logging.Filter):
     """
     def filter(self, record):
         try:
-            relpath = get_rel_path(record.source_file) or record.source_file
+            relpath = _source_path(record.source_file)
             lineno = record.source_lineno
         except AttributeError:
-            relpath = get_rel_path(record.pathname) or record.pathname
+            relpath = _source_path(record.pathname)
             lineno = record.lineno
         if lineno:
             record.source = "%s:%d" % (relpath, lineno)
@@ -432,8 +436,106 @@ def nth_frame_info(n):
     return inspect.getframeinfo(inspect.stack(1)[n][0])
 
 
+_source_paths = {}
+
+
+def _source_path(filename):
+    """:py:func:`get_rel_path <utils.path.get_rel_path>` of a source file, memoized
+
+    The same few files log over and over, so converting their paths every time is wasted work.
+    """
+    try:
+        return _source_paths[filename]
+    except KeyError:
+        relpath = _source_paths[filename] = get_rel_path(filename) or filename
+        return relpath
+
+
+class ArtifactorLogQueue(object):
+    """Hands log records off to the artifactor in batches, from a background thread
+
+    Logging never waits for the artifactor. If it can't keep up and the queue fills up, records
+    are dropped and counted in :py:attr:`dropped` instead.
+
+    Args:
+        max_size: Maximum number of records waiting to be sent
+        batch_size: Maximum number of records sent in one hook call
+        client: Artifactor client, the one of :py:mod:`fixtures.artifactor_plugin` by default
+
+    """
+    def __init__(self, max_size=10000, batch_size=200, client=None):
+        self.queue = Queue(max_size)
+        self.batch_size = batch_size
+        self.client = client
+        self.dropped = 0
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def put(self, log_record, slaveid):
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((slaveid, log_record))
+        except Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """Waits until all the queued records are sent
+
+        Returns: ``True`` if the queue was flushed, ``False`` if the timeout expired
+        """
+        queue = self.queue
+        deadline = None if timeout is None else time() + timeout
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks:
+                if deadline is None:
+                    queue.all_tasks_done.wait()
+                else:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        return False
+                    queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                if self.client is None:
+                    from fixtures.artifactor_plugin import art_client
+                    self.client = art_client
+                thread = threading.Thread(target=self._send, name='artifactor-log-queue')
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _send(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                for slaveid, items in groupby(batch, itemgetter(0)):
+                    self.client.fire_hook('log_messages',
+                        log_records=[log_record for _, log_record in items], slaveid=slaveid)
+            except Exception as e:
+                # Not through the adapter, that would queue more records
+                cfme_logger.error('Sending %d log records to the artifactor failed: %s: %s',
+                    len(batch), type(e).__name__, e)
+            finally:
+                for item in batch:
+                    self.queue.task_done()
+
+
 class ArtifactorLoggerAdapter(logging.LoggerAdapter):
-    """Logger Adapter that hands messages off to the artifactor before logging"""
+    """Logger Adapter that hands messages off to the artifactor before logging
+
+    Messages below the level of the logger and the level of the artifactor's logger plugin are
+    dropped before any other work is done. Records for the artifactor go through
+    :py:data:`art_log_queue`.
+    """
     @lazycache
     def artifactor(self):
         from fixtures.artifactor_plugin import art_client
@@ -444,74 +546,85 @@ class ArtifactorLoggerAdapter(logging.LoggerAdapter):
         from fixtures.artifactor_plugin import SLAVEID
         return SLAVEID or ""
 
+    @lazycache
+    def art_level(self):
+        """Lowest level the artifactor's logger plugin logs, ``None`` if it doesn't log"""
+        if not self.artifactor:
+            return None
+        for plugin in conf.env.get('artifactor', {}).get('plugins', {}).itervalues():
+            if plugin.get('plugin') == 'logger' and plugin.get('enabled', True):
+                level = logging.getLevelName(str(plugin.get('level', 'DEBUG')).upper())
+                return level if isinstance(level, int) else logging.DEBUG
+        return None
+
+    @lazycache
+    def art_queue(self):
+        return art_log_queue
+
     def art_log(self, level_name, message, kwargs):
         art_log_record = {
             'level': level_name,
             'message': str(message),
             'extra': kwargs.get('extra', '')
         }
-        self.artifactor.fire_hook('log_message', log_record=art_log_record, slaveid=self.slaveid)
+        self.art_queue.put(art_log_record, self.slaveid)
+
+    def _log(self, lvl, level_name, msg, args, kwargs):
+        to_logger = self.logger.isEnabledFor(lvl)
+        art_level = self.art_level
+        to_artifactor = art_level is not None and lvl >= art_level
+        if not (to_logger or to_artifactor):
+            return
+        msg, kwargs = self.process(msg, kwargs)
+        if to_artifactor:
+            self.art_log(level_name, msg % args if args else msg, kwargs)
+        if to_logger:
+            return self.logger.log(lvl, msg, *args, **kwargs)
 
     def log(self, lvl, msg, *args, **kwargs):
-        level_name = logging.getLevelName(lvl).lower()
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log(level_name, msg, kwargs)
-        return self.logger.log(lvl, msg, *args, **kwargs)
+        return self._log(lvl, logging.getLevelName(lvl).lower(), msg, args, kwargs)
 
     def trace(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('trace', msg, kwargs)
-        return self.logger.trace(msg, *args, **kwargs)
+        return self._log(logging.TRACE, 'trace', msg, args, kwargs)
 
     def debug(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('debug', msg, kwargs)
-        return self.logger.debug(msg, *args, **kwargs)
+        return self._log(logging.DEBUG, 'debug', msg, args, kwargs)
 
     def info(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('info', msg, kwargs)
-        return self.logger.info(msg, *args, **kwargs)
+        return self._log(logging.INFO, 'info', msg, args, kwargs)
 
     def warning(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('warning', msg, kwargs)
-        return self.logger.warning(msg, *args, **kwargs)
+        return self._log(logging.WARNING, 'warning', msg, args, kwargs)
 
     def error(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('error', msg, kwargs)
-        return self.logger.error(msg, *args, **kwargs)
+        return self._log(logging.ERROR, 'error', msg, args, kwargs)
 
     def critical(self, msg, *args, **kwargs):
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('critical', msg, kwargs)
-        return self.logger.critical(msg, *args, **kwargs)
+        return self._log(logging.CRITICAL, 'critical', msg, args, kwargs)
 
     def exception(self, msg, *args, **kwargs):
         kwargs['exc_info'] = 1
-        msg, kwargs = self.process(msg, kwargs)
-        self.art_log('error', msg, kwargs)
-        return self.logger.error(msg, *args, **kwargs)
+        return self._log(logging.ERROR, 'error', msg, args, kwargs)
 
     def process(self, msg, kwargs):
-        # frames
-        # 0: call to nth_frame_info
-        # 1: adapter process method (this method)
-        # 2: adapter logging method
-        # 3: original logging call
-        frameinfo = nth_frame_info(3)
         extra = kwargs.get('extra', {})
-        extra.update({
-            'source_file': get_rel_path(frameinfo.filename) or frameinfo.filename,
-            'source_lineno': frameinfo.lineno
-        })
+        if 'source_file' not in extra:
+            # frames
+            # 0: adapter process method (this method)
+            # 1: adapter _log method
+            # 2: adapter logging method
+            # 3: original logging call
+            frame = sys._getframe(3)
+            extra['source_file'] = _source_path(frame.f_code.co_filename)
+            extra['source_lineno'] = frame.f_lineno
         kwargs['extra'] = extra
         return msg, kwargs
 
 
 cfme_logger = create_logger('cfme')
 
+art_log_queue = ArtifactorLogQueue()
+
 logger = ArtifactorLoggerAdapter(cfme_logger, {})
 
 perflog = Perflog()
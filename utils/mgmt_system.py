@@ -4,11 +4,14 @@
 Used to communicate with providers without using CFME facilities
 """
 import re
+import threading
 import winrm
 from abc import ABCMeta, abstractmethod
+from collections import defaultdict
 from cStringIO import StringIO
 from contextlib import contextmanager
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from textwrap import dedent
 import operator
 
@@ -30,6 +33,7 @@ from psphere.client import Client
 from psphere.errors import ObjectNotFoundError
 
 from cfme import exceptions as cfme_exc
+from utils import diaper
 from utils.log import logger
 from utils.randomness import generate_random_string
 from utils.version import LooseVersion, current_version
@@ -90,6 +94,12 @@ class MgmtSystemAPIBase(object):
     # default True
     can_suspend = True
 
+    # Maximum number of vms the default batch methods act on at the same time
+    batch_workers = 8
+
+    # Seconds pollers of :py:meth:`stats` (like provider validation) reuse the stats for
+    stats_ttl = 60
+
     @abstractmethod
     def start_vm(self, vm_name):
         """Starts a vm.
@@ -330,16 +340,155 @@ class MgmtSystemAPIBase(object):
 
         """
 
-    def stats(self, *requested_stats):
+    def start_vms(self, vm_names):
+        """Starts several vms at once.
+
+        Args:
+            vm_names: names of the vms to be started
+        Returns: dict mapping the vm names to whether the vm was started
+        """
+        return self._map_vms(self.start_vm, vm_names)
+
+    def stop_vms(self, vm_names):
+        """Stops several vms at once.
+
+        Args:
+            vm_names: names of the vms to be stopped
+        Returns: dict mapping the vm names to whether the vm was stopped
+        """
+        return self._map_vms(self.stop_vm, vm_names)
+
+    def delete_vms(self, vm_names):
+        """Deletes several vms at once.
+
+        Args:
+            vm_names: names of the vms to be deleted
+        Returns: dict mapping the vm names to whether the vm was deleted
+        """
+        return self._map_vms(self.delete_vm, vm_names)
+
+    def wait_vms_state(self, vm_names, state, num_sec=600):
+        """Waits for several vms to reach a state, checking all of them in every round.
+
+        Args:
+            vm_names: names of the vms to wait for
+            state: one of ``running``, ``stopped`` or ``suspended``
+            num_sec: number of seconds before giving up on the vms still not in the state
+        Returns: dict mapping the vm names to whether the vm reached the state in time
+        """
+        check = {
+            'running': self.is_vm_running,
+            'stopped': self.is_vm_stopped,
+            'suspended': self.is_vm_suspended,
+        }[state]
+        vm_names = list(vm_names)
+        pending = set(vm_names)
+
+        def _check_pending():
+            self._refresh_vm_states(pending)
+            for vm_name in list(pending):
+                try:
+                    if check(vm_name):
+                        pending.discard(vm_name)
+                except Exception:
+                    # Not there (yet), or in a state that can't be checked
+                    pass
+            return not pending
+
+        wait_for(_check_pending, num_sec=num_sec, delay=5, silent_failure=True,
+            message="%d vms to be %s" % (len(vm_names), state))
+        return {vm_name: vm_name not in pending for vm_name in vm_names}
+
+    def vm_statuses(self, vm_names=None):
+        """Statuses of many vms, with as few calls to the mgmt system as possible.
+
+        The default lists the vms once and asks for the status of the existing ones, systems
+        able to fetch all the statuses in one call override it.
+
+        Args:
+            vm_names: names of the vms, all vms by default
+        Returns: dict mapping the names of the existing vms to their states, as returned by
+            :py:meth:`vm_status`; vms that don't exist are left out
+        """
+        existing = self._select_vms(dict.fromkeys(self.list_vm()), vm_names)
+        return {vm_name: self.vm_status(vm_name) for vm_name in existing}
+
+    @staticmethod
+    def _select_vms(statuses, vm_names):
+        """Narrows a dict of all vms down to the requested ones, if any were requested"""
+        if vm_names is None:
+            return statuses
+        return {vm_name: statuses[vm_name] for vm_name in vm_names if vm_name in statuses}
+
+    def _refresh_vm_states(self, vm_names):
+        """Fetches the states of many vms at once before :py:meth:`wait_vms_state` checks them.
+
+        The default is a noop, systems able to do so should override it.
+        """
+
+    def _map_vms(self, method, vm_names):
+        """Calls a single-vm method for every vm, in a bounded thread pool
+
+        Returns: dict mapping the vm names to whether the method returned a truthy value
+        """
+        vm_names = list(vm_names)
+        results = {}
+        if not vm_names:
+            return results
+        pool = ThreadPool(min(self.batch_workers, len(vm_names)))
+        try:
+            async_results = [
+                (vm_name, pool.apply_async(method, [vm_name])) for vm_name in vm_names]
+            for vm_name, async_result in async_results:
+                try:
+                    results[vm_name] = bool(async_result.get())
+                except Exception as e:
+                    logger.error('%s of %s failed: %s: %s',
+                        method.__name__, vm_name, type(e).__name__, str(e))
+                    results[vm_name] = False
+        finally:
+            pool.close()
+            pool.join()
+        return results
+
+    def stats(self, *requested_stats, **kwargs):
         """Returns all available stats, if none are explicitly requested
 
+        The stats are collected together by :py:meth:`_collect_stats` and kept, so that callers
+        polling them, like provider validation, can reuse them for a while with ``max_age``.
+
         Args:
             *requested_stats: A list giving the name of the stats to return. Stats are defined
                 in the _stats_available attibute of the specific class.
+            max_age: Reuse stats collected at most this many seconds ago (see :py:attr:`stats_ttl`),
+                by default they are collected anew.
         Returns: A dict of stats.
         """
-        requested_stats = requested_stats or self._stats_available
-        return {stat: self._stats_available[stat](self) for stat in requested_stats}
+        max_age = kwargs.pop('max_age', None)
+        requested_stats = list(requested_stats or self._stats_available)
+        for stat in requested_stats:
+            if stat not in self._stats_available:
+                raise KeyError(stat)
+        cache = self.__dict__.setdefault('_stats_cache', {})
+        if max_age:
+            now = time.time()
+            missing = [stat for stat in requested_stats
+                if stat not in cache or now - cache[stat][0] > max_age]
+        else:
+            missing = requested_stats
+        if missing:
+            collected_time = time.time()
+            for stat, value in self._collect_stats(missing).iteritems():
+                cache[stat] = (collected_time, value)
+        return {stat: cache[stat][1] for stat in requested_stats}
+
+    def _collect_stats(self, stats):
+        """Computes the given stats, returns a dict of them
+
+        The default computes them one by one, systems able to get several stats from a single
+        API call should override it.
+        """
+        return {stat: self._stats_available[stat](self) for stat in stats}
 
     def in_steady_state(self, vm_name):
         """Return whether the specified virtual machine is in steady state
@@ -373,6 +522,169 @@ class MgmtSystemAPIBase(object):
         return hasattr(self, "rename_vm")
 
 
+class VSphereUpdateTracker(object):
+    """Local mirror of VM properties, kept up to date by a vSphere property collector subscription
+
+    A background thread registers a property filter for the tracked properties of every VM
+    (``CreateFilter``) and then blocks in ``WaitForUpdatesEx``, applying the incremental
+    updates vSphere sends whenever a tracked property changes. Waiters can block on
+    :py:attr:`condition`, which is notified after every applied update, instead of refreshing
+    the managed objects over and over.
+
+    The subscription uses its own API session, because ``WaitForUpdatesEx`` blocks the
+    connection it is called on. The session is logged out when the tracker stops.
+
+    Args:
+        client_factory: Callable returning a new, logged in psphere client.
+        properties: VM property paths to track; ``name`` is always tracked.
+        max_wait: Seconds a single ``WaitForUpdatesEx`` call blocks on the server.
+    """
+    def __init__(self, client_factory, properties=('runtime.powerState',), max_wait=30):
+        self._client_factory = client_factory
+        self.properties = ['name'] + [prop for prop in properties if prop != 'name']
+        self.max_wait = max_wait
+        #: Notified every time an update was applied to the mirror
+        self.condition = threading.Condition()
+        #: Set once the mirror holds the complete initial state
+        self.synced = threading.Event()
+        self.failed = False
+        self.version = None
+        self._vms = {}
+        self._names = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._collector = None
+
+    def __repr__(self):
+        return "<VSphereUpdateTracker vms={} version={}>".format(len(self._vms), self.version)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.failed = False
+        self._thread = threading.Thread(target=self._run, name='vsphere-update-tracker')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Ends the subscription, cancelling the ``WaitForUpdatesEx`` call in progress
+
+        Args:
+            timeout: Seconds to wait for the background thread to finish, by default it's
+                left to finish on its own.
+        """
+        self._stop.set()
+        collector = self._collector
+        if collector is not None:
+            diaper(collector.CancelWaitForUpdates)
+        if timeout is not None and self._thread is not None:
+            self._thread.join(timeout)
+
+    def get(self, vm_name, prop):
+        """Returns the mirrored value of a property, or None if the VM isn't known"""
+        with self.condition:
+            key = self._names.get(vm_name)
+            if key is None:
+                return None
+            return self._vms[key].get(prop)
+
+    def vm_names(self):
+        with self.condition:
+            return self._names.keys()
+
+    def _run(self):
+        client = None
+        try:
+            client = self._client_factory()
+            collector = self._collector = client.si.content.propertyCollector
+            property_spec = client.create('PropertySpec')
+            property_spec.all = False
+            property_spec.pathSet = self.properties
+            property_spec.type = 'VirtualMachine'
+            pfs = client.get_search_filter_spec(client.si.content.rootFolder, property_spec)
+            collector.CreateFilter(spec=pfs, partialUpdates=True)
+            options = client.create('WaitOptions')
+            options.maxWaitSeconds = self.max_wait
+            version = ''
+            while not self._stop.is_set():
+                update_set = collector.WaitForUpdatesEx(version=version, options=options)
+                if update_set is None:
+                    # maxWaitSeconds passed without any change
+                    continue
+                self._apply_update_set(update_set)
+                version = update_set.version
+                if not getattr(update_set, 'truncated', False):
+                    self.synced.set()
+        except Exception as e:
+            if not self._stop.is_set():
+                self.failed = True
+                logger.error(
+                    'vSphere update tracking failed: {}: {}'.format(type(e).__name__, e))
+        finally:
+            self._collector = None
+            self.synced.clear()
+            with self.condition:
+                self.condition.notify_all()
+            if client is not None:
+                # The session's filters go away with it
+                diaper(client.logout)
+
+    def _apply_update_set(self, update_set):
+        with self.condition:
+            for filter_update in getattr(update_set, 'filterSet', None) or []:
+                for object_update in getattr(filter_update, 'objectSet', None) or []:
+                    self._apply_object_update(object_update)
+            self.version = update_set.version
+            self.condition.notify_all()
+
+    def _apply_object_update(self, object_update):
+        key = _moref_key(object_update.obj)
+        if object_update.kind == 'leave':
+            vm = self._vms.pop(key, {})
+            self._names.pop(vm.get('name'), None)
+            return
+        vm = self._vms.setdefault(key, {})
+        for change in getattr(object_update, 'changeSet', None) or []:
+            if change.name == 'name' and vm.get('name') is not None:
+                self._names.pop(vm['name'], None)
+            if change.op in ('remove', 'indirectRemove'):
+                vm.pop(change.name, None)
+            else:
+                vm[change.name] = getattr(change, 'val', None)
+        if vm.get('name') is not None:
+            self._names[vm['name']] = key
+
+
+def _moref_key(obj):
+    """Hashable identity of a managed object (reference) returned by the vSphere API"""
+    mo_ref = getattr(obj, '_mo_ref', obj)
+    return getattr(mo_ref, 'value', mo_ref)
+
+
+def _moref_type(obj):
+    """Type name of a managed object (reference) returned by the vSphere API"""
+    mo_ref = getattr(obj, '_mo_ref', obj)
+    return getattr(mo_ref, '_type', None)
+
+
+def _has_items(value):
+    """Whether an array property value returned by the vSphere API has any items
+
+    Arrays come wrapped in their ``ArrayOf...`` type, the items are its only attribute.
+    """
+    if value is None or isinstance(value, (list, tuple)):
+        return bool(value)
+    items = [
+        item for name, item in getattr(value, '__dict__', {}).iteritems()
+        if not name.startswith('_')]
+    return any(items)
+
+
 class VMWareSystem(MgmtSystemAPIBase):
     """Client to Vsphere API
 
@@ -396,16 +708,42 @@ class VMWareSystem(MgmtSystemAPIBase):
         'num_template': lambda self: len(self.list_template()),
         'num_datastore': lambda self: len(self.list_datastore()),
     }
+    # The managed object type each stat counts, and the property needed to count it
+    _stats_properties = {
+        'num_vm': ('VirtualMachine', 'config.template'),
+        'num_template': ('VirtualMachine', 'config.template'),
+        'num_host': ('HostSystem', 'name'),
+        'num_cluster': ('ClusterComputeResource', 'name'),
+        'num_datastore': ('Datastore', 'host'),
+    }
     POWERED_ON = 'poweredOn'
     POWERED_OFF = 'poweredOff'
     SUSPENDED = 'suspended'
 
+    #: VM properties available in :py:meth:`inventory`, mapped to their vSphere property paths
+    INVENTORY_PROPERTIES = {
+        'name': 'name',
+        'power_state': 'runtime.powerState',
+        'ip_address': 'summary.guest.ipAddress',
+        'boot_time': 'runtime.bootTime',
+        'template': 'config.template',
+    }
+
     def __init__(self, hostname, username, password, **kwargs):
         self.hostname = hostname
         self.username = username
         self.password = password
         self._api = None
         self._vm_cache = {}
+        self._inventory = None
+        # Seconds an inventory snapshot is used to answer per-vm queries
+        self.inventory_ttl = kwargs.get('inventory_ttl', 10)
+        # Mirror vm power states through a property collector subscription while waiting
+        self.update_tracking = kwargs.get('update_tracking', True)
+        # Keep the subscription between waits, until disconnect(); only worth it for system
+        # objects that are kept around, every tracker has its own vSphere session and thread
+        self.keep_update_tracker = kwargs.get('keep_update_tracker', False)
+        self._update_tracker = None
         self.kwargs = kwargs
 
     @property
@@ -418,6 +756,26 @@ class VMWareSystem(MgmtSystemAPIBase):
     def version(self):
         return LooseVersion(self.api.si.content.about.version)
 
+    @property
+    def update_tracker(self):
+        """ The :py:class:`VSphereUpdateTracker` of this system, started on first use.
+
+        None if update tracking is disabled, or if it failed before (polling is used then).
+        The waits stop it again when they're done, unless ``keep_update_tracker`` was passed.
+        """
+        if not self.update_tracking:
+            return None
+        if self._update_tracker is not None and self._update_tracker.failed:
+            logger.warning('vSphere update tracking on %s failed, falling back to polling',
+                self.hostname)
+            self.update_tracking = False
+            return None
+        if self._update_tracker is None or not self._update_tracker.running:
+            self._update_tracker = VSphereUpdateTracker(
+                lambda: _PsphereClient(self.hostname, self.username, self.password))
+            self._update_tracker.start()
+        return self._update_tracker
+
     @property
     def default_resource_pool(self):
         return self.kwargs.get("default_resource_pool", None)
@@ -458,6 +816,125 @@ class VMWareSystem(MgmtSystemAPIBase):
         if task.info.state not in ['queued', 'running', None]:
             return task.info.state
 
+    def _retrieve_properties(self, type_paths):
+        """ Fetches properties of all managed objects of some types in a single RetrieveProperties
+        call.
+
+        Args:
+            type_paths: A dict mapping managed object types, e.g. ``VirtualMachine``, to the
+                vSphere property paths to fetch for them, e.g. ``runtime.powerState``.
+        Returns: A list of tuples of (managed object type, dict mapping the property paths to
+            their values). Properties that are not set on an object are missing from its dict.
+        """
+        # Use some psphere internals to get propsets back directly with requested properties,
+        # so we skip the network overhead of returning full managed objects
+        property_specs = []
+        for obj_type, property_paths in type_paths.iteritems():
+            property_spec = self.api.create('PropertySpec')
+            property_spec.all = False
+            property_spec.pathSet = list(property_paths)
+            property_spec.type = obj_type
+            property_specs.append(property_spec)
+        pfs = self.api.get_search_filter_spec(self.api.si.content.rootFolder, property_specs[0])
+        # The traversal reaches every type, one filter spec serves all of them
+        pfs.propSet = property_specs
+        object_contents = self.api.si.content.propertyCollector.RetrieveProperties(specSet=[pfs])
+
+        # Nested property lookups work, but the attr lookup on the
+        # vm object still triggers a request even though the vm
+        # object already "knows" the answer in its cached object
+        # content. So we just pull the value straight out of the cache.
+        return [
+            (_moref_type(object_content.obj),
+             {p.name: p.val for p in getattr(object_content, 'propSet', [])})
+            for object_content in object_contents or []]
+
+    def _retrieve_vm_properties(self, property_paths):
+        """ Fetches properties of all VMs and templates in a single RetrieveProperties call.
+
+        Args:
+            property_paths: vSphere property paths to fetch, e.g. ``runtime.powerState``.
+        Returns: A list of dicts mapping the property paths to their values. Properties that
+            are not set on a VM are missing from its dict.
+        """
+        return [
+            props for obj_type, props in self._retrieve_properties(
+                {'VirtualMachine': property_paths})]
+
+    def _collect_stats(self, stats):
+        """ Counts every requested stat from a single RetrieveProperties call."""
+        type_paths = {}
+        for stat in stats:
+            obj_type, property_path = self._stats_properties[stat]
+            type_paths.setdefault(obj_type, set()).add(property_path)
+        counts = dict.fromkeys(stats, 0)
+        for obj_type, props in self._retrieve_properties(type_paths):
+            if obj_type == 'VirtualMachine':
+                # Like list_vm and list_template, vms without a config are neither
+                template = props.get('config.template')
+                stat = {True: 'num_template', False: 'num_vm'}.get(template)
+            elif obj_type == 'Datastore':
+                # Like list_datastore, only datastores mounted on a host
+                stat = 'num_datastore' if _has_items(props.get('host')) else None
+            else:
+                stat = {'HostSystem': 'num_host', 'ClusterComputeResource': 'num_cluster'}.get(
+                    obj_type)
+            if stat in counts:
+                counts[stat] += 1
+        return counts
+
+    def inventory(self, props=None, max_age=None):
+        """ Returns a snapshot of all VMs and templates, fetched in a single API call.
+
+        The snapshot is cached, and the per-vm queries (:py:meth:`vm_status`,
+        :py:meth:`does_vm_exist`, ...) are answered from it while it is younger than
+        :py:attr:`inventory_ttl` seconds, so checking many VMs right after taking a snapshot
+        costs no further API calls. Power operations done through this object invalidate it.
+
+        Args:
+            props: Names of the properties to fetch, see :py:attr:`INVENTORY_PROPERTIES`.
+                All of them by default. ``name`` is always fetched.
+            max_age: Return the cached snapshot if it's at most this many seconds old
+                (defaults to :py:attr:`inventory_ttl`), 0 forces a new snapshot.
+        Returns: A dict mapping vm names to dicts of the requested properties.
+        """
+        props = set(props or self.INVENTORY_PROPERTIES) | {'name'}
+        if max_age is None:
+            max_age = self.inventory_ttl
+        cached = self._fresh_inventory(max_age)
+        if cached is not None and props <= cached[1]:
+            return cached[2]
+
+        paths = {self.INVENTORY_PROPERTIES[prop]: prop for prop in props}
+        snapshot = {}
+        for vm_props in self._retrieve_vm_properties(paths.keys()):
+            vm = {prop: vm_props.get(path) for path, prop in paths.iteritems()}
+            snapshot[vm['name']] = vm
+        self._inventory = (time.time(), props, snapshot)
+        return snapshot
+
+    def _fresh_inventory(self, max_age=None):
+        """ Returns the cached inventory tuple of (timestamp, props, snapshot), if fresh enough"""
+        if max_age is None:
+            max_age = self.inventory_ttl
+        if self._inventory is not None and time.time() - self._inventory[0] <= max_age:
+            return self._inventory
+        return None
+
+    def _inventory_lookup(self, vm_name, prop):
+        """ Answers a per-vm query from a fresh inventory snapshot.
+
+        Returns: A tuple of (found, vm properties); ``found`` is False if there is no usable
+            snapshot, the vm properties are None if the vm doesn't exist.
+        """
+        cached = self._fresh_inventory()
+        if cached is None or prop not in cached[1]:
+            return False, None
+        return True, cached[2].get(vm_name)
+
+    def _invalidate_inventory(self):
+        self._inventory = None
+
     def does_vm_exist(self, name):
         """ Checks if a vm exists or not.
 
@@ -465,6 +942,9 @@ class VMWareSystem(MgmtSystemAPIBase):
             name: The name of the requested vm.
         Returns: A boolean, ``True`` if the vm exists, ``False`` if not.
         """
+        found, vm = self._inventory_lookup(name, 'name')
+        if found:
+            return vm is not None
         try:
             self._get_vm(name)
             return True
@@ -474,8 +954,12 @@ class VMWareSystem(MgmtSystemAPIBase):
     def current_ip_address(self, vm_name):
         ipv4_re = r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}'
         try:
-            vm = self._get_vm(vm_name)
-            ip_address = vm.summary.guest.ipAddress
+            found, vm_props = self._inventory_lookup(vm_name, 'ip_address')
+            if found and vm_props is not None:
+                ip_address = vm_props['ip_address']
+            else:
+                vm = self._get_vm(vm_name)
+                ip_address = vm.summary.guest.ipAddress
             if not re.match(ipv4_re, ip_address) or ip_address == '127.0.0.1':
                 ip_address = None
             return ip_address
@@ -509,27 +993,12 @@ class VMWareSystem(MgmtSystemAPIBase):
             get_template: A boolean describing if it should return template names also.
         Returns: A list of VMs.
         """
-        # Use some psphere internals to get vm propsets back directly with requested properties,
-        # so we skip the network overhead of returning full managed objects
-        property_spec = self.api.create('PropertySpec')
-        property_spec.all = False
-        property_spec.pathSet = ['name', 'config.template']
-        property_spec.type = 'VirtualMachine'
-        pfs = self.api.get_search_filter_spec(self.api.si.content.rootFolder, property_spec)
-        object_contents = self.api.si.content.propertyCollector.RetrieveProperties(specSet=[pfs])
-
         # Ensure get_template is either True or False to match the config.template property
         get_template = bool(get_template)
 
         # Select the vms or templates based on get_template and the returned properties
         obj_list = []
-        for object_content in object_contents:
-            # Nested property lookups work, but the attr lookup on the
-            # vm object still triggers a request even though the vm
-            # object already "knows" the answer in its cached object
-            # content. So we just pull the value straight out of the cache.
-            vm_props = {p.name: p.val for p in object_content.propSet}
-
+        for vm_props in self._retrieve_vm_properties(['name', 'config.template']):
             if vm_props.get('config.template') == get_template:
                 obj_list.append(vm_props['name'])
         return obj_list
@@ -571,6 +1040,7 @@ class VMWareSystem(MgmtSystemAPIBase):
         else:
             logger.info(" Starting vSphere VM %s" % vm_name)
             vm = self._get_vm(vm_name)
+            self._invalidate_inventory()
             vm.PowerOnVM_Task()
             self.wait_vm_running(vm_name)
             return True
@@ -583,12 +1053,14 @@ class VMWareSystem(MgmtSystemAPIBase):
         else:
             logger.info(" Stopping vSphere VM %s" % vm_name)
             vm = self._get_vm(vm_name)
+            self._invalidate_inventory()
             if self.is_vm_suspended(vm_name):
                 logger.info(
                     " Resuming suspended VM %s before stopping." % vm_name
                 )
                 vm.PowerOnVM_Task()
                 self.wait_vm_running(vm_name)
+                self._invalidate_inventory()
             vm.PowerOffVM_Task()
             self.wait_vm_stopped(vm_name)
             return True
@@ -600,6 +1072,7 @@ class VMWareSystem(MgmtSystemAPIBase):
         self.stop_vm(vm_name)
 
         task = vm.Destroy_Task()
+        self._invalidate_inventory()
         status, t = wait_for(self._task_wait, [task])
         return status == 'success'
 
@@ -642,13 +1115,29 @@ class VMWareSystem(MgmtSystemAPIBase):
         pass
 
     def disconnect(self):
-        pass
+        self._stop_update_tracker()
+
+    def _stop_update_tracker(self, timeout=None):
+        tracker, self._update_tracker = self._update_tracker, None
+        if tracker is not None:
+            tracker.stop(timeout)
 
     def vm_status(self, vm_name):
+        tracker = self._update_tracker
+        if tracker is not None and tracker.synced.is_set():
+            power_state = tracker.get(vm_name, 'runtime.powerState')
+            if power_state is not None:
+                return power_state
+        found, vm_props = self._inventory_lookup(vm_name, 'power_state')
+        if found and vm_props is not None:
+            return vm_props['power_state']
         return self._get_vm(vm_name, force=True).runtime.powerState
 
     def vm_creation_time(self, vm_name):
         # psphere turns date strings in datetime for us
+        found, vm_props = self._inventory_lookup(vm_name, 'boot_time')
+        if found and vm_props is not None:
+            return vm_props['boot_time']
         vm = self._get_vm(vm_name)
         return vm.runtime.bootTime
 
@@ -658,23 +1147,39 @@ class VMWareSystem(MgmtSystemAPIBase):
     def is_vm_running(self, vm_name):
         return self.vm_status(vm_name) == self.POWERED_ON
 
+    def _wait_vm_status(self, check, vm_name, num_sec):
+        """ Waits for ``check(vm_name)``, woken by the update tracker when the vm changes"""
+        tracker = self.update_tracker
+        if tracker is not None:
+            # Until the initial state has arrived, vm_status falls back to polling
+            tracker.synced.wait(10)
+            notifier = tracker.condition
+        else:
+            notifier = None
+        try:
+            wait_for(check, [vm_name], num_sec=num_sec, notifier=notifier)
+        finally:
+            # A failed tracker is left in place, so the next wait falls back to polling
+            if tracker is not None and not tracker.failed and not self.keep_update_tracker:
+                self._stop_update_tracker(timeout=10)
+
     def wait_vm_running(self, vm_name, num_sec=240):
         logger.info(" Waiting for vSphere VM %s to change status to ON" % vm_name)
-        wait_for(self.is_vm_running, [vm_name], num_sec=num_sec)
+        self._wait_vm_status(self.is_vm_running, vm_name, num_sec)
 
     def is_vm_stopped(self, vm_name):
         return self.vm_status(vm_name) == self.POWERED_OFF
 
     def wait_vm_stopped(self, vm_name, num_sec=240):
         logger.info(" Waiting for vSphere VM %s to change status to OFF" % vm_name)
-        wait_for(self.is_vm_stopped, [vm_name], num_sec=num_sec)
+        self._wait_vm_status(self.is_vm_stopped, vm_name, num_sec)
 
     def is_vm_suspended(self, vm_name):
         return self.vm_status(vm_name) == self.SUSPENDED
 
     def wait_vm_suspended(self, vm_name, num_sec=360):
         logger.info(" Waiting for vSphere VM %s to change status to SUSPENDED" % vm_name)
-        wait_for(self.is_vm_suspended, [vm_name], num_sec=num_sec)
+        self._wait_vm_status(self.is_vm_suspended, vm_name, num_sec)
 
     def suspend_vm(self, vm_name):
         self.wait_vm_steady(vm_name)
@@ -683,13 +1188,96 @@ class VMWareSystem(MgmtSystemAPIBase):
         if self.is_vm_stopped(vm_name):
             raise VMInstanceNotSuspended(vm_name)
         else:
+            self._invalidate_inventory()
             vm.SuspendVM_Task()
             self.wait_vm_suspended(vm_name)
             return True
 
+    def vm_statuses(self, vm_names=None):
+        """ Returns a dict of the power states of the vms, fetched in one call; missing vms
+        and templates are left out."""
+        snapshot = self.inventory(props=['power_state', 'template'], max_age=0)
+        return self._select_vms({
+            vm_name: vm['power_state']
+            for vm_name, vm in snapshot.iteritems() if not vm['template']}, vm_names)
+
+    def _refresh_vm_states(self, vm_names):
+        tracker = self._update_tracker
+        if tracker is None or not tracker.synced.is_set():
+            self.inventory(props=['power_state'], max_age=0)
+
+    def _submit_vm_tasks(self, vm_names, task_method, action):
+        """ Submits a task for every vm, a vm failing to submit it doesn't stop the others.
+
+        Returns: dict mapping the names of the vms the task was submitted for to their tasks
+        """
+        tasks = {}
+        for vm_name in vm_names:
+            logger.info(" %s vSphere VM %s" % (action, vm_name))
+            try:
+                tasks[vm_name] = getattr(self._get_vm(vm_name), task_method)()
+            except Exception as e:
+                logger.error('%s of vSphere VM %s failed: %s: %s',
+                    task_method, vm_name, type(e).__name__, str(e))
+        return tasks
+
+    def start_vms(self, vm_names, num_sec=240):
+        """ Submits the power on tasks of all vms, then waits for all of them together."""
+        vm_names = list(vm_names)
+        states = self.vm_statuses(vm_names)
+        to_start = [vm_name for vm_name, state in states.iteritems() if state != self.POWERED_ON]
+        tasks = self._submit_vm_tasks(to_start, 'PowerOnVM_Task', 'Starting')
+        self._invalidate_inventory()
+        failed = set(to_start).difference(tasks)
+        results = self.wait_vms_state(
+            [vm_name for vm_name in states if vm_name not in failed], 'running', num_sec)
+        return {vm_name: results.get(vm_name, False) for vm_name in vm_names}
+
+    def stop_vms(self, vm_names, num_sec=240):
+        """ Submits the power off tasks of all vms, then waits for all of them together.
+
+        Suspended vms are resumed first, like :py:meth:`stop_vm` does.
+        """
+        vm_names = list(vm_names)
+        states = self.vm_statuses(vm_names)
+        suspended = [vm_name for vm_name, state in states.iteritems() if state == self.SUSPENDED]
+        if suspended:
+            logger.info(" Resuming suspended VMs %s before stopping." % ', '.join(suspended))
+            self.start_vms(suspended, num_sec=num_sec)
+        to_stop = [vm_name for vm_name, state in states.iteritems() if state != self.POWERED_OFF]
+        tasks = self._submit_vm_tasks(to_stop, 'PowerOffVM_Task', 'Stopping')
+        self._invalidate_inventory()
+        failed = set(to_stop).difference(tasks)
+        results = self.wait_vms_state(
+            [vm_name for vm_name in states if vm_name not in failed], 'stopped', num_sec)
+        return {vm_name: results.get(vm_name, False) for vm_name in vm_names}
+
+    def delete_vms(self, vm_names, num_sec=600):
+        """ Stops the vms, submits their destroy tasks and waits for the whole task list."""
+        vm_names = list(vm_names)
+        stopped = self.stop_vms(vm_names)
+        tasks = self._submit_vm_tasks(
+            [vm_name for vm_name in vm_names if stopped[vm_name]], 'Destroy_Task', 'Deleting')
+        self._invalidate_inventory()
+
+        results = {}
+
+        def _check_tasks():
+            for vm_name, task in tasks.items():
+                state = self._task_wait(task)
+                if state is not None:
+                    results[vm_name] = state == 'success'
+                    del tasks[vm_name]
+            return not tasks
+
+        wait_for(_check_tasks, num_sec=num_sec, delay=5, silent_failure=True,
+            message="vSphere destroy tasks")
+        return {vm_name: results.get(vm_name, False) for vm_name in vm_names}
+
     def rename_vm(self, vm_name, new_vm_name):
         vm = self._get_vm(vm_name)
         task = vm.Rename_Task(newName=new_vm_name)
+        self._invalidate_inventory()
         # Cycle until the new named vm is found
         # That must happen or the error state can come up too
         while not self.does_vm_exist(new_vm_name):
@@ -754,6 +1342,7 @@ class VMWareSystem(MgmtSystemAPIBase):
             folder = source_template.parent
 
         task = source_template.CloneVM_Task(folder=folder, name=destination, spec=vm_clone_spec)
+        self._invalidate_inventory()
 
         def _check():
             try:
@@ -773,6 +1362,7 @@ class VMWareSystem(MgmtSystemAPIBase):
             return destination
 
     def mark_as_template(self, vm_name):
+        self._invalidate_inventory()
         mobs.VirtualMachine.get(self.api, name=vm_name).MarkAsTemplate()  # Returns None
 
     def deploy_template(self, template, **kwargs):
@@ -1078,6 +1668,10 @@ class RHEVMSystem(MgmtSystemAPIBase):
     def vm_status(self, vm_name=None):
         return self._get_vm(vm_name).get_status().get_state()
 
+    def vm_statuses(self, vm_names=None):
+        return self._select_vms(
+            {vm.name: vm.get_status().get_state() for vm in self.api.vms.list()}, vm_names)
+
     def vm_creation_time(self, vm_name):
         vm = self._get_vm(vm_name)
         return vm.get_creation_time().replace(tzinfo=None)
@@ -1262,6 +1856,12 @@ class EC2System(MgmtSystemAPIBase):
         instance = self._get_instance(instance_id)
         return instance.state
 
+    def vm_statuses(self, vm_names=None):
+        """Returns the states of the instances (not terminated) by name, like :py:meth:`list_vm`"""
+        return self._select_vms({
+            inst.tags.get('Name', inst.id): inst.state
+            for inst in self._get_all_instances() if inst.state != 'terminated'}, vm_names)
+
     def vm_creation_time(self, instance_id):
         instance = self._get_instance(instance_id)
         # Example instance.launch_time: 2014-08-13T22:09:40.000Z
@@ -1530,6 +2130,84 @@ class EC2System(MgmtSystemAPIBase):
         instances = self._get_instances_from_reservations(reservations)
         return instances
 
+    def _get_instance_ids(self, instance_names):
+        """Resolves names to instance ids in a single call, leaving out the ones that can't be
+        resolved; IDs are passed through like :py:meth:`_get_instance_id_by_name` does"""
+        instance_ids = {}
+        names = []
+        for instance_name in instance_names:
+            if instance_name.startswith('i-') and len(instance_name) == 10:
+                instance_ids[instance_name] = instance_name
+            else:
+                names.append(instance_name)
+        if not names:
+            return instance_ids
+
+        named = defaultdict(list)
+        reservations = self.api.get_all_instances(filters={'tag:Name': names})
+        for instance in self._get_instances_from_reservations(reservations):
+            named[instance.tags.get('Name')].append(instance.id)
+        for instance_name in names:
+            if len(named[instance_name]) == 1:
+                instance_ids[instance_name] = named[instance_name][0]
+            elif not named[instance_name]:
+                logger.error('Cannot act on EC2 instance %s: not found', instance_name)
+            else:
+                logger.error('Cannot act on EC2 instance %s: the name is not unique',
+                    instance_name)
+        return instance_ids
+
+    def _batch_action(self, action, instance_names, state, num_sec):
+        instance_names = list(instance_names)
+        instance_ids = self._get_instance_ids(instance_names)
+        if instance_ids:
+            logger.info(" Calling %s on EC2 instances %s" % (
+                action.__name__, ', '.join(instance_ids.values())))
+            action(instance_ids.values())
+        results = self.wait_vms_state(instance_ids.values(), state, num_sec)
+        return {
+            instance_name: results.get(instance_ids.get(instance_name), False)
+            for instance_name in instance_names}
+
+    def start_vms(self, instance_ids, num_sec=360):
+        """Starts all instances in a single API call, then waits for all of them together"""
+        return self._batch_action(self.api.start_instances, instance_ids, 'running', num_sec)
+
+    def stop_vms(self, instance_ids, num_sec=360):
+        """Stops all instances in a single API call, then waits for all of them together"""
+        return self._batch_action(self.api.stop_instances, instance_ids, 'stopped', num_sec)
+
+    def delete_vms(self, instance_ids, num_sec=360):
+        """Terminates all instances in a single API call, then waits for all of them together"""
+        return self._batch_action(self.api.terminate_instances, instance_ids, 'deleted', num_sec)
+
+    def wait_vms_state(self, instance_ids, state, num_sec=360):
+        """Waits for instances to reach a state, fetching all of them in one call per round
+
+        Args:
+            instance_ids: IDs or names of the instances to wait for
+            state: one of the keys of :py:attr:`states`
+            num_sec: number of seconds before giving up on the instances still not in the state
+        Returns: dict mapping the passed IDs or names to whether the instance reached the state
+        """
+        instance_ids = list(instance_ids)
+        resolved_ids = self._get_instance_ids(instance_ids)
+        pending = set(resolved_ids.values())
+
+        def _check_pending():
+            reservations = self.api.get_all_instances(list(pending))
+            for instance in self._get_instances_from_reservations(reservations):
+                if instance.state in self.states[state]:
+                    pending.discard(instance.id)
+            return not pending
+
+        if pending:
+            wait_for(_check_pending, num_sec=num_sec, delay=5, silent_failure=True,
+                message="%d EC2 instances to be %s" % (len(pending), state))
+        return {
+            instance_id: instance_id in resolved_ids and resolved_ids[instance_id] not in pending
+            for instance_id in instance_ids}
+
     def _block_until(self, instance_id, expected, timeout=90):
         """Blocks until the given instance is in one of the expected states
 
@@ -1717,6 +2395,10 @@ class OpenstackSystem(MgmtSystemAPIBase):
     def vm_status(self, vm_name):
         return self._find_instance_by_name(vm_name).status
 
+    def vm_statuses(self, vm_names=None):
+        return self._select_vms(
+            {instance.name: instance.status for instance in self._get_all_instances()}, vm_names)
+
     def create_volume(self, size_gb, **kwargs):
         volume = self.capi.volumes.create(size_gb, **kwargs).id
         wait_for(lambda: self.capi.volumes.get(volume).status == "available", num_sec=60, delay=0.5)
@@ -2136,6 +2818,18 @@ class SCVMMSystem(MgmtSystemAPIBase):
         return etree.parse(StringIO(data)).getroot().xpath(
             "./Object/Property[@Name='StatusString']/text()")[0]
 
+    def vm_statuses(self, vm_names=None):
+        data = self.run_script(
+            "Get-SCVirtualMachine -All -VMMServer $scvmm_server | "
+            "where { $_.MarkedAsTemplate -eq $FALSE } | convertto-xml -as String")
+        statuses = {}
+        for vm in etree.parse(StringIO(data)).getroot().xpath("./Object"):
+            name = vm.xpath("./Property[@Name='Name']/text()")
+            status = vm.xpath("./Property[@Name='StatusString']/text()")
+            if name:
+                statuses[name[0]] = status[0] if status else None
+        return self._select_vms(statuses, vm_names)
+
     def is_vm_running(self, vm_name):
         return self.vm_status(vm_name) == self.STATE_RUNNING
 
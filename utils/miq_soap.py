@@ -2,7 +2,15 @@
 """SOAP wrapper for CFME.
 
 Enables to operate Infrastructure objects. It has better VM provisioning code. OOP encapsulated.
+
+The SOAP objects behind the wrappers are cached for a few seconds in :py:data:`object_cache`, so
+that reading several attributes of an object doesn't fetch it over and over. Objects are
+invalidated by the calls changing them, the ``wait_*`` methods fetch them fresh on every check.
+All SOAP calls are counted in :py:data:`soap_calls`.
 """
+import time
+from collections import Counter
+
 from suds import WebFault
 
 from utils import lazycache
@@ -41,6 +49,107 @@ def set_client(client):
     globals()["client"] = client
 
 
+#: Number of SOAP calls made by this module by SOAP function name, logged and reset after every
+#: test by the ``soap_client`` fixture plugin
+soap_calls = Counter()
+
+
+def call(fname, *args):
+    """Calls a SOAP function and counts the call in :py:data:`soap_calls`
+
+    Args:
+        fname: Name of the SOAP function
+        *args: Arguments of the SOAP function
+    """
+    soap_calls[fname] += 1
+    return getattr(get_client().service, fname)(*args)
+
+
+class ObjectCache(object):
+    """SOAP objects by wrapper class and id
+
+    Args:
+        ttl: Seconds an object is used for after it was fetched
+    """
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._objects = {}
+
+    def get(self, cls, id):
+        """Returns the cached object, or ``None`` if it isn't cached or it expired"""
+        try:
+            fetched, obj = self._objects[cls, id]
+        except KeyError:
+            return None
+        if time.time() - fetched > self.ttl:
+            del self._objects[cls, id]
+            return None
+        return obj
+
+    def put(self, cls, id, obj):
+        self._objects[cls, id] = (time.time(), obj)
+
+    def invalidate(self, cls=None, id=None):
+        """Forgets the object of the class with the id, all the objects of the class if no id is
+        given or everything if no class is given"""
+        if cls is None:
+            self._objects.clear()
+        elif id is not None:
+            self._objects.pop((cls, id), None)
+        else:
+            for key in [key for key in self._objects if key[0] is cls]:
+                del self._objects[key]
+
+    def __len__(self):
+        return len(self._objects)
+
+
+#: The :py:class:`ObjectCache` of :py:attr:`MiqInfraObject.object`
+object_cache = ObjectCache()
+
+
+def related_objects(cls, objects, id_attr):
+    """Wraps related SOAP objects without fetching them again
+
+    The relationship lists of SOAP objects carry whole objects, they are put in the
+    :py:data:`object_cache` so the wrappers don't fetch them one by one.
+
+    Args:
+        cls: Wrapper class of the objects
+        objects: The SOAP objects
+        id_attr: Attribute of the SOAP objects the wrapper is identified by
+    Returns: A list of ``cls`` instances
+    """
+    result = []
+    for obj in objects:
+        wrapper = cls(getattr(obj, id_attr))
+        object_cache.put(cls, wrapper.id, obj)
+        result.append(wrapper)
+    return result
+
+
+def listed_objects(cls, entries, id_attr):
+    """Wraps the entries of the ``GetEmsList`` and ``EVM*List`` calls
+
+    The list calls only carry the names and ids of the objects, so unlike
+    :py:func:`related_objects` the entries aren't cached as the SOAP objects. Their names are
+    kept on the wrappers, so that looking an object up by name doesn't fetch all of them.
+
+    Args:
+        cls: Wrapper class of the objects
+        entries: The list entries
+        id_attr: Attribute of the entries the wrapper is identified by
+    Returns: A list of ``cls`` instances
+    """
+    result = []
+    for entry in entries:
+        wrapper = cls(getattr(entry, id_attr))
+        if getattr(entry, 'name', None) is not None:
+            wrapper.name = str(entry.name)
+        result.append(wrapper)
+    return result
+
+
 class MiqInfraObject(object):
     """Base class for all infrastructure objects.
 
@@ -63,12 +172,18 @@ class MiqInfraObject(object):
     def object(self):
         """Accesses SOAP object
 
-        Accesses network.
-
-        Todo:
-            * cache?
+        Accesses network, unless the object was fetched less than :py:attr:`ObjectCache.ttl`
+        seconds ago.
         """
-        return getattr(get_client().service, self.GETTER_FUNC)(self.id)
+        obj = object_cache.get(type(self), self.id)
+        if obj is None:
+            obj = call(self.GETTER_FUNC, self.id)
+            object_cache.put(type(self), self.id, obj)
+        return obj
+
+    def invalidate(self):
+        """Forgets the cached SOAP object, it's fetched again on the next access"""
+        object_cache.invalidate(type(self), self.id)
 
     @lazycache
     def name(self):
@@ -107,7 +222,7 @@ class MiqInfraObject(object):
             MiqTag(tag.category, tag.category_display_name, tag.tag_name, tag.tag_display_name,
                 tag.tag_path, tag.display_name)
             for tag
-            in getattr(get_client().service, fname)(self.id)
+            in call(fname, self.id)
         ]
 
     def add_tag(self, tag):
@@ -118,11 +233,13 @@ class MiqInfraObject(object):
         """
         fname = "%sSetTag" % self.TAG_PREFIX
         if (isinstance(tag, tuple) or isinstance(tag, list)) and len(tag) == 2:
-            return getattr(get_client().service, fname)(self.id, tag[0], tag[1])
+            category, tag_name = tag
         elif isinstance(tag, MiqTag):
-            return getattr(get_client().service, fname)(self.id, tag.category, tag.tag_name)
+            category, tag_name = tag.category, tag.tag_name
         else:
             raise TypeError("Wrong type passed!")
+        self.invalidate()
+        return call(fname, self.id, category, tag_name)
 
     def __repr__(self):
         return "%s(%s)" % (self.__class__.__name__, repr(self.id))
@@ -142,31 +259,31 @@ class MiqInfraObject(object):
 class HasManyHosts(MiqInfraObject):
     @lazycache
     def hosts(self):
-        return [MiqHost(host.guid) for host in self.object.hosts]
+        return related_objects(MiqHost, self.object.hosts, "guid")
 
 
 class HasManyEMSs(MiqInfraObject):
     @lazycache
     def emss(self):
-        return [MiqEms(ems.guid) for ems in self.object.ext_management_systems]
+        return related_objects(MiqEms, self.object.ext_management_systems, "guid")
 
 
 class HasManyDatastores(MiqInfraObject):
     @lazycache
     def datastores(self):
-        return [MiqDatastore(store.id) for store in self.object.datastores]
+        return related_objects(MiqDatastore, self.object.datastores, "id")
 
 
 class HasManyVMs(MiqInfraObject):
     @property
     def vms(self):
-        return [MiqVM(vm.guid) for vm in self.object.vms]
+        return related_objects(MiqVM, self.object.vms, "guid")
 
 
 class HasManyResourcePools(MiqInfraObject):
     @lazycache
     def resource_pools(self):
-        return [MiqResourcePool(rpool.id) for rpool in self.object.resource_pools]
+        return related_objects(MiqResourcePool, self.object.resource_pools, "id")
 
 
 class BelongsToProvider(MiqInfraObject):
@@ -199,19 +316,19 @@ class MiqEms(HasManyDatastores, HasManyHosts, HasManyVMs, HasManyResourcePools):
 
     @lazycache
     def clusters(self):
-        return [MiqCluster(cluster.id) for cluster in self.object.clusters]
+        return related_objects(MiqCluster, self.object.clusters, "id")
 
     @classmethod
     def find_by_name(cls, name):
-        for ems in get_client().service.GetEmsList():
+        for ems in listed_objects(cls, call("GetEmsList"), "guid"):
             if ems.name.strip().lower() == name.strip().lower():
-                return cls(ems.guid)
+                return ems
         else:
             raise Exception("EMS with name %s not found!" % name)
 
     @classmethod
     def all(cls):
-        return [cls(ems.guid) for ems in get_client().service.GetEmsList()]
+        return listed_objects(cls, call("GetEmsList"), "guid")
 
     @lazycache
     def direct_connection(self):
@@ -283,27 +400,33 @@ class MiqVM(HasManyDatastores, BelongsToCluster):
         return self.object.power_state.strip().lower() == "suspended"
 
     def power_on(self):
-        return get_client().service.EVMSmartStart(self.id).result == "true"
+        self.invalidate()
+        return call("EVMSmartStart", self.id).result == "true"
 
     def wait_powered_on(self, wait_time=120):
         return wait_for(
-            lambda: self.is_powered_on, num_sec=wait_time, message="wait for power on", delay=5
+            lambda: self.is_powered_on, num_sec=wait_time, message="wait for power on", delay=5,
+            fail_func=self.invalidate
         )
 
     def power_off(self):
-        return get_client().service.EVMSmartStop(self.id).result == "true"
+        self.invalidate()
+        return call("EVMSmartStop", self.id).result == "true"
 
     def wait_powered_off(self, wait_time=120):
         return wait_for(
-            lambda: self.is_powered_off, num_sec=wait_time, message="wait for power off", delay=5
+            lambda: self.is_powered_off, num_sec=wait_time, message="wait for power off", delay=5,
+            fail_func=self.invalidate
         )
 
     def suspend(self):
-        return get_client().service.EVMSmartSuspend(self.id).result == "true"
+        self.invalidate()
+        return call("EVMSmartSuspend", self.id).result == "true"
 
     def wait_suspended(self, wait_time=160):
         return wait_for(
-            lambda: self.is_suspended, num_sec=wait_time, message="wait for suspend", delay=5
+            lambda: self.is_suspended, num_sec=wait_time, message="wait for suspend", delay=5,
+            fail_func=self.invalidate
         )
 
     def delete(self):
@@ -313,9 +436,11 @@ class MiqVM(HasManyDatastores, BelongsToCluster):
             if not self.power_off():
                 raise Exception("Could not power off vm %s" % name)
             self.wait_powered_off()
-        if not get_client().service.EVMDeleteVmByName(self.name):
+        self.invalidate()
+        if not call("EVMDeleteVmByName", self.name):
             raise Exception("Could not delete vm %s" % name)
-        wait_for(lambda: not self.exists, num_sec=60, delay=4, message="wait for VM removed")
+        wait_for(lambda: not self.exists, num_sec=60, delay=4, message="wait for VM removed",
+            fail_func=self.invalidate)
 
     @classmethod
     def provision_from_template(cls, template_name, vm_name, wait_min=None, cpus=1, memory=1024,
@@ -390,8 +515,8 @@ class MiqVM(HasManyDatastores, BelongsToCluster):
             owner_email=email
         ))
         try:
-            req_id = get_client().service.VmProvisionRequest(
-                "1.1", template_fields, vm_fields, requester, "", ""
+            req_id = call(
+                "VmProvisionRequest", "1.1", template_fields, vm_fields, requester, "", ""
             ).id
         except WebFault as e:
             if "'Network/vLan' is required" in e.message:
@@ -400,14 +525,14 @@ class MiqVM(HasManyDatastores, BelongsToCluster):
                 raise
         logger.info("Waiting for VM provisioning request approval")
         wait_for(
-            lambda: get_client().service.GetVmProvisionRequest(req_id).approval_state == "approved",
+            lambda: call("GetVmProvisionRequest", req_id).approval_state == "approved",
             num_sec=180,
             delay=5,
             message="VM provision approval"
         )
 
         def check_whether_provisioning_finished():
-            request = get_client().service.GetVmProvisionRequest(req_id)
+            request = call("GetVmProvisionRequest", req_id)
             if request.status.lower().strip() == "error":
                 raise Exception(request.message)    # change the exception class here
             return request.status.lower().strip() == "ok" and len(request.vms) > 0
@@ -417,8 +542,8 @@ class MiqVM(HasManyDatastores, BelongsToCluster):
             check_whether_provisioning_finished,
             num_sec=(wait_min * 60 if wait_min else 300), delay=5, message="provisioning"
         )
-        vm_guid = get_client().service.GetVmProvisionRequest(req_id).vms[0].guid
-        new_vm = MiqVM(get_client().service.FindVmByGuid(vm_guid).guid)
+        vm_guid = call("GetVmProvisionRequest", req_id).vms[0].guid
+        new_vm = MiqVM(vm_guid)
         # some basic sanity checks though they should always pass
         assert new_vm.name == vm_name
         assert new_vm.object.guid == vm_guid
@@ -432,7 +557,7 @@ class MiqHost(HasManyDatastores, HasManyVMs, HasManyResourcePools, BelongsToClus
 
     @classmethod
     def all(cls):
-        return [cls(host.guid) for host in get_client().service.EVMHostList()]
+        return listed_objects(cls, call("EVMHostList"), "guid")
 
 
 class MiqDatastore(HasManyHosts, HasManyEMSs):
@@ -441,7 +566,7 @@ class MiqDatastore(HasManyHosts, HasManyEMSs):
 
     @classmethod
     def all(cls):
-        return [cls(datastore.id) for datastore in get_client().service.EVMDatastoreList()]
+        return listed_objects(cls, call("EVMDatastoreList"), "id")
 
 
 class MiqCluster(
@@ -455,7 +580,7 @@ class MiqCluster(
 
     @classmethod
     def all(cls):
-        return [cls(cluster.id) for cluster in get_client().service.EVMClusterList()]
+        return listed_objects(cls, call("EVMClusterList"), "id")
 
 
 class MiqResourcePool(HasManyHosts, HasManyEMSs):
@@ -468,7 +593,7 @@ class MiqResourcePool(HasManyHosts, HasManyEMSs):
 
     @classmethod
     def all(cls):
-        return [cls(rpool.id) for rpool in get_client().service.EVMResourcePoolList()]
+        return listed_objects(cls, call("EVMResourcePoolList"), "id")
 
 
 class MiqTag(object):
@@ -16,8 +16,11 @@ from utils.path import log_path
 from utils.ssh import SSHTail
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import UnexpectedAlertPresentException
+from array import array
+from collections import OrderedDict
 from time import time
 import csv
+import json
 import numpy
 import re
 
@@ -233,7 +236,8 @@ def standup_perf_ui(ssh_client, soft_assert):
     prod_tail.set_initial_file_end()
 
     ensure_browser_open()
-    pages = analyze_page_stat(perf_click(ui_worker_pid, prod_tail, False, login_admin), soft_assert)
+    pages = PageStatStore(analyze_page_stat(perf_click(ui_worker_pid, prod_tail, False,
+        login_admin), soft_assert))
 
     return pages, ui_worker_pid, prod_tail
 
@@ -249,44 +253,16 @@ def pages_to_csv(pages, file_name):
 
 
 def pages_to_statistics_csv(pages, filters, report_file_name):
-    all_statistics = []
-    for page in pages:
-        # Determine if the page matches a pattern and swap request to pattern
-        for p_filter in filters:
-            results = p_filter.search(page.request.strip())
-            if results:
-                page.request = p_filter.pattern
-                break
-        added = False
-
-        if len(all_statistics) > 0:
-            for pg_statistics in all_statistics:
-                if pg_statistics.request == page.request:
-                    if page.transactiontime > 0:
-                        pg_statistics.transactiontimes.append(int(page.transactiontime))
-                    pg_statistics.completedintimes.append(float(page.completedintime))
-                    if page.viewstime > 0:
-                        pg_statistics.viewstimes.append(float(page.viewstime))
-                    pg_statistics.activerecordtimes.append(float(page.activerecordtime))
-                    pg_statistics.selectcounts.append(int(page.selectcount))
-                    pg_statistics.cachedcounts.append(int(page.cachedcount))
-                    pg_statistics.uncachedcounts.append(int(page.uncachedcount))
-                    added = True
-                    break
+    """Appends the statistics of the pages by request to a CSV report
 
-        if not added:
-            pg_statistics = PageStatLists()
-            pg_statistics.request = page.request
-            if page.transactiontime > 0:
-                pg_statistics.transactiontimes.append(int(page.transactiontime))
-            pg_statistics.completedintimes.append(float(page.completedintime))
-            if page.viewstime > 0:
-                pg_statistics.viewstimes.append(float(page.viewstime))
-            pg_statistics.activerecordtimes.append(float(page.activerecordtime))
-            pg_statistics.selectcounts.append(int(page.selectcount))
-            pg_statistics.cachedcounts.append(int(page.cachedcount))
-            pg_statistics.uncachedcounts.append(int(page.uncachedcount))
-            all_statistics.append(pg_statistics)
+    Args:
+        pages: A :py:class:`PageStatStore` or an iterable of :py:class:`PageStat` records
+        filters: Compiled regular expressions, matching requests are aggregated under the pattern
+        report_file_name: Name of the report in the csv_output log directory
+    """
+    if not isinstance(pages, PageStatStore):
+        pages = PageStatStore(pages)
+    all_statistics = list(pages.grouped_columns(filters))
 
     csvdata_path = log_path.join('csv_output', report_file_name)
     if csvdata_path.isfile():
@@ -304,22 +280,17 @@ def pages_to_statistics_csv(pages, filters, report_file_name):
             ',uc_count_samples,uc_count_min,uc_count_max,uc_count_avg,uc_count_std,uc_count_90\n')
 
     # Contents of CSV
-    for page_statistics in all_statistics:
-        if len(page_statistics.completedintimes) > 1:
+    for request, values in all_statistics:
+        completedintimes = values['completedintime']
+        if len(completedintimes) > 1:
             logger.debug('Samples/Avg/90th/Std: {} : {} : {} : {} Pattern: {}'.format(
-                str(len(page_statistics.completedintimes)).rjust(7),
-                str(round(numpy.average(page_statistics.completedintimes), 2)).rjust(7),
-                str(round(numpy.percentile(page_statistics.completedintimes, 90), 2)).rjust(7),
-                str(round(numpy.std(page_statistics.completedintimes), 2)).rjust(7),
-                page_statistics.request))
-        stats = '{},{},{},{},{},{},{},{}\n'.format(page_statistics.request,
-            generate_statistics(numpy.array(page_statistics.transactiontimes)),
-            generate_statistics(numpy.array(page_statistics.completedintimes)),
-            generate_statistics(numpy.array(page_statistics.viewstimes)),
-            generate_statistics(numpy.array(page_statistics.activerecordtimes)),
-            generate_statistics(numpy.array(page_statistics.selectcounts)),
-            generate_statistics(numpy.array(page_statistics.cachedcounts)),
-            generate_statistics(numpy.array(page_statistics.uncachedcounts)))
+                str(len(completedintimes)).rjust(7),
+                str(round(numpy.average(completedintimes), 2)).rjust(7),
+                str(round(numpy.percentile(completedintimes, 90), 2)).rjust(7),
+                str(round(numpy.std(completedintimes), 2)).rjust(7),
+                request))
+        stats = '{},{}\n'.format(request, ','.join(generate_statistics(values[metric])
+            for metric in PageStatStore.metrics))
         outputfile.write(stats)
     outputfile.close()
 
@@ -333,12 +304,101 @@ def perf_bench_read_tree(tree):
     return tree_contents, transactiontime
 
 
-def perf_click(uiworker_pid, tailer, measure_t_time, clickable, *args):
-    # Regular Expressions to find the ruby production completed time and select query time
+class ProductionLogParser(object):
+    """Parses the lines of production.log logged by UI workers into :py:class:`PageStat` records
+
+    Lines of other processes are dropped first, by a substring test for a single worker or a
+    precompiled pattern matching any of the PIDs for several workers (on CPython 2 a substring
+    test is several times faster than a regular expression). The remaining lines are matched
+    against precompiled patterns only when they can contain what the pattern looks for.
+
+    Args:
+        worker_pids: PIDs of the UI workers
+        query_time: Queries taking longer (in ms) are kept in :py:attr:`PageStat.slowselects`
+            (default from ``ui_bench_tests``)
+    """
     status_re = re.compile(r'Completed\s([0-9]*\s[a-zA-Z]*)\sin\s([0-9\.]*)ms')
     select_query_time_re = re.compile(r'\s\(([0-9\.]*)ms\)')
-    worker_pid = '#' + uiworker_pid
+    started_re = re.compile(r'INFO -- : Started (.*?)for ')
+    views_re = re.compile(r'Views: ([0-9\.]*)ms')
+    activerecord_re = re.compile(r'ActiveRecord: ([0-9\.]*)ms')
+
+    def __init__(self, worker_pids, query_time=None):
+        if isinstance(worker_pids, basestring):
+            worker_pids = [worker_pids]
+        worker_pids = [str(pid).strip() for pid in worker_pids]
+        # Log lines start with e.g. "I, [2015-01-14T10:26:21.849296 #2391:11ef8c4]", the PID is
+        # behind the first '#' and followed by the thread id
+        self.worker_needle = '#{}:'.format(worker_pids[0]) if len(worker_pids) == 1 else None
+        self.worker_re = re.compile(r'[^#]*#(?:{}):'.format(
+            '|'.join(re.escape(pid) for pid in worker_pids)))
+        if query_time is None:
+            query_time = ui_bench_tests['threshold']['query_time']
+        self.query_time = query_time
+        #: Number of lines parsed so far
+        self.line_count = 0
+
+    def parse(self, lines):
+        """Yields a :py:class:`PageStat` for every completed request in the lines
+
+        Args:
+            lines: Iterable of log lines, e.g. a :py:class:`utils.ssh.SSHTail`
+        """
+        worker_needle = self.worker_needle
+        worker_match = self.worker_re.match
+        select_query_time_search = self.select_query_time_re.search
+        query_time = self.query_time
+        pgstat = PageStat()
+        line_count = self.line_count
+        try:
+            for line in lines:
+                line_count += 1
+                if worker_needle is not None:
+                    if worker_needle not in line:
+                        continue
+                elif worker_match(line) is None:
+                    continue
+                if 'SELECT' in line:
+                    pgstat.selectcount += 1
+                    selecttime = select_query_time_search(line)
+                    if selecttime and float(selecttime.group(1)) > query_time:
+                        pgstat.slowselects.append(line)
+                    if 'CACHE' in line:
+                        pgstat.cachedcount += 1
+                elif 'INFO -- : Started' in line:
+                    started = self.started_re.search(line)
+                    if started:
+                        pgstat.request = started.group(1)
+                elif 'INFO -- : Completed' in line:
+                    status_result = self.status_re.search(line)
+                    if status_result:
+                        pgstat.status = status_result.group(1)
+                        pgstat.completedintime = float(status_result.group(2))
+                    pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
+                    # Redirects don't always have a view timing
+                    views = self.views_re.search(line)
+                    if views:
+                        pgstat.viewstime = float(views.group(1))
+                    activerecord = self.activerecord_re.search(line)
+                    if activerecord:
+                        pgstat.activerecordtime = float(activerecord.group(1))
+                    self.line_count = line_count
+                    yield pgstat
+                    pgstat = PageStat()
+        finally:
+            self.line_count = line_count
 
+
+def perf_click(uiworker_pid, tailer, measure_t_time, clickable, *args):
+    """Clicks and collects the :py:class:`PageStat` records logged in production.log meanwhile
+
+    Args:
+        uiworker_pid: PID of the UI worker, or several whitespace separated PIDs
+        tailer: :py:class:`utils.ssh.SSHTail` of production.log
+        measure_t_time: Whether to set the transaction time of the last page
+        clickable: Function doing the click, or ``None`` to only collect the records
+        *args: Arguments of ``clickable``
+    """
     # Time the UI transaction from "click"
     transactiontime = 0
     if clickable:
@@ -346,53 +406,14 @@ def perf_click(uiworker_pid, tailer, measure_t_time, clickable, *args):
         clickable(*args)
         transactiontime = int((time() - starttime) * 1000)
 
-    pgstats = []
-    pgstat = PageStat()
-    line_count = 0
+    parser = ProductionLogParser(str(uiworker_pid).split())
     starttime = time()
-
-    for line in tailer:
-        line_count += 1
-        if worker_pid in line:
-            if 'SELECT' in line:
-                pgstat.selectcount += 1
-                selecttime = select_query_time_re.search(line)
-                if selecttime:
-                    if float(selecttime.group(1)) > ui_bench_tests['threshold']['query_time']:
-                        pgstat.slowselects.append(line)
-            if 'CACHE' in line:
-                pgstat.cachedcount += 1
-            if 'INFO -- : Started' in line:
-                # Obtain method and requested page
-                started_idx = line.index('Started') + 8
-                pgstat.request = line[started_idx:line.index('for', 72)]
-            if 'INFO -- : Completed' in line:
-                # Obtain status code and total render time
-                status_result = status_re.search(line)
-                if status_result:
-                    pgstat.status = status_result.group(1)
-                    pgstat.completedintime = float(status_result.group(2))
-
-                pgstat.uncachedcount = pgstat.selectcount - pgstat.cachedcount
-
-                # Redirects don't always have a view timing
-                try:
-                    vanchor = line.index('Views') + 7
-                    pgstat.viewstime = line[vanchor:line.index('ms', vanchor)]
-                except:
-                    pass
-                try:
-                    aranchor = line.index('ActiveRecord') + 14
-                    pgstat.activerecordtime = line[aranchor:line.index('ms', aranchor)]
-                except:
-                    pass
-                pgstats.append(pgstat)
-                pgstat = PageStat()
+    pgstats = list(parser.parse(tailer))
     if pgstats:
         if measure_t_time:
             pgstats[-1].transactiontime = transactiontime
     timediff = time() - starttime
-    logger.debug('Parsed ({}) lines in {}'.format(line_count, timediff))
+    logger.debug('Parsed ({}) lines in {}'.format(parser.line_count, timediff))
     return pgstats
 
 
@@ -401,11 +422,13 @@ def perf_click(uiworker_pid, tailer, measure_t_time, clickable, *args):
 
 
 class PageStat(object):
+    __slots__ = ('request', 'status', 'transactiontime', 'completedintime', 'viewstime',
+        'activerecordtime', 'selectcount', 'cachedcount', 'uncachedcount', 'slowselects')
+    headers = ['request', 'status', 'transactiontime', 'completedintime', 'viewstime',
+        'activerecordtime', 'selectcount', 'cachedcount', 'uncachedcount']
 
     def __init__(self, request='', status='', transactiontime=0, completedintime=0, viewstime=0,
             activerecordtime=0, selectcount=0, cachedcount=0, uncachedcount=0):
-        self.headers = ['request', 'status', 'transactiontime', 'completedintime', 'viewstime',
-            'activerecordtime', 'selectcount', 'cachedcount', 'uncachedcount']
         self.request = request
         self.status = status
         self.transactiontime = transactiontime
@@ -430,14 +453,171 @@ class PageStat(object):
             ', Status: ' + self.status
 
 
-class PageStatLists(object):
+class PageStatStore(object):
+    """Columnar storage of :py:class:`PageStat` measurements
+
+    Every measurement is kept in a typed array per column and request and status strings are
+    interned, so a page costs a few dozen bytes instead of a :py:class:`PageStat` object. Slow
+    query lines aren't kept, :py:func:`analyze_page_stat` logs them before the pages are stored.
+
+    The store can be used like the list of pages it replaces: it has ``append`` and ``extend``
+    and iterating over it yields :py:class:`PageStat` records.
+
+    Args:
+        pages: :py:class:`PageStat` records to start with
+    """
+    int_columns = ('transactiontime', 'selectcount', 'cachedcount', 'uncachedcount')
+    float_columns = ('completedintime', 'viewstime', 'activerecordtime')
+    #: Columns in :py:meth:`statistics` order
+    metrics = ('transactiontime', 'completedintime', 'viewstime', 'activerecordtime',
+        'selectcount', 'cachedcount', 'uncachedcount')
+    #: Not every page has these, their zero values are left out of the statistics
+    nonzero_metrics = ('transactiontime', 'viewstime')
+    percentiles = (50, 90, 99)
+
+    def __init__(self, pages=()):
+        self.requests = []
+        self.statuses = []
+        self._interned = ({}, {})
+        self.request_ids = array('l')
+        self.status_ids = array('l')
+        self.columns = {name: array('l') for name in self.int_columns}
+        self.columns.update((name, array('d')) for name in self.float_columns)
+        self.extend(pages)
+
+    def _intern(self, strings, ids, value):
+        try:
+            return ids[value]
+        except KeyError:
+            ids[value] = len(strings)
+            strings.append(value)
+            return ids[value]
+
+    def append(self, page):
+        self.request_ids.append(self._intern(self.requests, self._interned[0], page.request))
+        self.status_ids.append(self._intern(self.statuses, self._interned[1], page.status))
+        for name in self.int_columns:
+            self.columns[name].append(int(getattr(page, name)))
+        for name in self.float_columns:
+            self.columns[name].append(float(getattr(page, name)))
+
+    def extend(self, pages):
+        for page in pages:
+            self.append(page)
+
+    def __len__(self):
+        return len(self.request_ids)
 
-    def __init__(self):
-        self.request = ''
-        self.transactiontimes = []
-        self.completedintimes = []
-        self.viewstimes = []
-        self.activerecordtimes = []
-        self.selectcounts = []
-        self.cachedcounts = []
-        self.uncachedcounts = []
+    def __iter__(self):
+        for index in xrange(len(self)):
+            page = PageStat(self.requests[self.request_ids[index]],
+                self.statuses[self.status_ids[index]])
+            for name, column in self.columns.iteritems():
+                setattr(page, name, column[index])
+            yield page
+
+    def column(self, name):
+        """A column as a numpy array"""
+        if name == 'request':
+            values = self.request_ids
+        else:
+            values = self.columns[name]
+        dtype = numpy.float64 if values.typecode == 'd' else numpy.int_
+        if not values:
+            return numpy.array([], dtype=dtype)
+        # Copied at C speed; a view of the array would dangle once the array grows
+        return numpy.frombuffer(values.tostring(), dtype=dtype)
+
+    def groups(self, filters=()):
+        """Group names and the group of every page
+
+        Pages are grouped by request, requests matching one of the ``filters`` (compiled regular
+        expressions) are grouped under its pattern. Groups are in order of their first page.
+
+        Returns: A list of group names and a numpy array of group indexes
+        """
+        names = []
+        name_ids = {}
+        request_groups = array('l')
+        for request in self.requests:
+            for p_filter in filters:
+                if p_filter.search(request.strip()):
+                    request = p_filter.pattern
+                    break
+            request_groups.append(self._intern(names, name_ids, request))
+        if not self.requests:
+            return names, numpy.array([], dtype=numpy.int_)
+        return names, numpy.frombuffer(request_groups.tostring(),
+            dtype=numpy.int_)[self.column('request')]
+
+    def grouped_columns(self, filters=()):
+        """Yields every group name with a dict of its values by column name, see :py:meth:`groups`
+        """
+        names, page_groups = self.groups(filters)
+        if not len(page_groups):
+            return
+        # A stable sort keeps the pages of each group in order
+        order = numpy.argsort(page_groups, kind='mergesort')
+        sorted_groups = page_groups[order]
+        bounds = numpy.flatnonzero(numpy.diff(sorted_groups)) + 1
+        split_columns = {name: numpy.split(self.column(name)[order], bounds)
+            for name in self.metrics}
+        first_pages = numpy.concatenate(([0], bounds))
+        for split_index in numpy.argsort(order[first_pages]):
+            values = {}
+            for name, splits in split_columns.iteritems():
+                values[name] = splits[split_index]
+                if name in self.nonzero_metrics:
+                    values[name] = values[name][values[name] > 0]
+            yield names[sorted_groups[first_pages[split_index]]], values
+
+    def statistics(self, filters=()):
+        """Samples, min, max, average, standard deviation and percentiles of every column by group
+
+        Args:
+            filters: See :py:meth:`groups`
+
+        Returns: An OrderedDict of group name: {column name: {statistic name: value}}, statistics
+            of a column without samples are ``None``
+        """
+        result = OrderedDict()
+        for name, values in self.grouped_columns(filters):
+            group_stats = OrderedDict()
+            for metric in self.metrics:
+                samples = values[metric]
+                if not len(samples):
+                    group_stats[metric] = None
+                    continue
+                metric_stats = OrderedDict([
+                    ('samples', len(samples)),
+                    ('min', samples.min().item()),
+                    ('max', samples.max().item()),
+                    ('avg', round(samples.mean(), 2)),
+                    ('std', round(samples.std(), 2))])
+                for percentile, value in zip(
+                        self.percentiles, numpy.percentile(samples, self.percentiles)):
+                    metric_stats['p{}'.format(percentile)] = round(value, 2)
+                group_stats[metric] = metric_stats
+            result[name] = group_stats
+        return result
+
+    def write_summary_csv(self, file_name, filters=()):
+        """Writes the samples, percentiles and max of every column by group to csv_output"""
+        stat_names = ['samples'] + ['p{}'.format(p) for p in self.percentiles] + ['max']
+        outputfile = log_path.join('csv_output', file_name).open('w', ensure=True)
+        with outputfile:
+            csvwriter = csv.writer(outputfile)
+            csvwriter.writerow(['request'] + ['{}_{}'.format(metric, stat)
+                for metric in self.metrics for stat in stat_names])
+            for name, group_stats in self.statistics(filters).iteritems():
+                row = [name]
+                for metric in self.metrics:
+                    metric_stats = group_stats[metric] or {'samples': 0}
+                    row.extend(metric_stats.get(stat, 0) for stat in stat_names)
+                csvwriter.writerow(row)
+
+    def write_summary_json(self, file_name, filters=()):
+        """Writes :py:meth:`statistics` to csv_output as JSON, e.g. to compare runs"""
+        outputfile = log_path.join('csv_output', file_name).open('w', ensure=True)
+        with outputfile:
+            json.dump(self.statistics(filters), outputfile, indent=2)
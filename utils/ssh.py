@@ -1,31 +1,206 @@
 # coding: utf-8 -*-
+import os
 import re
+import select
+import socket
 import sys
-from collections import namedtuple
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from multiprocessing.pool import ThreadPool
 from urlparse import urlparse
 
 import paramiko
 from scp import SCPClient
 
-from utils import conf
+from utils import at_exit, conf, diaper
 from utils.log import logger
 from utils.net import net_check
 from fixtures.pytest_store import store
 from utils.timeutil import parsetime
+from utils.wait import TimedOutError
 
 
 SSHResult = namedtuple("SSHResult", ["rc", "output"])
 
+# Errors raised by paramiko when a (pooled) transport has gone away underneath us
+_dead_transport_errors = (paramiko.SSHException, EOFError, socket.error)
+
+
+class SSHTransportPool(object):
+    """Keyed pool of authenticated SSH connections
+
+    One connected :py:class:`paramiko.SSHClient` is kept per ``(hostname, username, port)``
+    key. :py:class:`SSHClient` instances borrow its transport and open a fresh channel for every
+    command, so the TCP handshake and authentication are only paid once per host.
+
+    Connections are health-checked on checkout, closed after ``idle_timeout`` seconds without
+    users, and the least recently used idle connection is closed when there are more than
+    ``max_size`` of them. Connections that are checked out are never closed by the pool.
+
+    Args:
+        max_size: Maximum number of pooled connections.
+        idle_timeout: Seconds an unused connection is kept open.
+    """
+    def __init__(self, max_size=16, idle_timeout=300):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._key_locks = defaultdict(threading.Lock)
+        # key -> {'client': paramiko.SSHClient, 'transport': paramiko.Transport, 'users': int,
+        #         'last_used': float}
+        self._connections = OrderedDict()
+        self._pid = os.getpid()
+
+    def __repr__(self):
+        return "<SSHTransportPool connections={}>".format(len(self._connections))
+
+    @staticmethod
+    def key(connect_kwargs):
+        return (
+            connect_kwargs['hostname'],
+            connect_kwargs.get('username'),
+            int(connect_kwargs.get('port', 22)))
+
+    def checkout(self, connect_kwargs):
+        """Get a live transport for the passed connect kwargs, connecting if needed
+
+        Returns: A tuple of the pool key and the :py:class:`paramiko.Transport`. The key has to
+            be handed back with :py:meth:`checkin` once the transport is no longer used.
+        """
+        key = self.key(connect_kwargs)
+        self._check_pid()
+        self.reap()
+        with self._lock:
+            key_lock = self._key_locks[key]
+        with key_lock:
+            with self._lock:
+                entry = self._connections.get(key)
+            if entry is not None and not self._is_healthy(entry['client']):
+                logger.debug("Discarding dead pooled SSH connection to {}".format(key[0]))
+                self.discard(key)
+                entry = None
+            if entry is None:
+                client = self._connect(connect_kwargs)
+                entry = {
+                    'client': client, 'transport': client.get_transport(), 'users': 0,
+                    'last_used': None}
+            with self._lock:
+                # Move the key to the end to keep the LRU order
+                self._connections.pop(key, None)
+                self._connections[key] = entry
+                entry['users'] += 1
+                entry['last_used'] = time.time()
+        self._trim()
+        return key, entry['transport']
+
+    def checkin(self, key, transport=None):
+        """Hand a transport obtained by :py:meth:`checkout` back to the pool
+
+        If the transport is passed and the connection for the key was replaced since it was
+        checked out, there's nothing to hand back; the new connection's users are left alone.
+        """
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is not None and transport in (None, entry['transport']):
+                entry['users'] = max(entry['users'] - 1, 0)
+                entry['last_used'] = time.time()
+
+    def discard(self, key, transport=None):
+        """Remove and close the connection for the key, e.g. when it is known to be dead
+
+        If the transport is passed, the connection is only removed if it still is the one
+        of that transport.
+        """
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is None or transport not in (None, entry['transport']):
+                return
+            del self._connections[key]
+        diaper(entry['client'].close)
+
+    def reap(self):
+        """Close connections that were not used for longer than the idle timeout"""
+        now = time.time()
+        with self._lock:
+            stale = [
+                key for key, entry in self._connections.iteritems()
+                if not entry['users'] and now - entry['last_used'] > self.idle_timeout]
+        for key in stale:
+            self.discard(key)
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            keys = self._connections.keys()
+        for key in keys:
+            self.discard(key)
+
+    def _trim(self):
+        with self._lock:
+            idle = [key for key, entry in self._connections.iteritems() if not entry['users']]
+            excess = len(self._connections) - self.max_size
+        for key in idle[:max(excess, 0)]:
+            self.discard(key)
+
+    def _check_pid(self):
+        # Transports are threads of the process that created them, a forked child can't use them
+        if os.getpid() != self._pid:
+            with self._lock:
+                self._connections.clear()
+                self._key_locks.clear()
+                self._pid = os.getpid()
+
+    @staticmethod
+    def _is_healthy(client):
+        transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except _dead_transport_errors:
+            return False
+        return True
+
+    @staticmethod
+    def _connect(connect_kwargs):
+        connect_kwargs = dict(connect_kwargs)
+        hostname = connect_kwargs.pop('hostname')
+        port = int(connect_kwargs.get('port', 22))
+        if not net_check(port, hostname):
+            raise Exception("Connection to %s is not available as port %d is unavailable"
+                            % (hostname, port))
+        logger.debug("Opening pooled SSH connection to {}".format(hostname))
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(hostname, **connect_kwargs)
+        return client
+
+
+#: Process-wide pool used by all pooled :py:class:`SSHClient` instances
+ssh_pool = SSHTransportPool()
+at_exit(ssh_pool.close_all)
+
 
 class SSHClient(paramiko.SSHClient):
     """paramiko.SSHClient wrapper
 
     Allows copying/overriding and use as a context manager
     Constructor kwargs are handed directly to paramiko.SSHClient.connect()
+
+    By default the connection is borrowed from :py:data:`ssh_pool`, so entering the context
+    manager or running commands does not reconnect to a host that was already used. Pass
+    ``pooled=False`` to get a private connection that is closed when the context exits.
     """
-    def __init__(self, stream_output=False, **connect_kwargs):
+    #: Default amount of output bytes kept by :py:meth:`run_command`
+    max_output = 16 * 1024 * 1024
+
+    def __init__(self, stream_output=False, pooled=True, **connect_kwargs):
         super(SSHClient, self).__init__()
         self._streaming = stream_output
+        self._pooled = pooled
+        self._pool_key = None
+        self._checkouts = 0
 
         # Set up some sane defaults
         default_connect_kwargs = dict()
@@ -38,11 +213,11 @@ class SSHClient(paramiko.SSHClient):
 
         # Load credentials and destination from confs
         parsed_url = urlparse(store.base_url)
-        default_connect_kwargs = {
+        default_connect_kwargs.update({
             'username': conf.credentials['ssh']['username'],
             'password': conf.credentials['ssh']['password'],
             'hostname': parsed_url.hostname,
-        }
+        })
 
         # Overlay defaults with any passed-in kwargs and store
         default_connect_kwargs.update(connect_kwargs)
@@ -57,7 +232,7 @@ class SSHClient(paramiko.SSHClient):
         # then return a new instance with the updated kwargs
         new_connect_kwargs = dict(self._connect_kwargs)
         new_connect_kwargs.update(connect_kwargs)
-        new_client = SSHClient(**new_connect_kwargs)
+        new_client = SSHClient(pooled=self._pooled, **new_connect_kwargs)
         return new_client
 
     def __enter__(self):
@@ -68,44 +243,95 @@ class SSHClient(paramiko.SSHClient):
         self.close()
 
     def connect(self, hostname, *args, **kwargs):
-        """See paramiko.SSHClient.connect"""
-        port = int(kwargs.get('port', 22))
-        if not net_check(port, hostname):
-            raise Exception("Connection to %s is not available as port %d is unavailable"
-                            % (hostname, port))
-        super(SSHClient, self).connect(hostname, *args, **kwargs)
-
-    def run_command(self, command):
+        """See paramiko.SSHClient.connect
+
+        Pooled clients check a transport out of :py:data:`ssh_pool` instead of connecting.
+        Nested connects reuse the transport that is already checked out.
+        """
+        if not self._pooled:
+            port = int(kwargs.get('port', 22))
+            if not net_check(port, hostname):
+                raise Exception("Connection to %s is not available as port %d is unavailable"
+                                % (hostname, port))
+            super(SSHClient, self).connect(hostname, *args, **kwargs)
+            return
+        if self._transport is None:
+            kwargs['hostname'] = hostname
+            self._pool_key, self._transport = ssh_pool.checkout(kwargs)
+        self._checkouts += 1
+
+    def close(self):
+        """See paramiko.SSHClient.close
+
+        Pooled clients only hand their transport back to :py:data:`ssh_pool`.
+        """
+        if not self._pooled:
+            super(SSHClient, self).close()
+            return
+        self._checkouts = max(self._checkouts - 1, 0)
+        if not self._checkouts and self._transport is not None:
+            ssh_pool.checkin(self._pool_key, self._transport)
+            self._transport = None
+            self._pool_key = None
+
+    def _open_session(self):
+        """Open a new channel, reconnecting once if the pooled transport turned out to be dead"""
+        try:
+            return self.get_transport().open_session()
+        except _dead_transport_errors:
+            if not self._pooled:
+                raise
+            logger.debug("Pooled SSH transport to {} is dead, reconnecting".format(
+                self._pool_key[0]))
+            # Other clients may still hold the dead connection, they check it in and reconnect
+            # on their own; only the connection is thrown away, not whatever replaced it
+            ssh_pool.discard(self._pool_key, self._transport)
+            self._pool_key, self._transport = ssh_pool.checkout(self._connect_kwargs)
+            return self._transport.open_session()
+
+    def run_command(self, command, timeout=None, max_output=None):
+        """Runs a command and collects its output
+
+        stdout and stderr are merged in the order they are received. Only the last
+        ``max_output`` bytes of the output are kept (:py:attr:`max_output` by default).
+
+        Args:
+            command: Command to run in the remote shell.
+            timeout: Seconds to wait for the command to finish, ``None`` waits forever.
+            max_output: Maximum number of output bytes kept in memory.
+
+        Returns: :py:class:`SSHResult` of the exit status and output
+
+        Raises:
+            :py:class:`utils.wait.TimedOutError` if the command did not finish in time.
+        """
+        stream = self.iter_command(command, timeout=timeout)
+        output = _OutputBuffer(max_output or self.max_output)
+        for is_stderr, data in stream.chunks():
+            output.write(data)
+        if output.truncated:
+            logger.warning("Output of `{}` exceeded {} bytes, only its end was kept".format(
+                command, output.max_size))
+        return SSHResult(stream.rc, output.getvalue())
+
+    def iter_command(self, command, timeout=None):
+        """Runs a command and yields its output lines as they arrive
+
+        Usage:
+
+            stream = ssh_client.iter_command('yum update -y')
+            for line in stream:
+                print line
+            print stream.rc
+
+        Args:
+            command: Command to run in the remote shell.
+            timeout: Seconds to wait for the command to finish, ``None`` waits forever.
+
+        Returns: :py:class:`SSHCommandStream`, the exit status is in its ``rc`` once iterated.
+        """
         logger.info("Running command `{}`".format(command))
-        template = '%s\n'
-        command = template % command
-        with self as context:
-            transport = context.get_transport()
-            session = transport.open_session()
-            session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-            output = ''
-            while True:
-                if session.recv_ready:
-                    for line in stdout:
-                        output += line
-                        if self._streaming:
-                            sys.stdout.write(line)
-
-                if session.recv_stderr_ready:
-                    for line in stderr:
-                        output += line
-                        if self._streaming:
-                            sys.stderr.write(line)
-
-                if session.exit_status_ready():
-                    break
-            exit_status = session.recv_exit_status()
-            return SSHResult(exit_status, output)
-
-        # Returning two things so tuple unpacking the return works even if the ssh client fails
-        return SSHResult(None, None)
+        return SSHCommandStream(self, '%s\n' % command, timeout=timeout)
 
     def run_rails_command(self, command):
         logger.info("Running rails command `{}`".format(command))
@@ -151,7 +377,185 @@ class SSHClient(paramiko.SSHClient):
         return self.run_command("stat /var/www/miq/vmdb/HAS_NETAPP").rc == 0
 
 
+class SSHCommandStream(object):
+    """Output of a remote command, collected as it arrives
+
+    The command is started when the stream is iterated. Instead of polling the channel, the
+    reader blocks in ``select`` until either stdout or stderr has data, so waiting for a long
+    running command costs no CPU. Iterating yields output lines (without the line endings)
+    from both stdout and stderr, :py:meth:`chunks` yields the raw data.
+
+    Args:
+        client: :py:class:`SSHClient` to run the command with.
+        command: Command to run in the remote shell.
+        timeout: Seconds to wait for the command to finish, ``None`` waits forever.
+    """
+    #: Bytes read from the channel at once
+    chunk_size = 32768
+
+    def __init__(self, client, command, timeout=None):
+        self.client = client
+        self.command = command
+        self.timeout = timeout
+        self.rc = None
+
+    def __repr__(self):
+        return "<SSHCommandStream {} rc={}>".format(repr(self.command.strip()), self.rc)
+
+    def __iter__(self):
+        partial_lines = {False: '', True: ''}
+        for is_stderr, data in self.chunks():
+            lines = (partial_lines[is_stderr] + data).split('\n')
+            partial_lines[is_stderr] = lines.pop()
+            for line in lines:
+                yield line.rstrip('\r')
+        for line in partial_lines.values():
+            if line:
+                yield line.rstrip('\r')
+
+    def chunks(self):
+        """Yields ``(is_stderr, data)`` tuples until the command exits
+
+        Raises:
+            :py:class:`utils.wait.TimedOutError` if the command did not finish in time.
+        """
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        else:
+            deadline = None
+        with self.client as context:
+            session = context._open_session()
+            try:
+                session.exec_command(self.command)
+                while True:
+                    # Checked first, a command that keeps printing must time out as well
+                    if deadline is not None and time.time() > deadline:
+                        raise TimedOutError("Command `{}` did not finish in {}s".format(
+                            self.command.strip(), self.timeout))
+                    if session.recv_ready():
+                        data = session.recv(self.chunk_size)
+                        if context._streaming:
+                            sys.stdout.write(data)
+                        yield False, data
+                    elif session.recv_stderr_ready():
+                        data = session.recv_stderr(self.chunk_size)
+                        if context._streaming:
+                            sys.stderr.write(data)
+                        yield True, data
+                    elif session.exit_status_ready():
+                        break
+                    else:
+                        if deadline is None:
+                            wait = 1.0
+                        else:
+                            wait = max(min(deadline - time.time(), 1.0), 0)
+                        # The channel's fileno becomes readable on stdout/stderr data and EOF;
+                        # the timeout only covers the exit status arriving without either
+                        select.select([session], [], [], wait)
+                self.rc = session.recv_exit_status()
+            finally:
+                session.close()
+
+
+class _OutputBuffer(object):
+    """Keeps the last ``max_size`` bytes written to it"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.truncated = False
+        self._chunks = deque()
+        self._size = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.max_size:
+            excess = self._size - self.max_size
+            first = self._chunks.popleft()
+            if len(first) > excess:
+                self._chunks.appendleft(first[excess:])
+            self._size -= min(len(first), excess)
+            self.truncated = True
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+
+class FanOutResult(OrderedDict):
+    """Per-host results of :py:func:`run_on_hosts`
+
+    Maps every host that ran the command to its :py:class:`SSHResult`. Hosts where the command
+    could not be run or did not finish (connection failure, timeout) are not in the mapping,
+    their exceptions are in :py:attr:`errors` instead.
+    """
+    def __init__(self, *args, **kwargs):
+        super(FanOutResult, self).__init__(*args, **kwargs)
+        self.errors = OrderedDict()
+
+    @property
+    def failed(self):
+        """List of hosts that raised an error or returned a non-zero exit status"""
+        return self.errors.keys() + [host for host, result in self.iteritems() if result.rc != 0]
+
+    @property
+    def successful(self):
+        return not self.failed
+
+
+def run_on_hosts(hosts, command, timeout=None, max_workers=16, **connect_kwargs):
+    """Runs a command on several hosts at once
+
+    Every host gets its own thread (up to ``max_workers`` at a time) and its own pooled
+    connection, so the whole call takes about as long as the slowest host.
+
+    Usage:
+
+        results = run_on_hosts(['10.0.0.1', '10.0.0.2'], 'service evmserverd restart')
+        if not results.successful:
+            raise Exception('Restart failed on {}'.format(', '.join(results.failed)))
+
+    Args:
+        hosts: Iterable of hostnames or :py:class:`SSHClient` instances.
+        command: Command to run in the remote shell.
+        timeout: Seconds each host has to finish the command, ``None`` waits forever.
+        max_workers: Maximum number of hosts running the command at the same time.
+        **connect_kwargs: Used to create clients for hosts passed as hostnames.
+
+    Returns: :py:class:`FanOutResult` keyed by hostname
+    """
+    clients = OrderedDict()
+    for host in hosts:
+        if not isinstance(host, SSHClient):
+            host = SSHClient(hostname=host, **connect_kwargs)
+        clients[host._connect_kwargs['hostname']] = host
+    results = FanOutResult()
+    if not clients:
+        return results
+
+    pool = ThreadPool(min(max_workers, len(clients)))
+    try:
+        pending = [
+            (hostname, pool.apply_async(client.run_command, [command], {'timeout': timeout}))
+            for hostname, client in clients.iteritems()]
+        for hostname, async_result in pending:
+            try:
+                results[hostname] = async_result.get()
+            except Exception as e:
+                logger.error("Running `{}` on {} failed: {}: {}".format(
+                    command, hostname, type(e).__name__, str(e)))
+                results.errors[hostname] = e
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
 class SSHTail(SSHClient):
+    """Reads the lines appended to a remote file since the last time it was read
+
+    Iterating over the tail yields the new lines, see :py:meth:`lines`.
+    """
+    #: Bytes requested from the SFTP server at a time
+    chunk_size = 1024 * 1024
 
     def __init__(self, remote_filename, **connect_kwargs):
         super(SSHTail, self).__init__(stream_output=False, **connect_kwargs)
@@ -160,16 +564,42 @@ class SSHTail(SSHClient):
         self._remote_file_size = None
 
     def __iter__(self):
+        return self.lines()
+
+    def lines(self, chunk_size=None):
+        """Yields the complete lines appended to the file since the last read
+
+        The new bytes are read in large chunks instead of line by line. A line that hasn't been
+        completed yet (no newline) is left for the next read. The first read only notes the end
+        of the file, see :py:meth:`set_initial_file_end`.
+
+        Args:
+            chunk_size: Bytes to read at a time, :py:attr:`chunk_size` by default
+        """
+        chunk_size = chunk_size or self.chunk_size
         with self as sshtail:
             fstat = sshtail._sftp_client.stat(self._remote_filename)
-            if self._remote_file_size is not None:
-                if self._remote_file_size < fstat.st_size:
-                    remote_file = self._sftp_client.open(self._remote_filename, 'r')
-                    remote_file.seek(self._remote_file_size, 0)
-                    while (remote_file.tell() < fstat.st_size):
-                        line = remote_file.readline().rstrip()
-                        yield line
-            self._remote_file_size = fstat.st_size
+            if self._remote_file_size is None or self._remote_file_size >= fstat.st_size:
+                self._remote_file_size = fstat.st_size
+                return
+            remote_file = self._sftp_client.open(self._remote_filename, 'r')
+            try:
+                remote_file.seek(self._remote_file_size, 0)
+                remote_file.prefetch()
+                position = self._remote_file_size
+                pending = ''
+                while position < fstat.st_size:
+                    chunk = remote_file.read(min(chunk_size, fstat.st_size - position))
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    lines = (pending + chunk).split('\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        yield line.rstrip()
+                    self._remote_file_size = position - len(pending)
+            finally:
+                remote_file.close()
 
     def __enter__(self):
         self.connect(**self._connect_kwargs)
@@ -178,6 +608,7 @@ class SSHTail(SSHClient):
 
     def __exit__(self, *args, **kwargs):
         self._sftp_client.close()
+        self.close()
 
     def set_initial_file_end(self):
         with self as sshtail:
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+from riggerlib import RiggerClient
+
+from artifactor import ArtifactorClient
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class Sent(list):
+    """Hooks sent over the wire, the transport waits for the ``release`` event"""
+    def __init__(self):
+        self.release = threading.Event()
+
+    def hooks(self):
+        """The hooks sent, with the batches unpacked"""
+        hooks = []
+        for hook_name, kwargs in self:
+            if hook_name == 'fire_hooks':
+                hooks.extend((hook['hook_name'], hook['data']) for hook in kwargs['hooks'])
+            else:
+                hooks.append((hook_name, kwargs))
+        return hooks
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = Sent()
+    sent.release.set()
+
+    def fire_hook(self, hook_name, grab_result=False, **kwargs):
+        sent.release.wait(5)
+        sent.append((hook_name, kwargs))
+        if grab_result:
+            return {'merkyl_content': 'log'}
+    monkeypatch.setattr(RiggerClient, 'fire_hook', fire_hook)
+    return sent
+
+
+def test_hooks_queued_in_order(sent):
+    client = ArtifactorClient('127.0.0.1', 21212, async_hooks=True, batch_size=10)
+    sent.release.clear()
+    for i in range(5):
+        assert client.fire_hook('report_test', test_name='test_{}'.format(i)) is None
+    assert client.queue_depth >= 4
+    sent.release.set()
+    assert client.flush(timeout=5)
+    assert [kwargs['test_name'] for hook_name, kwargs in sent.hooks()] == [
+        'test_{}'.format(i) for i in range(5)]
+    # The first hook went out alone, the rest piled up behind it and went out together
+    assert sent[-1][0] == 'fire_hooks'
+    stats = client.stats()
+    assert stats['hooks'] == 5 and stats['batches'] == len(sent) and stats['depth'] == 0
+    assert stats['max_depth'] >= 4 and stats['latency_max'] >= stats['latency_avg'] > 0
+
+
+def test_results_are_synchronous(sent):
+    client = ArtifactorClient('127.0.0.1', 21212, async_hooks=True)
+    client.fire_hook('start_test', test_name='test')
+    client.fire_hook('start_test', test_name='test')
+    # Hooks with results go out after the queued ones
+    assert client.fire_hook('get_log_merkyl', grab_result=True) == {'merkyl_content': 'log'}
+    client.fire_hook('terminate')
+    assert [hook_name for hook_name, kwargs in sent.hooks()] == [
+        'start_test', 'start_test', 'get_log_merkyl', 'terminate']
+
+
+def test_full_queue_blocks(sent):
+    client = ArtifactorClient('127.0.0.1', 21212, async_hooks=True, max_queued=1, batch_size=1,
+        put_timeout=.1)
+    sent.release.clear()
+    threading.Timer(.5, sent.release.set).start()
+    for i in range(3):
+        client.fire_hook('build_report')
+    assert client.stats()['full'] >= 1
+    assert client.flush(timeout=5)
+    assert len(sent) == 3
+
+
+def test_sync_mode(sent):
+    client = ArtifactorClient('127.0.0.1', 21212)
+    client.fire_hook('build_report')
+    assert sent == [('build_report', {})]
+    assert client.stats()['hooks'] == 0
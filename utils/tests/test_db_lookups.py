@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import create_engine
+
+from utils import db as db_module
+from utils.db import Db
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def db(tmpdir, monkeypatch):
+    monkeypatch.setattr(db_module, 'reflection_cache_path', tmpdir.join('cache'))
+    engine = create_engine('sqlite:///%s' % tmpdir.join('vmdb.sqlite').strpath)
+    engine.execute('CREATE TABLE schema_migrations (version VARCHAR(255))')
+    engine.execute(
+        'CREATE TABLE miq_sets (id INTEGER PRIMARY KEY, description VARCHAR(255), '
+        'set_type VARCHAR(255))')
+    for row in [(1, 'profile', 'MiqPolicySet'), (2, 'profile', 'MiqAlertSet'), (3, None, None)]:
+        engine.execute('INSERT INTO miq_sets VALUES (?, ?, ?)', row)
+    db = Db('host_a', {'username': 'user', 'password': 'pass'})
+    db.engine = engine
+    return db
+
+
+def test_exists(db):
+    assert db.exists('miq_sets', description='profile', set_type='MiqAlertSet')
+    assert not db.exists('miq_sets', description='profile', set_type='MiqGroup')
+    assert db.exists('miq_sets', description=None)
+    assert db.exists('miq_sets')
+
+
+def test_get_one(db):
+    row = db.get_one('miq_sets', set_type='MiqAlertSet')
+    assert (row.id, row.description) == (2, 'profile')
+    assert db.get_one('miq_sets', description='missing') is None
+
+
+def test_count(db):
+    assert db.count('miq_sets') == 3
+    assert db.count('miq_sets', description='profile') == 2
+    assert db.count('miq_sets', description='missing') == 0
+
+
+def test_statements_reused(db):
+    db.exists('miq_sets', description='profile')
+    db.exists('miq_sets', description='missing')
+    db.exists('miq_sets', description=None)
+    assert len(db._statement_cache) == 2
+
+
+def test_unknown_table(db):
+    with pytest.raises(KeyError):
+        db.exists('no_such_table', name='x')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import create_engine
+
+from utils import db as db_module
+from utils.db import Db
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def cache_path(tmpdir, monkeypatch):
+    path = tmpdir.join('cache')
+    monkeypatch.setattr(db_module, 'reflection_cache_path', path)
+    return path
+
+
+def make_db(tmpdir, hostname='host_a', version='20140101000000'):
+    db_file = tmpdir.join('%s.sqlite' % hostname)
+    engine = create_engine('sqlite:///%s' % db_file.strpath)
+    if not db_file.check():
+        engine.execute('CREATE TABLE schema_migrations (version VARCHAR(255))')
+        engine.execute('CREATE TABLE vms (id INTEGER PRIMARY KEY, name VARCHAR(255))')
+    engine.execute('DELETE FROM schema_migrations')
+    engine.execute("INSERT INTO schema_migrations VALUES ('%s')" % version)
+    db = Db(hostname, {'username': 'user', 'password': 'pass'})
+    db.engine = engine
+    return db
+
+
+def test_tables_reflected_once(tmpdir, cache_path):
+    db = make_db(tmpdir)
+    assert db['vms'].__tablename__ == 'vms'
+    assert cache_path.join('host_a-20140101000000.pickle').check()
+
+    # Another process with the same schema doesn't need the table in the database
+    db.engine.execute('ALTER TABLE vms RENAME TO old_vms')
+    other_db = make_db(tmpdir)
+    assert 'name' in other_db['vms'].__table__.columns
+
+
+def test_schema_change_invalidates(tmpdir, cache_path):
+    make_db(tmpdir)['vms']
+    db = make_db(tmpdir, version='20150101000000')
+    db.engine.execute('ALTER TABLE vms ADD COLUMN guid VARCHAR(255)')
+    assert 'guid' in db['vms'].__table__.columns
+    assert len(cache_path.listdir()) == 2
+
+
+def test_tables_cached_per_db(tmpdir, cache_path):
+    db_a = make_db(tmpdir, 'host_a')
+    db_b = make_db(tmpdir, 'host_b')
+    assert db_a['vms'] is not db_b['vms']
+    assert db_a['vms'].__table__.bind is db_a.engine
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+
+import pytest
+
+from utils.log import ArtifactorLogQueue, ArtifactorLoggerAdapter
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.hooks = []
+
+    def fire_hook(self, hook_name, **kwargs):
+        self.hooks.append((hook_name, kwargs))
+
+    def __nonzero__(self):
+        return True
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.yield_fixture
+def adapter():
+    test_logger = logging.getLogger('test_log_adapter')
+    test_logger.setLevel(logging.INFO)
+    handler = RecordingHandler()
+    test_logger.addHandler(handler)
+    client = FakeClient()
+    adapter = ArtifactorLoggerAdapter(test_logger, {})
+    adapter.artifactor = client
+    adapter.slaveid = 'gw0'
+    adapter.art_level = logging.DEBUG
+    adapter.art_queue = ArtifactorLogQueue(batch_size=3, client=client)
+    adapter.handler = handler
+    yield adapter
+    test_logger.removeHandler(handler)
+
+
+def test_levels_short_circuit(adapter):
+    adapter.trace('below both levels')
+    adapter.debug('only for the artifactor')
+    adapter.info('for both %s', 'handlers')
+    assert adapter.art_queue.flush(timeout=5)
+    assert [record.getMessage() for record in adapter.handler.records] == ['for both handlers']
+    sent = [log_record['message']
+        for hook_name, kwargs in adapter.artifactor.hooks for log_record in kwargs['log_records']]
+    assert sent == ['only for the artifactor', 'for both handlers']
+
+
+def test_call_site(adapter):
+    lineno = sys._getframe().f_lineno + 1
+    adapter.info('here')
+    record = adapter.handler.records[-1]
+    assert record.source_file == 'utils/tests/test_log_adapter.py'
+    assert record.source_lineno == lineno
+    adapter.info('elsewhere', extra={'source_file': 'somefile.py', 'source_lineno': 7})
+    assert adapter.handler.records[-1].source_file == 'somefile.py'
+
+
+def test_queue_batches(adapter):
+    for i in range(7):
+        adapter.warning('message {}'.format(i))
+    assert adapter.art_queue.flush(timeout=5)
+    hooks = adapter.artifactor.hooks
+    assert set(hook_name for hook_name, kwargs in hooks) == {'log_messages'}
+    assert all(kwargs['slaveid'] == 'gw0' and len(kwargs['log_records']) <= 3
+        for hook_name, kwargs in hooks)
+    assert [log_record['message'] for hook_name, kwargs in hooks
+        for log_record in kwargs['log_records']] == ['message {}'.format(i) for i in range(7)]
+
+
+def test_full_queue_drops():
+    queue = ArtifactorLogQueue(max_size=1, client=FakeClient())
+    # No sender thread yet, nothing gets taken off the queue
+    queue._thread = object()
+    queue.put({'message': 'kept'}, '')
+    queue.put({'message': 'dropped'}, '')
+    assert queue.dropped == 1
+    assert not queue.flush(timeout=.1)
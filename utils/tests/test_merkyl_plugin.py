@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os.path
+import re
+import threading
+
+import pytest
+
+from artifactor.plugins.merkyl import Merkyl
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeResponse(object):
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeMerkyl(object):
+    """Serves logs like merkyl would, ``ranges=False`` is merkyl before it understood ``Range``"""
+    def __init__(self, logs, ranges=True):
+        self.logs = logs
+        self.ranges = ranges
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        with self.lock:
+            self.requests.append(url.split('/', 3)[-1])
+        endpoint, name = re.match(r'(\w+)/?(.*)$', url.split('/', 3)[-1]).groups()
+        if endpoint != 'get':
+            return FakeResponse('')
+        body = self.logs[name]
+        range_header = (headers or {}).get('Range')
+        if self.ranges and range_header:
+            start = max(0, len(body) - int(range_header.split('-')[-1]))
+            return FakeResponse(body[start:], 206, {
+                'Content-Range': 'bytes {}-{}/{}'.format(start, len(body) - 1, len(body))})
+        return FakeResponse(body)
+
+
+@pytest.fixture
+def merkyl():
+    merkyl = Merkyl('merkyl', {'log_files': ['/var/log/evm.log', '/var/log/production.log']})
+    merkyl.configure()
+    merkyl.chunk_size = 7
+    return merkyl
+
+
+def finish_test(merkyl, fake, tmpdir):
+    merkyl.session = fake
+    merkyl.start_test('test_name', 'test_location', '127.0.0.1')
+    merkyl.add_log('test_name', 'test_location', '/var/log/extra.log')
+    result, artifacts = merkyl.finish_test(
+        tmpdir.strpath, 'test_name', 'test_location', '127.0.0.1')
+    files = artifacts['artifacts']['test_location/test_name']['files']['merkyl']
+    names = [os.path.basename(path) for path in files]
+    return names, {name: tmpdir.join(name).read() for name in names}
+
+
+def test_logs_fetched(merkyl, tmpdir):
+    logs = {'evm.log': 'evm\n' * 20, 'production.log': '', 'extra.log': 'extra\n'}
+    fake = FakeMerkyl(logs)
+    names, contents = finish_test(merkyl, fake, tmpdir)
+    assert names == ['merkyl-evm.log.log', 'merkyl-production.log.log', 'merkyl-extra.log.log']
+    assert contents == {'merkyl-' + name + '.log': body for name, body in logs.iteritems()}
+    assert fake.requests[-1] == 'delete/extra.log'
+
+
+@pytest.mark.parametrize('ranges', [True, False], ids=['range', 'no_range'])
+def test_logs_capped(merkyl, tmpdir, ranges):
+    merkyl.max_size = 10
+    body = ''.join('line {}\n'.format(i) for i in range(10))
+    fake = FakeMerkyl({'evm.log': body, 'production.log': 'short\n', 'extra.log': ''}, ranges)
+    names, contents = finish_test(merkyl, fake, tmpdir)
+    marker, evm = contents['merkyl-evm.log.log'].split('\n', 1)
+    assert 'first {} bytes of evm.log dropped'.format(len(body) - 10) in marker
+    assert evm == body[-10:]
+    assert contents['merkyl-production.log.log'] == 'short\n'
+    assert contents['merkyl-extra.log.log'] == ''
+    assert tmpdir.listdir(lambda path: not path.basename.startswith('merkyl-')) == []
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils.mgmt_system import EC2System, VMWareSystem
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class Spec(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeVM(object):
+    """A vSphere vm whose tasks finish right away, ``broken`` ones can't submit tasks"""
+    def __init__(self, vsphere, name, broken=False):
+        self.vsphere = vsphere
+        self.name = name
+        self.broken = broken
+
+    def _task(self, state):
+        if self.broken:
+            raise Exception('vm is broken')
+        self.vsphere.states[self.name] = state
+        return Spec(update=lambda: None, info=Spec(state='success'))
+
+    def PowerOnVM_Task(self):
+        return self._task(VMWareSystem.POWERED_ON)
+
+    def PowerOffVM_Task(self):
+        return self._task(VMWareSystem.POWERED_OFF)
+
+    def Destroy_Task(self):
+        return self._task(None)
+
+
+@pytest.fixture
+def vsphere():
+    system = VMWareSystem('vsphere.example.com', 'user', 'password')
+    system.states = {
+        'vm_on': VMWareSystem.POWERED_ON, 'vm_off': VMWareSystem.POWERED_OFF,
+        'vm_broken': VMWareSystem.POWERED_OFF}
+    vms = {name: FakeVM(system, name, name == 'vm_broken') for name in system.states}
+    system._get_vm = lambda vm_name: vms[vm_name]
+    system.vm_statuses = lambda vm_names: {
+        vm_name: system.states[vm_name] for vm_name in vm_names if vm_name in system.states}
+    system.waited = []
+
+    def wait_vms_state(vm_names, state, num_sec):
+        system.waited.append(sorted(vm_names))
+        expected = {'running': VMWareSystem.POWERED_ON, 'stopped': VMWareSystem.POWERED_OFF}
+        return {vm_name: system.states[vm_name] == expected[state] for vm_name in vm_names}
+    system.wait_vms_state = wait_vms_state
+    return system
+
+
+def test_vsphere_start_partial_failure(vsphere):
+    assert vsphere.start_vms(['vm_off', 'vm_broken', 'vm_on', 'vm_missing']) == {
+        'vm_off': True, 'vm_broken': False, 'vm_on': True, 'vm_missing': False}
+    # The vm that couldn't be started isn't waited for
+    assert vsphere.waited == [['vm_off', 'vm_on']]
+
+
+def test_vsphere_stop_partial_failure(vsphere):
+    vsphere.states['vm_broken'] = VMWareSystem.POWERED_ON
+    assert vsphere.stop_vms(['vm_on', 'vm_broken']) == {'vm_on': True, 'vm_broken': False}
+    assert vsphere.waited == [['vm_on']]
+
+
+def test_vsphere_delete_partial_failure(vsphere):
+    assert vsphere.delete_vms(['vm_on', 'vm_off', 'vm_broken']) == {
+        'vm_on': True, 'vm_off': True, 'vm_broken': False}
+    assert vsphere.states == {'vm_on': None, 'vm_off': None, 'vm_broken': VMWareSystem.POWERED_OFF}
+
+
+class FakeInstance(object):
+    def __init__(self, id, name, state):
+        self.id = id
+        self.tags = {'Name': name}
+        self.state = state
+
+
+class FakeEC2Api(object):
+    """An EC2 connection holding some instances, recording its ``get_all_instances`` calls"""
+    def __init__(self, instances):
+        self.instances = instances
+        self.calls = []
+        self.actions = []
+
+    def get_all_instances(self, instance_ids=None, filters=None):
+        self.calls.append((instance_ids, filters))
+        instances = self.instances
+        if instance_ids is not None:
+            instances = [i for i in instances if i.id in instance_ids]
+        if filters:
+            instances = [i for i in instances if i.tags['Name'] in filters['tag:Name']]
+        return [Spec(instances=instances)]
+
+    def start_instances(self, instance_ids):
+        self.actions.append(('start', sorted(instance_ids)))
+        for instance in self.instances:
+            if instance.id in instance_ids:
+                instance.state = 'running'
+
+
+@pytest.fixture
+def ec2():
+    system = EC2System(username='user', password='password', region='us-east-1')
+    system.api = FakeEC2Api([
+        FakeInstance('i-00000001', 'one', 'stopped'),
+        FakeInstance('i-00000002', 'two', 'stopped'),
+        FakeInstance('i-00000003', 'twin', 'stopped'),
+        FakeInstance('i-00000004', 'twin', 'stopped'),
+    ])
+    return system
+
+
+def test_ec2_instance_ids_single_call(ec2):
+    assert ec2._get_instance_ids(['one', 'two', 'twin', 'missing', 'i-00000009']) == {
+        'one': 'i-00000001', 'two': 'i-00000002', 'i-00000009': 'i-00000009'}
+    assert ec2.api.calls == [(None, {'tag:Name': ['one', 'two', 'twin', 'missing']})]
+    # IDs don't need to be looked up
+    ec2.api.calls = []
+    assert ec2._get_instance_ids(['i-00000001']) == {'i-00000001': 'i-00000001'}
+    assert ec2.api.calls == []
+
+
+def test_ec2_start_partial_failure(ec2):
+    assert ec2.start_vms(['one', 'twin', 'missing', 'two']) == {
+        'one': True, 'twin': False, 'missing': False, 'two': True}
+    assert ec2.api.actions == [('start', ['i-00000001', 'i-00000002'])]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils import mgmt_system
+from utils.mgmt_system import VMWareSystem
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class Spec(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakePropertyCollector(object):
+    objects = {
+        'VirtualMachine': [
+            {'config.template': False}, {'config.template': False}, {'config.template': True},
+            # No config, neither a vm nor a template
+            {}],
+        'HostSystem': [{'name': 'host'}],
+        'ClusterComputeResource': [{'name': 'cluster_a'}, {'name': 'cluster_b'}],
+        'Datastore': [
+            {'host': Spec(DatastoreHostMount=['mount'])}, {'host': Spec(DatastoreHostMount=[])},
+            {}],
+    }
+
+    def __init__(self):
+        self.calls = []
+
+    def RetrieveProperties(self, specSet):
+        self.calls.append(sorted(spec.type for spec in specSet[0].propSet))
+        return [
+            Spec(obj=Spec(_type=spec.type, value='obj'), propSet=[
+                Spec(name=path, val=obj[path]) for path in spec.pathSet if path in obj])
+            for spec in specSet[0].propSet for obj in self.objects[spec.type]]
+
+
+@pytest.fixture
+def vsphere():
+    collector = FakePropertyCollector()
+    system = VMWareSystem('vsphere.example.com', 'user', 'password')
+    system._api = Spec(
+        si=Spec(content=Spec(rootFolder='root', propertyCollector=collector)),
+        create=lambda type_name: Spec(),
+        get_search_filter_spec=lambda root, property_spec: Spec(propSet=[property_spec]))
+    system.collector = collector
+    return system
+
+
+def test_stats_single_call(vsphere):
+    assert vsphere.stats() == {
+        'num_vm': 2, 'num_template': 1, 'num_host': 1, 'num_cluster': 2, 'num_datastore': 1}
+    assert vsphere.collector.calls == [
+        ['ClusterComputeResource', 'Datastore', 'HostSystem', 'VirtualMachine']]
+    assert vsphere.stats('num_vm') == {'num_vm': 2}
+    assert vsphere.collector.calls[-1] == ['VirtualMachine']
+    with pytest.raises(KeyError):
+        vsphere.stats('num_flavor')
+
+
+def test_stats_reused(vsphere, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(mgmt_system.time, 'time', lambda: now[0])
+    vsphere.stats('num_vm', 'num_template', max_age=60)
+    now[0] += 30
+    assert vsphere.stats('num_vm', max_age=60) == {'num_vm': 2}
+    assert len(vsphere.collector.calls) == 1
+    # Only the missing stats are collected
+    vsphere.stats('num_vm', 'num_host', max_age=60)
+    assert vsphere.collector.calls[-1] == ['HostSystem']
+    now[0] += 31
+    vsphere.stats('num_vm', 'num_template', max_age=60)
+    assert vsphere.collector.calls[-1] == ['VirtualMachine']
+    # Without a max_age they are always collected
+    vsphere.stats('num_host')
+    assert len(vsphere.collector.calls) == 4
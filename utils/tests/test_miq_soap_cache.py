@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import pytest
+from collections import Counter
+
+from utils import miq_soap
+from utils.miq_soap import MiqEms, MiqHost, MiqVM, object_cache, set_client, soap_calls
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class SoapObject(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeService(object):
+    def __init__(self):
+        self.calls = Counter()
+        self.vms = {
+            'vm-1': SoapObject(guid='vm-1', name='vm_a', power_state='off'),
+            'vm-2': SoapObject(guid='vm-2', name='vm_b', power_state='on'),
+        }
+        self.host = SoapObject(guid='host-1', name='host_a', vms=self.vms.values())
+        self.emss = {
+            'ems-1': SoapObject(guid='ems-1', name='ems_a', hosts=[self.host], vms=[]),
+            'ems-2': SoapObject(guid='ems-2', name='ems_b', hosts=[], vms=self.vms.values()),
+        }
+
+    def FindVmByGuid(self, guid):
+        self.calls['FindVmByGuid'] += 1
+        return self.vms[guid]
+
+    def FindHostByGuid(self, guid):
+        self.calls['FindHostByGuid'] += 1
+        return self.host
+
+    def FindEmsByGuid(self, guid):
+        self.calls['FindEmsByGuid'] += 1
+        return self.emss[guid]
+
+    def GetEmsList(self):
+        # List entries only carry the name and id, not the relationships
+        self.calls['GetEmsList'] += 1
+        return [SoapObject(guid=ems.guid, name=ems.name) for ems in self.emss.values()]
+
+    def EVMSmartStart(self, guid):
+        self.vms[guid].power_state = 'on'
+        return SoapObject(result='true')
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.service = FakeService()
+
+
+@pytest.yield_fixture
+def service():
+    client = FakeClient()
+    set_client(client)
+    object_cache.invalidate()
+    soap_calls.clear()
+    yield client.service
+    set_client(None)
+    object_cache.invalidate()
+    soap_calls.clear()
+
+
+def test_object_fetched_once(service):
+    vm = MiqVM('vm-1')
+    assert vm.name == 'vm_a'
+    assert vm.is_powered_off
+    assert not vm.is_suspended
+    assert vm.exists
+    assert service.calls['FindVmByGuid'] == 1
+    assert soap_calls['FindVmByGuid'] == 1
+    # Another wrapper of the same object uses the cache as well
+    assert MiqVM('vm-1').is_powered_off
+    assert service.calls['FindVmByGuid'] == 1
+
+
+def test_object_expires(service, monkeypatch):
+    vm = MiqVM('vm-1')
+    vm.object
+    now = miq_soap.time.time() + object_cache.ttl + 1
+    monkeypatch.setattr(miq_soap.time, 'time', lambda: now)
+    vm.object
+    assert service.calls['FindVmByGuid'] == 2
+
+
+def test_mutating_call_invalidates(service):
+    vm = MiqVM('vm-1')
+    assert vm.is_powered_off
+    assert vm.power_on()
+    assert vm.is_powered_on
+    assert service.calls['FindVmByGuid'] == 2
+
+
+def test_related_objects_not_fetched(service):
+    vms = MiqHost('host-1').vms
+    assert sorted(vm.name for vm in vms) == ['vm_a', 'vm_b']
+    assert sorted(vm.is_powered_on for vm in vms) == [False, True]
+    assert service.calls == {'FindHostByGuid': 1}
+
+
+def test_list_entries_not_cached(service):
+    ems = MiqEms.find_by_name('EMS_B')
+    assert service.calls == {'GetEmsList': 1}
+    # The list entry isn't taken for the full object
+    assert sorted(vm.name for vm in ems.vms) == ['vm_a', 'vm_b']
+    assert [host.name for host in MiqEms.find_by_name('ems_a').hosts] == ['host_a']
+    assert service.calls == {'GetEmsList': 2, 'FindEmsByGuid': 2}
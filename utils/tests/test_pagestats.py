@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+
+import numpy
+import pytest
+
+from utils import pagestats
+from utils.pagestats import PageStat, PageStatStore, ProductionLogParser
+from utils.ssh import SSHTail
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def log_lines(datafile):
+    return datafile('production.log').read().splitlines()
+
+
+def test_parse_recorded_log(log_lines):
+    parser = ProductionLogParser('2391', query_time=100)
+    pages = list(parser.parse(log_lines))
+    assert len(pages) == 20
+    assert parser.line_count == len(log_lines)
+    first = pages[0]
+    assert first.request == 'GET "/dashboard/show" '
+    assert first.status == '200 OK'
+    assert first.viewstime > 0 and first.activerecordtime > 0
+    assert first.uncachedcount == first.selectcount - first.cachedcount
+    assert all(float(slow.split('Load (')[1].split('ms)')[0]) > 100
+        for page in pages for slow in page.slowselects)
+    # Redirects have no view timing
+    redirects = [page for page in pages if page.status == '302 Found']
+    assert redirects and all(page.viewstime == 0 for page in redirects)
+
+
+def test_parse_is_incremental(log_lines):
+    pages = ProductionLogParser('2391', query_time=100).parse(iter(log_lines))
+    assert next(pages).request == 'GET "/dashboard/show" '
+    assert next(pages).request == 'GET "/vm_infra/explorer" '
+
+
+def test_parse_matches_whole_pids():
+    lines = [
+        'I, [2015-01-14T10:26:21.851967 #23910:62e6b43]  INFO -- : Started GET "/a" for 1.2.3.4',
+        'I, [2015-01-14T10:26:21.851967 #2391:62e6b43]  INFO -- : Started GET "/b" for 1.2.3.4',
+        'I, [2015-01-14T10:26:21.851967 #23910:62e6b43]  INFO -- : Completed 200 OK in 5ms',
+        'I, [2015-01-14T10:26:21.851967 #2391:62e6b43]  INFO -- : Completed 200 OK in 7ms',
+        'I, [2015-01-14T10:26:21.851967 #2400:62e6b43]  INFO -- : Started GET "/c" for 1.2.3.4',
+        'I, [2015-01-14T10:26:21.851967 #2400:62e6b43]  INFO -- : Completed 404 Not in 9ms',
+    ]
+    pages = list(ProductionLogParser(['2391', '2400'], query_time=100).parse(lines))
+    assert [(page.request, page.completedintime) for page in pages] == [
+        ('GET "/b" ', 7.0), ('GET "/c" ', 9.0)]
+
+
+class FakeSFTPFile(object):
+    def __init__(self, contents):
+        self.contents = contents
+        self.position = 0
+        self.reads = 0
+
+    def seek(self, position, whence):
+        self.position = position
+
+    def prefetch(self):
+        pass
+
+    def read(self, size):
+        self.reads += 1
+        data = self.contents[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class FakeStat(object):
+    def __init__(self, size):
+        self.st_size = size
+
+
+class FakeTail(SSHTail):
+    def __init__(self, contents):
+        self.contents = contents
+        self.files = []
+        self._remote_filename = 'production.log'
+        self._remote_file_size = None
+        self._sftp_client = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def stat(self, filename):
+        return FakeStat(len(self.contents))
+
+    def open(self, filename, mode):
+        self.files.append(FakeSFTPFile(self.contents))
+        return self.files[-1]
+
+
+def test_tail_reads_chunks():
+    tail = FakeTail('old line\n')
+    assert list(tail) == []
+    tail.contents += 'first line\nsecond line\nthird li'
+    assert list(tail.lines(chunk_size=8)) == ['first line', 'second line']
+    assert tail.files[-1].reads == 4
+    # The incomplete line is read again once it's complete
+    tail.contents += 'ne\n'
+    assert list(tail) == ['third line']
+    assert list(tail) == []
+
+
+@pytest.fixture
+def store(log_lines):
+    return PageStatStore(ProductionLogParser('2391', query_time=100).parse(log_lines))
+
+
+def test_store_round_trip(log_lines, store):
+    pages = list(ProductionLogParser('2391', query_time=100).parse(log_lines))
+    assert len(store) == len(pages)
+    assert [dict(page) for page in store] == [dict(page) for page in pages]
+    # Requests are stored once
+    assert len(store.requests) < len(pages)
+    assert store.column('selectcount').tolist() == [page.selectcount for page in pages]
+
+
+def test_store_statistics():
+    store = PageStatStore()
+    assert store.statistics() == {}
+    for i, request in enumerate(['/a/1', '/b', '/a/2', '/b', '/a/3']):
+        store.append(PageStat(request, '200 OK', transactiontime=i * 10, completedintime=i + 1,
+            selectcount=i))
+    stats = store.statistics([re.compile(r'^/a/')])
+    assert stats.keys() == ['^/a/', '/b']
+    completed = stats['^/a/']['completedintime']
+    assert completed['samples'] == 3
+    assert (completed['min'], completed['max'], completed['p50']) == (1.0, 5.0, 3.0)
+    assert completed['p90'] == round(numpy.percentile([1, 3, 5], 90), 2)
+    # Zero transaction times and views times aren't samples
+    assert stats['^/a/']['transactiontime']['samples'] == 2
+    assert stats['/b']['viewstime'] is None
+
+
+def test_statistics_csv(tmpdir, monkeypatch, store):
+    monkeypatch.setattr(pagestats, 'log_path', tmpdir)
+    filters = [re.compile(r'^GET "/vm_infra/')]
+    pagestats.pages_to_statistics_csv(store, filters, 'statistics.csv')
+    pagestats.pages_to_statistics_csv(list(store), filters, 'statistics.csv')
+    lines = tmpdir.join('csv_output', 'statistics.csv').readlines()
+    header, rows = lines[0], lines[1:]
+    assert header.count(',') == 42
+    assert rows[:len(rows) / 2] == rows[len(rows) / 2:]
+    assert all(row.count(',') == 42 for row in rows)
+
+    store.write_summary_json('statistics.json', filters)
+    summary = json.load(tmpdir.join('csv_output', 'statistics.json'))
+    assert len(summary) == len(rows) / 2
+    store.write_summary_csv('summary.csv', filters)
+    assert len(tmpdir.join('csv_output', 'summary.csv').readlines()) == len(summary) + 1
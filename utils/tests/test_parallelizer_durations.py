@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from fixtures.parallelizer import DurationHistory
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class Report(object):
+    def __init__(self, nodeid, duration):
+        self.nodeid = nodeid
+        self.duration = duration
+
+
+@pytest.fixture
+def history_path(tmpdir):
+    path = tmpdir.join('test_durations.json')
+    path.write(json.dumps({'test_a': 10., 'test_b': 2., 'test_c': 4.}))
+    return path.strpath
+
+
+def test_record_and_save(history_path):
+    durations = DurationHistory(history_path)
+    # setup, call and teardown phases
+    for duration in [1., 3., .5]:
+        durations.record(Report('test_b', duration))
+    durations.record(Report('test_new', 7.))
+    # Recorded durations are used from the next run on
+    assert durations.estimate('test_b') == 2.
+    durations.save()
+
+    with open(history_path) as f:
+        assert json.load(f) == {'test_a': 10., 'test_b': 4.5, 'test_c': 4., 'test_new': 7.}
+    assert DurationHistory(history_path).estimate('test_b') == 4.5
+
+
+def test_estimate_fallback(tmpdir, history_path):
+    durations = DurationHistory(history_path)
+    assert durations
+    assert durations.estimate('test_a') == 10.
+    # Unknown tests are expected to take the median duration
+    assert durations.estimate('test_unknown') == 4.
+    assert durations.group_estimate(['test_a', 'test_unknown']) == 14.
+
+    # Without history, or with a broken history file, all tests weigh the same
+    for contents in [None, 'not json']:
+        path = tmpdir.join('other.json')
+        if contents is not None:
+            path.write(contents)
+        durations = DurationHistory(path.strpath)
+        assert not durations
+        assert durations.estimate('test_a') == 1.
+
+
+def test_schedule_longest_first(history_path):
+    durations = DurationHistory(history_path)
+    groups = [['test_b'], ['test_c', 'test_b'], ['test_a'], ['test_unknown'], ['test_c']]
+    assert durations.schedule(groups) == [
+        ['test_a'], ['test_c', 'test_b'], ['test_unknown'], ['test_c'], ['test_b']]
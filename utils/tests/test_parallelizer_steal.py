@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import json
+from collections import defaultdict, deque
+from itertools import count
+
+import pytest
+
+from fixtures.parallelizer import DurationHistory, ParallelSession
+from fixtures.parallelizer.remote import SlaveManager
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeConfig(object):
+    def __init__(self, **values):
+        self.values = values
+
+    def getvalue(self, name):
+        return self.values[name]
+
+
+class FakeLog(object):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeControlSocket(object):
+    def __init__(self):
+        self.published = []
+
+    def send_multipart(self, frames):
+        slaveid, request_json = frames
+        self.published.append((slaveid, json.loads(request_json)))
+
+
+class FakeSession(ParallelSession):
+    """The stealing bits of a master session, recording what it sends to its fake slaves"""
+    def __init__(self, tmpdir, slaves, groups=(), steal_min_tests=2, pushpull=False):
+        self.config = FakeConfig(steal_min_tests=steal_min_tests)
+        self.log = FakeLog()
+        self.slaves = {slaveid: object() for slaveid in slaves}
+        self.slave_tests = defaultdict(list)
+        self.pending_steals = {}
+        self.steal_ids = count(1)
+        self.steals = 0
+        self.waiting_thieves = set()
+        self.stolen_tests = defaultdict(list)
+        self.requeued_tests = deque()
+        self.control_sock = FakeControlSocket() if pushpull else None
+        self.durations = DurationHistory(tmpdir.join('durations.json').strpath)
+        self.test_groups = iter(list(groups))
+        self.sent = []
+
+    def send(self, slaveid, event_data):
+        self.sent.append((slaveid, event_data))
+
+    def print_message(self, message, prefix='master', **markup):
+        pass
+
+
+class FakeSlave(SlaveManager):
+    """A slave's test queue, recording the events it sends and answering with ``replies``"""
+    def __init__(self, tests=(), replies=()):
+        self.log = FakeLog()
+        self.tests = deque(tests)
+        self.control_sock = None
+        self.replies = deque(replies)
+        self.sent = []
+
+    def send_event(self, name, **kwargs):
+        self.sent.append((name, kwargs))
+        if name == 'need_tests':
+            return self.replies.popleft()
+
+
+def queue(module, *names):
+    return ['{}::{}'.format(module, name) for name in names]
+
+
+def test_stale_steal_release_is_requeued(tmpdir):
+    tests = queue('test_victim.py', 'a', 'b', 'c', 'd')
+    session = FakeSession(tmpdir, ['thief', 'victim'], pushpull=True)
+    session._send_tests('victim', tests)
+    victim = FakeSlave(tests)
+    del session.sent[:]
+
+    # The thief runs dry, the steal request is published to the victim
+    session.send_tests('thief')
+    assert session.control_sock.published == [
+        ('victim', {'steal': tests[2:], 'steal_id': 1})]
+    # ...but the victim asks for tests before it sees the request, calling the steal off
+    session.cancel_steal('victim')
+    session.send_tests('victim')
+    assert session.sent == [('thief', []), ('victim', [])]
+    assert not session.pending_steals
+
+    # The victim gets to the stale request afterwards, and releases its tests anyway
+    request = session.control_sock.published[0][1]
+    victim._release_tests(request['steal'], request['steal_id'])
+    event_name, event_data = victim.sent[-1]
+    assert (event_name, event_data) == ('steal', {'node_ids': tests[2:], 'steal_id': 1})
+    session.finish_steal('victim', event_data['node_ids'], event_data['steal_id'])
+    assert session.slave_tests['victim'] == tests[:2]
+
+    # The released tests aren't lost, the next slave asking for tests gets them
+    session.send_tests('victim')
+    assert session.sent[-1] == ('victim', tests[2:])
+    assert session.slave_tests['victim'] == tests
+
+
+def test_stale_steal_release_leaves_new_steal_alone(tmpdir):
+    tests = queue('test_victim.py', 'a', 'b', 'c', 'd', 'e', 'f')
+    session = FakeSession(tmpdir, ['thief', 'victim'], pushpull=True)
+    session._send_tests('victim', tests)
+    session.send_tests('thief')
+    session.cancel_steal('victim')
+    session.send_tests('thief')
+    assert session.pending_steals['victim'][2] == 2
+
+    # An answer to the first request doesn't settle the second one
+    session.finish_steal('victim', tests[-1:], 1)
+    assert session.pending_steals['victim'][2] == 2
+    assert list(session.requeued_tests) == [tests[-1:]]
+
+
+def test_stealable_tail(tmpdir):
+    session = FakeSession(tmpdir, ['slave'])
+    session.slave_tests['slave'] = (queue('test_mod.py', 'a', 'b', 'c')
+        + queue('test_mod.py', 'TestClass::d', 'TestClass::e', 'TestClass::f'))
+    # Classes aren't split up, even if that's more than half of the queue
+    assert session._stealable_tail('slave') == (
+        queue('test_mod.py', 'TestClass::d', 'TestClass::e', 'TestClass::f'), 3.)
+
+    session.slave_tests['slave'] = queue('test_mod.py', 'a', 'b', 'c', 'd', 'e')
+    assert session._stealable_tail('slave') == (queue('test_mod.py', 'd', 'e'), 2.)
+    # The first test may be the running test's next item, it's never taken
+    session.slave_tests['slave'] = queue('test_mod.py', 'a', 'b')
+    assert session._stealable_tail('slave') == (queue('test_mod.py', 'b'), 1.)
+    session.slave_tests['slave'] = []
+    assert session._stealable_tail('slave') == ([], 0.)
+
+
+def test_start_steal_picks_busiest(tmpdir):
+    session = FakeSession(tmpdir, ['thief', 'small', 'big', 'busy_thief'])
+    session.slave_tests['small'] = queue('test_small.py', 'a', 'b', 'c', 'd')
+    session.slave_tests['big'] = queue('test_big.py', *'abcdefgh')
+    session.slave_tests['busy_thief'] = queue('test_busy.py', *'abcdefgh')
+    session.pending_steals['elsewhere'] = 'busy_thief', [], 0
+    assert session.start_steal('thief')
+    assert session.pending_steals['big'] == ('thief', queue('test_big.py', *'efgh'), 1)
+    # The ack of the victim's next report carries the steal request
+    session.ack_or_steal('big', 'runtest_logreport')
+    assert session.sent == [('big', {'steal': queue('test_big.py', *'efgh'), 'steal_id': 1})]
+
+    # Tails shorter than steal_min_tests aren't stolen
+    session = FakeSession(tmpdir, ['thief', 'victim'], steal_min_tests=3)
+    session.slave_tests['victim'] = queue('test_mod.py', 'a', 'b', 'c', 'd')
+    assert not session.start_steal('thief')
+    session = FakeSession(tmpdir, ['thief', 'victim'], steal_min_tests=0)
+    session.slave_tests['victim'] = queue('test_mod.py', *'abcdefgh')
+    assert not session.start_steal('thief')
+    assert not session.pending_steals
+
+
+def test_idle_thief_waits_for_stolen_tests(tmpdir):
+    tests = queue('test_victim.py', 'a', 'b', 'c', 'd')
+    session = FakeSession(tmpdir, ['thief', 'victim'])
+    session.slave_tests['victim'] = list(tests)
+    assert session.send_tests('thief') == []
+    assert session.sent == []
+
+    session.finish_steal('victim', tests[2:], 1)
+    assert session.sent == [('thief', tests[2:])]
+    assert session.slave_tests == {'thief': tests[2:], 'victim': tests[:2]}
+    assert session.steals == 1
+    assert not session.waiting_thieves
+
+
+def test_busy_thief_answered_right_away(tmpdir):
+    tests = queue('test_victim.py', 'a', 'b', 'c', 'd')
+    session = FakeSession(tmpdir, ['thief', 'victim'])
+    session.slave_tests['victim'] = list(tests)
+    # Asking before its last test, the thief isn't kept waiting on the victim
+    session.send_tests('thief', idle=False)
+    assert session.sent == [('thief', [])]
+    assert 'victim' in session.pending_steals
+
+    session.finish_steal('victim', tests[2:], 1)
+    assert len(session.sent) == 1
+    # The stolen tests are there when it asks again
+    session.send_tests('thief')
+    assert session.sent[-1] == ('thief', tests[2:])
+
+
+def test_empty_release_tries_another_victim(tmpdir):
+    session = FakeSession(tmpdir, ['thief', 'first', 'second'])
+    session.slave_tests['first'] = queue('test_first.py', *'abcdef')
+    session.slave_tests['second'] = queue('test_second.py', 'a', 'b', 'c', 'd')
+    session.send_tests('thief')
+    assert session.pending_steals.keys() == ['first']
+
+    # The first victim had already started its tail, the second one is asked next
+    session.slave_tests['first'] = queue('test_first.py', 'f')
+    session.finish_steal('first', [], 1)
+    assert session.pending_steals.keys() == ['second']
+    assert session.sent == []
+    session.finish_steal('second', [], 2)
+    assert session.sent == [('thief', [])]
+    assert not session.waiting_thieves
+
+
+def test_slave_asks_again_when_idle():
+    slave = FakeSlave(replies=[['a', 'b'], [], ['c'], [], []])
+    slave.collection = {'a': 'A', 'b': 'B', 'c': 'C'}
+    assert list(slave._test_generator()) == [('A', 'B'), ('B', None), ('C', None)]
+    assert [kwargs['idle'] for name, kwargs in slave.sent] == [True, False, True, False, True]
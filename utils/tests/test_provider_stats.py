@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import create_engine
+
+from utils import db as db_module
+from utils.db import Db
+from utils.db_queries import get_provider_stats
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def db(tmpdir, monkeypatch):
+    monkeypatch.setattr(db_module, 'reflection_cache_path', tmpdir.join('cache'))
+    engine = create_engine('sqlite:///%s' % tmpdir.join('vmdb.sqlite').strpath)
+    engine.execute('CREATE TABLE schema_migrations (version VARCHAR(255))')
+    tables = {
+        'ext_management_systems': ['id INTEGER PRIMARY KEY', 'name VARCHAR(255)'],
+        'vms': ['id INTEGER PRIMARY KEY', 'ems_id INTEGER', 'template BOOLEAN'],
+        'hosts': ['id INTEGER PRIMARY KEY', 'ems_id INTEGER'],
+        'ems_clusters': ['id INTEGER PRIMARY KEY', 'ems_id INTEGER'],
+        'storages': ['id INTEGER PRIMARY KEY', 'name VARCHAR(255)'],
+        'hosts_storages': ['host_id INTEGER', 'storage_id INTEGER'],
+    }
+    for table_name, columns in tables.iteritems():
+        engine.execute('CREATE TABLE {} ({})'.format(table_name, ', '.join(columns)))
+
+    def insert(table_name, *rows):
+        for row in rows:
+            engine.execute('INSERT INTO {} VALUES ({})'.format(
+                table_name, ', '.join('?' * len(row))), row)
+
+    insert('ext_management_systems', (1, 'vsphere'), (2, 'rhevm'), (3, 'ec2'))
+    insert('vms', *[(i, 1, i % 3 == 0) for i in range(1, 11)] + [(11, 2, False), (12, 3, True)])
+    insert('hosts', (1, 1), (2, 1), (3, 2))
+    insert('ems_clusters', (1, 1), (2, 2))
+    # Both vsphere hosts see the shared datastore, it's counted once
+    insert('storages', (1, 'shared'), (2, 'local'), (3, 'rhevm'))
+    insert('hosts_storages', (1, 1), (2, 1), (2, 2), (3, 3))
+    db = Db('host_a', {'username': 'user', 'password': 'pass'})
+    db.engine = engine
+    return db
+
+
+def test_provider_stats(db):
+    stats = get_provider_stats(['vsphere', 'rhevm', 'ec2', 'missing'], db=db)
+    assert stats.keys() == ['vsphere', 'rhevm', 'ec2', 'missing']
+    assert stats['vsphere'] == {
+        'num_vm': 7, 'num_template': 3, 'num_host': 2, 'num_cluster': 1, 'num_datastore': 2}
+    assert stats['rhevm'] == {
+        'num_vm': 1, 'num_template': 0, 'num_host': 1, 'num_cluster': 1, 'num_datastore': 1}
+    assert stats['ec2'] == {
+        'num_vm': 0, 'num_template': 1, 'num_host': 0, 'num_cluster': 0, 'num_datastore': 0}
+    assert set(stats['missing'].values()) == {0}
+
+
+def test_some_provider_stats(db):
+    stats = get_provider_stats(['vsphere'], ['num_template', 'num_vm'], db=db)
+    assert stats == {'vsphere': {'num_template': 3, 'num_vm': 7}}
+    assert stats['vsphere'].keys() == ['num_template', 'num_vm']
+    with pytest.raises(ValueError):
+        get_provider_stats(['vsphere'], ['num_vm', 'num_flavor'], db=db)
+
+
+def test_statement_reused(db):
+    get_provider_stats(['vsphere'], db=db)
+    assert get_provider_stats(['rhevm'], db=db)['rhevm']['num_vm'] == 1
+    get_provider_stats(['vsphere', 'rhevm'], db=db)
+    assert len(db._statement_cache) == 2
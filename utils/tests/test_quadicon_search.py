@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.web_ui import quadicon_search
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeBrowser(object):
+    """Stands in for both ``sel`` and ``paginator``, showing one list of quadicons at a time"""
+    def __init__(self):
+        self.scrapes = 0
+        self.show('infra_explorer', 'All VMs', [['vm_a', 'vm_b'], ['vm_c']])
+
+    def show(self, url, title, pages):
+        self.url, self.title, self.quad_pages = url, title, pages
+        self.page = 0
+
+    # paginator
+    def page_controls_exist(self):
+        return bool(self.quad_pages)
+
+    def rec_total(self):
+        return str(sum(map(len, self.quad_pages)))
+
+    def results_per_page_max(self):
+        return 2
+
+    def pages(self):
+        for self.page in range(len(self.quad_pages)):
+            yield
+
+    # sel
+    def current_url(self):
+        return self.url
+
+    def elements(self, locator):
+        return [self.title] if self.title is not None else []
+
+    def text(self, element):
+        return element
+
+    def execute_script(self, script):
+        self.scrapes += 1
+        return [{'name': name, 'href': '/vm/show/{}'.format(name), 'quadrants': {}}
+            for name in self.quad_pages[self.page]]
+
+
+@pytest.yield_fixture
+def browser(monkeypatch):
+    browser = FakeBrowser()
+    monkeypatch.setattr(quadicon_search, 'sel', browser)
+    monkeypatch.setattr(quadicon_search, 'paginator', browser)
+    quadicon_search.invalidate()
+    yield browser
+    quadicon_search.invalidate()
+
+
+def test_index_reused(browser):
+    assert quadicon_search.names() == ['vm_a', 'vm_b', 'vm_c']
+    assert quadicon_search.names(href_contains='show/vm_b') == ['vm_b']
+    assert browser.scrapes == 2
+    assert quadicon_search.index().entries['vm_c'].page == 1
+
+
+def test_explorer_lists_told_apart(browser):
+    assert quadicon_search.names() == ['vm_a', 'vm_b', 'vm_c']
+    # Another tree node in the same explorer, with as many items
+    browser.show('infra_explorer', 'Templates', [['tpl_a', 'tpl_b'], ['tpl_c']])
+    assert quadicon_search.names() == ['tpl_a', 'tpl_b', 'tpl_c']
+
+
+def test_empty_list(browser):
+    browser.pages = lambda: iter([])
+    index = quadicon_search.index()
+    assert index.entries == {}
+
+
+def test_unknown_page_size(browser):
+    browser.results_per_page_max = lambda: None
+    browser.show('infra_vms', 'All VMs', [['vm_a', 'vm_b'], ['vm_c', 'vm_d'], ['vm_e']])
+    index = quadicon_search.index()
+    assert quadicon_search.names() == ['vm_a', 'vm_b', 'vm_c', 'vm_d', 'vm_e']
+    assert browser.scrapes == 3
+    assert index.go_to('vm_d')
+    assert browser.page == 1
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import pytest
+from utils.appliance import ApplianceSet, IPAppliance
 from utils.randomness import generate_random_string
+from utils.ssh import run_on_hosts
+from utils.wait import TimedOutError
 
 pytestmark = [
     pytest.mark.nondestructive,
@@ -15,6 +18,15 @@ def test_ssh_client_run_command(ssh_client):
     assert 'Testing!' in output
 
 
+def test_ssh_client_reuses_pooled_transport(ssh_client):
+    # Consecutive commands must not reconnect to the same host
+    with ssh_client as client:
+        transport = client.get_transport()
+    ssh_client.run_command('true')
+    with ssh_client() as client:
+        assert client.get_transport() is transport
+
+
 def test_ssh_client_copies(ssh_client):
     ssh_client_kwargs = {
         'username': generate_random_string(),
@@ -50,3 +62,39 @@ def test_scp_client_can_put_a_file(ssh_client, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     ssh_client.run_command("rm -f /tmp/%s" % tmpfile.basename)
+
+
+def test_ssh_client_iter_command(ssh_client):
+    stream = ssh_client.iter_command('echo one; echo two >&2; echo -n three')
+    assert sorted(stream) == ['one', 'three', 'two']
+    assert stream.rc == 0
+
+
+def test_ssh_client_output_cap_and_timeout(ssh_client):
+    rc, output = ssh_client.run_command('seq 1 100000', max_output=100)
+    assert rc == 0
+    assert len(output) == 100
+    assert output.endswith('100000\n')
+    with pytest.raises(TimedOutError):
+        ssh_client.run_command('sleep 30', timeout=2)
+    # Output that keeps coming doesn't keep the command from timing out
+    with pytest.raises(TimedOutError):
+        ssh_client.run_command('yes | head -c 50M; sleep 30', timeout=2)
+
+
+def test_run_on_hosts(ssh_client):
+    hostname = ssh_client._connect_kwargs['hostname']
+    results = run_on_hosts([ssh_client], 'echo Testing!', timeout=30)
+    assert results.successful
+    assert 'Testing!' in results[hostname].output
+    assert not results.errors
+
+
+def test_appliance_set_run_command_unreachable(ssh_client):
+    hostname = ssh_client._connect_kwargs['hostname']
+    appliance_set = ApplianceSet(IPAppliance(hostname), [IPAppliance('unreachable.invalid')])
+    # One dead appliance doesn't keep the command from running on the others
+    results = appliance_set.run_command('echo Testing!', timeout=30)
+    assert 'Testing!' in results[hostname].output
+    assert results.errors.keys() == ['unreachable.invalid']
+    assert results.failed == ['unreachable.invalid']
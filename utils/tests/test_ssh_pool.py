@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import socket
+
+import pytest
+
+from utils import ssh
+from utils.ssh import SSHClient, SSHTransportPool
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+CONNECT_KWARGS = {'hostname': 'appliance.example.com', 'username': 'root'}
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        pass
+
+    def open_session(self):
+        if not self.active:
+            raise socket.error('connection reset')
+        return 'session'
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+@pytest.yield_fixture
+def pool(monkeypatch):
+    pool = SSHTransportPool()
+    monkeypatch.setattr(SSHTransportPool, '_connect', staticmethod(lambda kwargs: FakeConnection()))
+    monkeypatch.setattr(ssh, 'ssh_pool', pool)
+    yield pool
+    pool.close_all()
+
+
+def pooled_client():
+    # Skips the credentials lookup of __init__, the connect kwargs are all the pool needs
+    client = SSHClient.__new__(SSHClient)
+    client._pooled = True
+    client._pool_key = client._transport = None
+    client._checkouts = 0
+    client._connect_kwargs = dict(CONNECT_KWARGS)
+    client.connect(**client._connect_kwargs)
+    return client
+
+
+def users(pool):
+    return [entry['users'] for entry in pool._connections.values()]
+
+
+def test_clients_share_transport(pool):
+    first, second = pooled_client(), pooled_client()
+    assert first.get_transport() is second.get_transport()
+    assert users(pool) == [2]
+    first.close()
+    second.close()
+    assert users(pool) == [0]
+
+
+def test_reconnect_leaves_new_connection_users_alone(pool):
+    first, second, third = pooled_client(), pooled_client(), pooled_client()
+    dead = first.get_transport()
+    dead.active = False
+
+    # The first client to notice reconnects, the others still hold the dead transport
+    assert first._open_session() == 'session'
+    assert first.get_transport() is not dead
+    assert users(pool) == [1]
+    second.close()
+    assert users(pool) == [1]
+
+    # The third one reconnects too, without throwing away the first one's new connection
+    assert third._open_session() == 'session'
+    assert third.get_transport() is first.get_transport()
+    assert users(pool) == [2]
+    first.close()
+    third.close()
+    assert users(pool) == [0]
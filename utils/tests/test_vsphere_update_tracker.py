@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+from collections import namedtuple
+from Queue import Queue, Empty
+
+from utils import mgmt_system
+from utils.mgmt_system import VMWareSystem, VSphereUpdateTracker
+from utils.wait import wait_for
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+UpdateSet = namedtuple('UpdateSet', ['version', 'filterSet', 'truncated'])
+FilterUpdate = namedtuple('FilterUpdate', ['objectSet'])
+ObjectUpdate = namedtuple('ObjectUpdate', ['kind', 'obj', 'changeSet'])
+PropertyChange = namedtuple('PropertyChange', ['name', 'op', 'val'])
+
+
+class Spec(object):
+    pass
+
+
+class FakePropertyCollector(object):
+    def __init__(self):
+        self.updates = Queue()
+        self.filter_specs = []
+        self.versions = []
+        self.last_version = 0
+
+    def CreateFilter(self, spec, partialUpdates):
+        self.filter_specs.append(spec)
+
+    def WaitForUpdatesEx(self, version, options):
+        self.versions.append(version)
+        try:
+            update_set = self.updates.get(timeout=options.maxWaitSeconds)
+        except Empty:
+            return None
+        if update_set is None:
+            raise Exception('RequestCanceled')
+        return update_set
+
+    def CancelWaitForUpdates(self):
+        self.updates.put(None)
+
+    def push(self, *object_updates, **kwargs):
+        self.last_version += 1
+        self.updates.put(UpdateSet(
+            str(self.last_version), [FilterUpdate(list(object_updates))],
+            kwargs.get('truncated', False)))
+
+
+class FakeClient(object):
+    def __init__(self, collector):
+        self.collector = collector
+        self.logged_out = False
+
+        class content(object):
+            rootFolder = 'root'
+            propertyCollector = collector
+
+        class si(object):
+            pass
+        si.content = content
+        self.si = si
+
+    def create(self, type_name):
+        return Spec()
+
+    def get_search_filter_spec(self, root, property_spec):
+        return property_spec
+
+    def logout(self):
+        self.logged_out = True
+
+
+@pytest.yield_fixture
+def tracker():
+    collector = FakePropertyCollector()
+    client = FakeClient(collector)
+    tracker = VSphereUpdateTracker(lambda: client, max_wait=.1)
+    tracker.collector = collector
+    tracker.client = client
+    yield tracker
+    tracker.stop(timeout=5)
+
+
+def test_initial_sync_and_modify(tracker):
+    collector = tracker.collector
+    collector.push(
+        ObjectUpdate('enter', 'vm-1', [
+            PropertyChange('name', 'assign', 'vm_a'),
+            PropertyChange('runtime.powerState', 'assign', 'poweredOff')]),
+        truncated=True)
+    collector.push(ObjectUpdate('enter', 'vm-2', [
+        PropertyChange('name', 'assign', 'vm_b'),
+        PropertyChange('runtime.powerState', 'assign', 'poweredOn')]))
+    tracker.start()
+    assert tracker.synced.wait(5)
+    assert collector.filter_specs[0].pathSet == ['name', 'runtime.powerState']
+    assert sorted(tracker.vm_names()) == ['vm_a', 'vm_b']
+    assert tracker.get('vm_a', 'runtime.powerState') == 'poweredOff'
+
+    # A change wakes up waiters blocked on the condition
+    collector.push(ObjectUpdate('modify', 'vm-1', [
+        PropertyChange('runtime.powerState', 'assign', 'poweredOn')]))
+    wait_for(lambda: tracker.get('vm_a', 'runtime.powerState') == 'poweredOn',
+             num_sec=5, delay=5, notifier=tracker.condition)
+    # Versions returned by the server are sent back on the next call
+    assert collector.versions[:3] == ['', '1', '2']
+
+
+def test_rename_and_leave(tracker):
+    collector = tracker.collector
+    collector.push(ObjectUpdate('enter', 'vm-1', [PropertyChange('name', 'assign', 'old')]))
+    tracker.start()
+    assert tracker.synced.wait(5)
+    collector.push(ObjectUpdate('modify', 'vm-1', [PropertyChange('name', 'assign', 'new')]))
+    wait_for(lambda: tracker.vm_names() == ['new'], num_sec=5, notifier=tracker.condition)
+    collector.push(ObjectUpdate('leave', 'vm-1', []))
+    wait_for(lambda: tracker.vm_names() == [], num_sec=5, notifier=tracker.condition)
+
+
+def test_failure_ends_tracking(tracker):
+    def broken_wait(version, options):
+        raise IOError('connection reset')
+    tracker.collector.WaitForUpdatesEx = broken_wait
+    tracker.start()
+    wait_for(lambda: not tracker.running, num_sec=5, delay=.1)
+    assert tracker.failed
+    assert not tracker.synced.is_set()
+    assert tracker.client.logged_out
+
+
+def tracker_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'vsphere-update-tracker']
+
+
+@pytest.mark.parametrize('keep', [False, True], ids=['stopped', 'kept'])
+def test_wait_stops_tracker(monkeypatch, keep):
+    collector = FakePropertyCollector()
+    client = FakeClient(collector)
+    monkeypatch.setattr(mgmt_system, '_PsphereClient', lambda *args: client)
+    collector.push(ObjectUpdate('enter', 'vm-1', [
+        PropertyChange('name', 'assign', 'vm_a'),
+        PropertyChange('runtime.powerState', 'assign', 'poweredOn')]))
+    system = VMWareSystem('vsphere.example.com', 'user', 'password', keep_update_tracker=keep)
+    system.wait_vm_running('vm_a', num_sec=5)
+    assert collector.filter_specs
+    if keep:
+        assert system._update_tracker.running
+        system._stop_update_tracker(timeout=5)
+    # The thread and its vSphere session are gone, not left behind by the wait
+    assert system._update_tracker is None
+    assert not tracker_threads()
+    assert client.logged_out
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=W0621
 import pytest
+import threading
 import time
-from utils.wait import wait_for, TimedOutError
+from utils.wait import wait_for, wait_stats, TimedOutError
 
 pytestmark = [
     pytest.mark.nondestructive,
@@ -41,3 +42,31 @@ def test_lambda_long_wait():
     incman = Incrementor()
     with pytest.raises(TimedOutError):
         wait_for(lambda self: self.i_sleep_a_lot() > 10, [incman], num_sec=1, message="this fails")
+
+
+def test_notifier_wakes_waiter():
+    event = threading.Event()
+    done = []
+    threading.Timer(.2, lambda: (done.append(True), event.set())).start()
+    ec, tc = wait_for(lambda: bool(done), delay=30, num_sec=60, notifier=event)
+    assert ec
+    assert tc < 5, "Should have been woken up by the event"
+
+
+def test_expo_max_delay():
+    sleeps = []
+    with pytest.raises(TimedOutError):
+        wait_for(lambda: False, delay=.01, expo=True, max_delay=.02, num_sec=.2,
+                 notifier=lambda timeout: (sleeps.append(timeout), time.sleep(timeout)))
+    assert max(sleeps) <= .02
+
+
+def test_wait_stats():
+    def waiter():
+        return wait_for(lambda: True, num_sec=1)
+    waiter()
+    waiter()
+    call_site = (waiter.func_code.co_filename, waiter.func_code.co_firstlineno + 1)
+    stats = [s for site, s in wait_stats.items() if site == call_site]
+    assert stats and stats[0].calls == 2
+    assert stats[0].attempts == 2
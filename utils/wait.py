@@ -1,5 +1,7 @@
+import random
+import sys
 import time
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from utils.log import logger
 from functools import partial
 from threading import Timer
@@ -8,6 +10,25 @@ from threading import Timer
 WaitForResult = namedtuple("WaitForResult", ["out", "duration"])
 
 
+class WaitStats(object):
+    """Accumulated :py:func:`wait_for` statistics of a single call site"""
+    __slots__ = ('calls', 'attempts', 'duration', 'timeouts')
+
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.duration = 0.0
+        self.timeouts = 0
+
+    def __repr__(self):
+        return "<WaitStats calls={} attempts={} duration={:.1f} timeouts={}>".format(
+            self.calls, self.attempts, self.duration, self.timeouts)
+
+
+#: :py:class:`WaitStats` of every :py:func:`wait_for` call site, keyed by ``(filename, lineno)``
+wait_stats = defaultdict(WaitStats)
+
+
 def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
     """Waits for a certain amount of time for an action to complete
 
@@ -26,6 +47,14 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
         func_kwargs: A dict of function keyword arguments to be passed to func
         num_sec: An int describing the number of seconds to wait before timing out.
         expo: A boolean flag toggling exponential delay growth.
+        max_delay: Upper bound of the delay when ``expo`` is used (default unbounded).
+        jitter: Fraction of the delay by which every sleep is randomly lengthened or shortened,
+            e.g. ``0.1`` for +-10%. Spreads out concurrent waiters polling the same resource.
+        first_delay: Seconds to wait before func() is called for the first time.
+        notifier: Something that signals when func() is worth calling again, so the delay
+            can be cut short. Either a :py:class:`threading.Event` (cleared after each wakeup),
+            a :py:class:`threading.Condition` (woken by ``notify``), or a callable that takes a
+            timeout in seconds and blocks for at most that long.
         message: A string containing a description of func's operation. If None,
             defaults to the function's name.
         fail_condition: An object describing the failure condition that should be tested
@@ -48,9 +77,14 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
 
     """
     st_time = time.time()
-    total_time = 0
+    caller = sys._getframe(1)
+    stats = wait_stats[(caller.f_code.co_filename, caller.f_lineno)]
     num_sec = kwargs.get('num_sec', 120)
     expo = kwargs.get('expo', False)
+    max_delay = kwargs.get('max_delay', None)
+    jitter = kwargs.get('jitter', 0)
+    first_delay = kwargs.get('first_delay', 0)
+    notifier = kwargs.get('notifier', None)
     message = kwargs.get('message', None)
     if not message:
         if isinstance(func, partial):
@@ -65,30 +99,44 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
     quiet = kwargs.get("quiet", False)
     silent_fail = kwargs.get("silent_failure", False)
 
-    t_delta = 0
+    stats.calls += 1
     logger.trace('Started {} at {}'.format(message, st_time))
-    while t_delta <= num_sec:
-        try:
-            out = func(*func_args, **func_kwargs)
-        except:
-            if handle_exception:
-                out = fail_condition
+    if first_delay:
+        _wait_for_notification(notifier, min(first_delay, num_sec))
+    t_delta = time.time() - st_time
+    try:
+        while t_delta <= num_sec:
+            stats.attempts += 1
+            try:
+                out = func(*func_args, **func_kwargs)
+            except:
+                if handle_exception:
+                    out = fail_condition
+                else:
+                    raise
+            if out == fail_condition:
+                sleep_for = delay
+                if jitter:
+                    sleep_for *= 1 + random.uniform(-jitter, jitter)
+                # Never sleep past the deadline, there's one more check right at the end
+                remaining = num_sec - (time.time() - st_time)
+                _wait_for_notification(notifier, max(min(sleep_for, remaining), 0))
+                if expo:
+                    delay *= 2
+                    if max_delay is not None:
+                        delay = min(delay, max_delay)
+                if fail_func:
+                    fail_func()
             else:
-                raise
-        if out == fail_condition:
-            time.sleep(delay)
-            total_time += delay
-            if expo:
-                delay *= 2
-            if fail_func:
-                fail_func()
-        else:
-            duration = time.time() - st_time
-            if not quiet:
-                logger.trace('Took %f to do %s' % (duration, message))
-            logger.trace('Finished {} at {}'.format(message, st_time + t_delta))
-            return WaitForResult(out, duration)
-        t_delta = time.time() - st_time
+                duration = time.time() - st_time
+                if not quiet:
+                    logger.trace('Took %f to do %s' % (duration, message))
+                logger.trace('Finished {} at {}'.format(message, st_time + t_delta))
+                return WaitForResult(out, duration)
+            t_delta = time.time() - st_time
+    finally:
+        stats.duration += time.time() - st_time
+    stats.timeouts += 1
     logger.trace('Finished at {}'.format(st_time + t_delta))
     if not silent_fail:
         logger.error('Could not complete %s in time, took %f' % (message, t_delta))
@@ -97,6 +145,37 @@ def wait_for(func, func_args=[], func_kwargs={}, **kwargs):
         logger.warning("Could not do %s in time but ignoring" % message)
 
 
+def _wait_for_notification(notifier, timeout):
+    """Sleeps for ``timeout`` seconds, or less if the notifier fires in the meantime"""
+    if notifier is None:
+        time.sleep(timeout)
+    elif hasattr(notifier, 'is_set'):
+        # threading.Event
+        if notifier.wait(timeout):
+            notifier.clear()
+    elif hasattr(notifier, 'notify'):
+        # threading.Condition
+        with notifier:
+            notifier.wait(timeout)
+    else:
+        notifier(timeout)
+
+
+def log_wait_stats(limit=20):
+    """Logs the :py:func:`wait_for` call sites that spent the most time waiting
+
+    Args:
+        limit: How many call sites to log, ``None`` for all of them.
+    """
+    if not wait_stats:
+        return
+    logger.info('wait_for call sites by time spent waiting:')
+    sites = sorted(wait_stats.iteritems(), key=lambda item: item[1].duration, reverse=True)
+    for (filename, lineno), stats in sites[:limit]:
+        logger.info('  {:.1f}s in {} calls ({} attempts, {} timeouts) at {}:{}'.format(
+            stats.duration, stats.calls, stats.attempts, stats.timeouts, filename, lineno))
+
+
 class TimedOutError(Exception):
     pass
 